@@ -0,0 +1,172 @@
+# app/middleware/admission.py
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+from fastapi import Request
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; maps to 429 + Retry-After."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limits with a bounded FIFO wait queue for one endpoint.
+
+    At most `max_concurrent` requests run at once and each client may hold at
+    most `max_per_client` slots (running or queued). Excess requests wait in a
+    queue of at most `max_queue`; when it is full, or a request waits longer
+    than `queue_timeout`, it is rejected immediately instead of piling up.
+    Limits apply per worker process.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        max_per_client: int,
+        max_queue: int,
+        queue_timeout: float,
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_per_client = max_per_client
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._in_flight = 0
+        self._per_client: Dict[str, int] = {}
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Smoothed service time, used to suggest a Retry-After
+        self._avg_duration = 1.0
+
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {
+            "queue_full": 0,
+            "client_limit": 0,
+            "queue_timeout": 0,
+        }
+        self.peak_in_flight = 0
+        self.peak_queued = 0
+
+    @classmethod
+    def from_env(
+        cls,
+        name: str,
+        max_concurrent: int,
+        max_per_client: int,
+        max_queue: int,
+        queue_timeout: float,
+    ) -> "AdmissionController":
+        """Build a controller whose defaults can be overridden by <NAME>_* variables."""
+        prefix = name.upper()
+        return cls(
+            name,
+            max_concurrent=int(os.getenv(f"{prefix}_MAX_CONCURRENT", max_concurrent)),
+            max_per_client=int(os.getenv(f"{prefix}_MAX_PER_CLIENT", max_per_client)),
+            max_queue=int(os.getenv(f"{prefix}_MAX_QUEUE", max_queue)),
+            queue_timeout=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", queue_timeout)),
+        )
+
+    @asynccontextmanager
+    async def admit(self, client_id: str) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block, or raise AdmissionRejected."""
+        if self._per_client.get(client_id, 0) >= self.max_per_client:
+            self._reject("client_limit")
+
+        if self._in_flight < self.max_concurrent and not self._waiters:
+            self._in_flight += 1
+        elif len(self._waiters) >= self.max_queue:
+            self._reject("queue_full")
+        else:
+            await self._wait_for_slot(client_id)
+
+        self._per_client[client_id] = self._per_client.get(client_id, 0) + 1
+        self.admitted += 1
+        self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - start
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            self._release(client_id)
+
+    async def _wait_for_slot(self, client_id: str):
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        # Queued requests count against the client's share too
+        self._per_client[client_id] = self._per_client.get(client_id, 0) + 1
+        self.peak_queued = max(self.peak_queued, len(self._waiters))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except BaseException as e:
+            # Timed out, or the client went away while queued
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed over just as we gave up; pass it on
+                self._release_slot()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("queue_timeout")
+            raise
+        finally:
+            self._decrement_client(client_id)
+
+    def _release(self, client_id: str):
+        self._decrement_client(client_id)
+        self._release_slot()
+
+    def _release_slot(self):
+        # Hand the slot straight to the oldest waiter, keeping FIFO order
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def _decrement_client(self, client_id: str):
+        remaining = self._per_client.get(client_id, 0) - 1
+        if remaining > 0:
+            self._per_client[client_id] = remaining
+        else:
+            self._per_client.pop(client_id, None)
+
+    def _reject(self, reason: str):
+        self.rejected[reason] += 1
+        # Roughly when a slot should free up for a request at the back of the queue
+        backlog = (len(self._waiters) + 1) / max(self.max_concurrent, 1)
+        retry_after = max(1, math.ceil(backlog * self._avg_duration))
+        raise AdmissionRejected(f"{self.name}: {reason}", retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_per_client": self.max_per_client,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "peak_in_flight": self.peak_in_flight,
+            "peak_queued": self.peak_queued,
+            "avg_duration_s": round(self._avg_duration, 3),
+        }
+
+
+def client_id_for(request: Request) -> str:
+    """Identify the caller: the extension's X-Client-Id, else the client address."""
+    client_id: Optional[str] = request.headers.get("x-client-id")
+    if client_id:
+        return client_id
+    return request.client.host if request.client else "unknown"
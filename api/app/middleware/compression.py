@@ -0,0 +1,334 @@
+# app/middleware/compression.py
+import gzip
+import os
+import zlib
+from typing import Dict, Optional, Sequence
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+    _DECODE_ERRORS = (zlib.error, zstandard.ZstdError)
+except ImportError:
+    ZSTD_AVAILABLE = False
+    _DECODE_ERRORS = (zlib.error,)
+    print("Warning: zstandard not installed. zstd request/response bodies disabled.")
+
+_GZIP_ENCODINGS = ("gzip", "x-gzip")
+
+# zstd input is decoded in slices this small: zstd can expand a few bytes into
+# ~128 KB, so a compression bomb overshoots the body limit by a few MB at most
+_ZSTD_SLICE_BYTES = 128
+
+# Compressed responses larger than this are compressed off the event loop
+_OFFLOAD_BYTES = 64 * 1024
+
+
+class _BodyDecoder:
+    """Incremental gzip or zstd decoder that stops at `limit` decoded bytes."""
+
+    def __init__(self, encoding: str, limit: int):
+        self.limit = limit
+        self.decoded = 0
+        self.finished = False
+        if encoding in _GZIP_ENCODINGS:
+            self._zlib = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            self._zstd = None
+        else:
+            self._zlib = None
+            self._zstd = zstandard.ZstdDecompressor().decompressobj()
+
+    def feed(self, data: bytes) -> bytes:
+        chunks = []
+        try:
+            if self._zlib is not None:
+                while data:
+                    # Never inflate more than one byte past the limit
+                    chunk = self._zlib.decompress(data, self.limit - self.decoded + 1)
+                    self._count(chunk)
+                    chunks.append(chunk)
+                    data = self._zlib.unconsumed_tail
+            else:
+                for start in range(0, len(data), _ZSTD_SLICE_BYTES):
+                    piece = data[start : start + _ZSTD_SLICE_BYTES]
+                    chunk = self._zstd.decompress(piece)
+                    self._count(chunk)
+                    chunks.append(chunk)
+        except _DECODE_ERRORS as e:
+            self.finished = True
+            raise HTTPException(status_code=400, detail=f"Invalid request body: {e}")
+        return b"".join(chunks)
+
+    def finish(self):
+        # Later receive() calls (disconnect listeners) pass straight through
+        self.finished = True
+        decoder = self._zlib if self._zlib is not None else self._zstd
+        if not decoder.eof:
+            raise HTTPException(status_code=400, detail="Truncated compressed body")
+
+    def _count(self, chunk: bytes):
+        self.decoded += len(chunk)
+        if self.decoded > self.limit:
+            self.finished = True
+            raise _too_large(self.limit)
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=413, detail=f"Request body exceeds {limit} bytes"
+    )
+
+
+class RequestDecompressionMiddleware:
+    """Request body size limits, and gzip/zstd request bodies.
+
+    Bodies are decoded chunk by chunk as they arrive and the limit applies to
+    the decoded size, so neither a huge upload nor a small compression bomb is
+    ever buffered whole: the request fails with 413 as soon as it crosses the
+    limit, or before anything is read when `Content-Length` already does.
+    Limits are MAX_REQUEST_BYTES by default, with per-path overrides.
+    """
+
+    def __init__(self, app: ASGIApp, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.default_limit = int(os.getenv("MAX_REQUEST_BYTES", str(1024 * 1024)))
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        limit = self.path_limits.get(scope["path"], self.default_limit)
+        encoding = headers.get("content-encoding", "identity").strip().lower()
+        if encoding not in ("identity", *_GZIP_ENCODINGS) and not (
+            encoding == "zstd" and ZSTD_AVAILABLE
+        ):
+            response = JSONResponse(
+                {"detail": f"Unsupported Content-Encoding: {encoding}"},
+                status_code=415,
+            )
+            await response(scope, receive, send)
+            return
+
+        declared = headers.get("content-length", "")
+        if declared.isdigit() and int(declared) > limit:
+            response = JSONResponse(
+                {"detail": _too_large(limit).detail}, status_code=413
+            )
+            await response(scope, receive, send)
+            return
+
+        if encoding == "identity":
+            receive = self._limited(receive, limit)
+        else:
+            # Downstream sees a plain body of unknown length
+            scope = dict(scope)
+            scope["headers"] = [
+                (name, value)
+                for name, value in scope["headers"]
+                if name not in (b"content-encoding", b"content-length")
+            ]
+            receive = self._decoding(receive, _BodyDecoder(encoding, limit))
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _limited(receive: Receive, limit: int) -> Receive:
+        received = 0
+        done = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, done
+            message = await receive()
+            if message["type"] == "http.request" and not done:
+                received += len(message.get("body", b""))
+                done = not message.get("more_body", False)
+                if received > limit:
+                    done = True
+                    raise _too_large(limit)
+            return message
+
+        return limited_receive
+
+    @staticmethod
+    def _decoding(receive: Receive, decoder: _BodyDecoder) -> Receive:
+        async def decoding_receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.request" and not decoder.finished:
+                body = decoder.feed(message.get("body", b""))
+                if not message.get("more_body", False):
+                    decoder.finish()
+                message = {**message, "body": body}
+            return message
+
+        return decoding_receive
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Best of zstd and gzip by the client's q-values (zstd on ties), or None."""
+    qualities: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name.strip():
+            qualities[name.strip().lower()] = quality
+
+    supported = (["zstd"] if ZSTD_AVAILABLE else []) + ["gzip"]
+    wildcard = qualities.get("*", 0.0)
+    best = max(supported, key=lambda encoding: qualities.get(encoding, wildcard))
+    return best if qualities.get(best, wildcard) > 0 else None
+
+
+class ResponseCompressionMiddleware:
+    """zstd or gzip response bodies for the listed path prefixes.
+
+    The encoding is negotiated from `Accept-Encoding`. Bodies under
+    `minimum_size`, event streams and responses that are already encoded are
+    sent as-is. A single-message body (any JSON response) is compressed in one
+    go, off the event loop when large; streamed bodies are compressed and
+    flushed chunk by chunk, so nothing is held back.
+    """
+
+    def __init__(self, app: ASGIApp, paths: Sequence[str], minimum_size: int = 1024):
+        self.app = app
+        self.paths = tuple(paths)
+        self.minimum_size = minimum_size
+        self.gzip_level = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+        self.zstd_level = int(os.getenv("RESPONSE_ZSTD_LEVEL", "3"))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", "")
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, _CompressingSend(self, encoding, send))
+
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(body)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def stream_compressor(self, encoding: str):
+        if encoding == "zstd":
+            return _ZstdStream(self.zstd_level)
+        return _GzipStream(self.gzip_level)
+
+
+class _GzipStream:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _ZstdStream:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _CompressingSend:
+    """`send` wrapper deciding on compression at the first body message."""
+
+    def __init__(
+        self, middleware: ResponseCompressionMiddleware, encoding: str, send: Send
+    ):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start: Optional[Message] = None
+        self.stream = None
+        self.passthrough = False
+
+    async def __call__(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Held until the first body message shows what is being sent
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            await self._begin(start, body, more_body)
+            return
+
+        if self.passthrough:
+            await self.send(message)
+            return
+        data = self.stream.chunk(body) if body else b""
+        if not more_body:
+            data += self.stream.finish()
+        await self.send(
+            {"type": "http.response.body", "body": data, "more_body": more_body}
+        )
+
+    async def _begin(self, start: Message, body: bytes, more_body: bool):
+        headers = MutableHeaders(raw=start["headers"])
+        if (
+            "content-encoding" in headers
+            or headers.get("content-type", "").startswith("text/event-stream")
+            or (not more_body and len(body) < self.middleware.minimum_size)
+        ):
+            self.passthrough = True
+            await self.send(start)
+            await self.send(
+                {"type": "http.response.body", "body": body, "more_body": more_body}
+            )
+            return
+
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if more_body:
+            del headers["Content-Length"]
+            self.stream = self.middleware.stream_compressor(self.encoding)
+            data = self.stream.chunk(body)
+        elif len(body) > _OFFLOAD_BYTES:
+            data = await run_in_threadpool(
+                self.middleware.compress, self.encoding, body
+            )
+        else:
+            data = self.middleware.compress(self.encoding, body)
+        if not more_body:
+            headers["Content-Length"] = str(len(data))
+
+        await self.send(start)
+        await self.send(
+            {"type": "http.response.body", "body": data, "more_body": more_body}
+        )
@@ -0,0 +1,208 @@
+# app/middleware/profiling.py
+import asyncio
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import uuid
+from datetime import datetime
+from typing import Callable, List, Optional
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from app.services.tracing import RequestTrace, start_trace
+
+# Prefer a sampling, async-aware profiler when installed
+try:
+    from pyinstrument import Profiler
+
+    PYINSTRUMENT_AVAILABLE = True
+except ImportError:
+    PYINSTRUMENT_AVAILABLE = False
+
+_PROFILE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_EXPLAINABLE_RE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.I)
+
+
+class ProfilingConfig:
+    def __init__(self):
+        # Requests slower than this are written to the slow-request log (0 disables)
+        self.slow_request_ms = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+        self.slow_request_log = os.getenv("SLOW_REQUEST_LOG", "slow_requests.log")
+        self.profile_dir = os.getenv("PROFILE_DIR", "profiles")
+        # Profiling is opt-in per request and limited to these clients/token
+        self.allowed_ips = {
+            ip.strip()
+            for ip in os.getenv("PROFILE_ALLOWED_IPS", "").split(",")
+            if ip.strip()
+        }
+        self.admin_token = os.getenv("PROFILE_ADMIN_TOKEN")
+
+    def is_admin(self, request: Request) -> bool:
+        """Check the admin allow-list (client IP or X-Profile-Token)."""
+        token = request.headers.get("x-profile-token")
+        if self.admin_token and token == self.admin_token:
+            return True
+        client_ip = request.client.host if request.client else None
+        return client_ip is not None and client_ip in self.allowed_ips
+
+
+def wants_profile(request: Request) -> bool:
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    return (flag or "").lower() in ("1", "true", "yes")
+
+
+def load_profile(config: ProfilingConfig, profile_id: str) -> Optional[str]:
+    """Read a stored profile report, or None if it does not exist."""
+    if not _PROFILE_ID_RE.match(profile_id):
+        return None
+    path = os.path.join(config.profile_dir, f"{profile_id}.txt")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read()
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    """Per-request tracing, opt-in profiling and a slow-request log.
+
+    Every request gets a trace (stage timings, parameters, SQL). Admins can add
+    `X-Profile: 1` (or `?profile=1`) to profile a single request; the report is
+    stored under PROFILE_DIR and its id returned in `X-Profile-Id`. Requests
+    slower than SLOW_REQUEST_MS are appended to SLOW_REQUEST_LOG as JSON lines,
+    with the query plan of every statement they ran (literal values redacted).
+    Requests for which `slow_by_design` is true (long polls, event streams)
+    are never logged.
+    """
+
+    def __init__(
+        self,
+        app,
+        explain_query_plan: Callable[[str], List[str]],
+        slow_by_design: Optional[Callable[[Request], bool]] = None,
+    ):
+        super().__init__(app)
+        self.config = ProfilingConfig()
+        self.explain_query_plan = explain_query_plan
+        self.slow_by_design = slow_by_design
+        # Only one profiler can be attached to the interpreter at a time
+        self._profile_lock = threading.Lock()
+
+    async def dispatch(self, request: Request, call_next):
+        trace = start_trace(request.method, request.url.path)
+
+        profiler = None
+        if wants_profile(request) and self.config.is_admin(request):
+            if self._profile_lock.acquire(blocking=False):
+                profiler = self._start_profiler()
+
+        try:
+            response = await call_next(request)
+        finally:
+            if profiler is not None:
+                report = self._stop_profiler(profiler)
+                self._profile_lock.release()
+
+        route = request.scope.get("route")
+        trace.route = getattr(route, "path", None) or request.url.path
+        duration_ms = trace.elapsed_ms()
+
+        response.headers["Server-Timing"] = ", ".join(
+            [f"total;dur={duration_ms:.1f}"]
+            + [f"{s['stage']};dur={s['ms']:.1f}" for s in trace.stages]
+        )
+        if profiler is not None:
+            response.headers["X-Profile-Id"] = self._save_profile(report, trace)
+
+        threshold = self.config.slow_request_ms
+        if (
+            threshold > 0
+            and duration_ms >= threshold
+            and not (self.slow_by_design and self.slow_by_design(request))
+        ):
+            # Query plans cost a few extra statements; keep them off the response path
+            asyncio.get_event_loop().run_in_executor(
+                None,
+                self._log_slow_request,
+                trace,
+                dict(request.query_params),
+                response.status_code,
+                duration_ms,
+            )
+
+        return response
+
+    @staticmethod
+    def _start_profiler():
+        if PYINSTRUMENT_AVAILABLE:
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+        else:
+            # Deterministic fallback: sees the whole event-loop thread while active
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    @staticmethod
+    def _stop_profiler(profiler) -> str:
+        if PYINSTRUMENT_AVAILABLE:
+            profiler.stop()
+            return profiler.output_text(unicode=False, color=False)
+
+        profiler.disable()
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(60)
+        return output.getvalue()
+
+    def _save_profile(self, report: str, trace: RequestTrace) -> str:
+        profile_id = uuid.uuid4().hex
+        os.makedirs(self.config.profile_dir, exist_ok=True)
+        header = (
+            f"{trace.method} {trace.path} ({trace.elapsed_ms():.1f} ms)\n"
+            f"stages: {json.dumps(trace.stages)}\n\n"
+        )
+        path = os.path.join(self.config.profile_dir, f"{profile_id}.txt")
+        with open(path, "w") as f:
+            f.write(header + report)
+        print(f"Stored profile {profile_id} for {trace.method} {trace.path}")
+        return profile_id
+
+    def _log_slow_request(
+        self,
+        trace: RequestTrace,
+        query_params: dict,
+        status_code: int,
+        duration_ms: float,
+    ):
+        queries = []
+        for sql in dict.fromkeys(trace.queries):  # distinct, in execution order
+            entry = {"sql": sql}
+            if _EXPLAINABLE_RE.match(sql):
+                try:
+                    entry["plan"] = self.explain_query_plan(sql)
+                except Exception as e:
+                    entry["plan_error"] = str(e)
+            queries.append(entry)
+
+        record = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "method": trace.method,
+            "route": trace.route,
+            "path": trace.path,
+            "query_params": query_params,
+            "params": trace.params,
+            "status_code": status_code,
+            "duration_ms": round(duration_ms, 3),
+            "stages": trace.stages,
+            "queries": queries,
+        }
+        try:
+            with open(self.config.slow_request_log, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+            print(
+                f"Slow request: {trace.method} {trace.route} took {duration_ms:.0f} ms"
+            )
+        except Exception as e:
+            print(f"Error writing slow-request log: {e}")
@@ -5,12 +5,22 @@ from datetime import datetime
 
 
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 
+# Cards saved without an X-Workspace-Id header belong to this workspace
+DEFAULT_WORKSPACE = "default"
+
+# Card lifecycle under two-phase summarization
+STATUS_READY = "ready"
+STATUS_ENRICHING = "enriching"  # card fields saved, recap still being generated
+STATUS_FAILED = "failed"  # recap generation gave up; recap stays empty
+
+
 class ChatSummary(BaseModel):
     id: str
+    workspace_id: str = DEFAULT_WORKSPACE
     title: str
     synthesis: str
     recap: str
@@ -20,6 +30,7 @@ class ChatSummary(BaseModel):
     source_url: str
     platform: str
     created_at: datetime
+    status: str = STATUS_READY
 
     class Config:
         # Allow datetime serialization
@@ -39,3 +50,31 @@ class ChatSummary(BaseModel):
                 "created_at": "2025-06-22T10:30:00",
             }
         }
+
+
+class ChatExistsBatchRequest(BaseModel):
+    source_urls: List[str]
+
+
+class ChatExistsBatchResponse(BaseModel):
+    results: Dict[str, bool]  # source_url -> exists
+    existing_count: int
+    took_ms: float
+
+
+class ChatChange(BaseModel):
+    seq: int
+    op: str  # "insert", "overwrite", "update" (recap added) or "delete"
+    chat_id: str
+    replaced_id: Optional[str] = None  # card an overwrite replaced
+    source_url: str
+    changed_at: datetime
+    chat: Optional[ChatSummary] = None  # current card, unless replaced or deleted since
+
+
+class ChangesResponse(BaseModel):
+    changes: List[ChatChange]
+    cursor: int  # pass as `since` to continue
+    latest: int
+    has_more: bool
+    reset: bool = False  # cursor is too old: reload /api/chats, then resume at cursor
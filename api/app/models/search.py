@@ -8,14 +8,14 @@ class SearchResult(BaseModel):
     id: str
     title: str
     synthesis: str
-    recap: str
+    recap: str  # empty unless requested (include_recap) or a full card
     project_name: str
     tags: List[str]
     source_url: str
     platform: str
     created_at: datetime
     relevance_score: Optional[float] = None
-    search_type: str  # "semantic" or "keyword"
+    search_type: str  # "semantic", "keyword", "direct" or "related"
 
 
 class SearchRequest(BaseModel):
@@ -25,6 +25,8 @@ class SearchRequest(BaseModel):
     platform_filter: Optional[str] = None
     date_from: Optional[datetime] = None
     date_to: Optional[datetime] = None
+    # Recaps are stored compressed apart from the card; only read when asked
+    include_recap: bool = False
 
 
 class SearchResponse(BaseModel):
@@ -32,3 +34,23 @@ class SearchResponse(BaseModel):
     total_count: int
     query: str
     search_time_ms: int
+
+
+class Suggestion(BaseModel):
+    text: str
+    kind: str  # "title", "tag" or "project"
+    score: float
+    fuzzy: bool = False
+
+
+class SuggestResponse(BaseModel):
+    suggestions: List[Suggestion]
+    query: str
+    took_ms: float
+    building: bool = False  # the workspace's index is still being built
+
+
+class RelatedChatsResponse(BaseModel):
+    chat_id: str
+    results: List[SearchResult]  # nearest first; relevance_score is the similarity
+    took_ms: float
@@ -0,0 +1,137 @@
+# app/services/change_feed_service.py
+import asyncio
+from typing import Dict, List, Optional
+from app.services.database_service import DatabaseService
+from app.models.chat import DEFAULT_WORKSPACE, ChangesResponse, ChatChange
+
+
+class ChangeFeedService:
+    """Cursor-based reads of the change log, and waiting for new entries.
+
+    Clients keep a mirror by pulling `since=<cursor>` deltas. Waiters (long
+    polls, SSE streams) share one poller per process that watches the
+    database's archive version and, when it moves, publishes the latest
+    sequence number of each workspace being waited on. Waiters compare their
+    cursor against that, so idle connections cost nothing per client and no
+    query runs on the event loop.
+    """
+
+    def __init__(
+        self, db_service: Optional[DatabaseService] = None, poll_interval: float = 0.25
+    ):
+        self.db_service = db_service or DatabaseService()
+        self.poll_interval = poll_interval
+        self._changed: Optional[asyncio.Event] = None
+        self._poller: Optional[asyncio.Task] = None
+        # workspace -> waiters, and the latest seq the poller last saw for it
+        self._watchers: Dict[str, int] = {}
+        self._latest: Dict[str, int] = {}
+        self._reading: Dict[str, asyncio.Future] = {}  # first reads, shared
+
+    def get_changes(
+        self, since: int = 0, limit: int = 500, workspace_id: str = DEFAULT_WORKSPACE
+    ) -> ChangesResponse:
+        """Get up to `limit` of a workspace's changes after the cursor."""
+        oldest, latest = self.db_service.change_log_bounds(workspace_id)
+        if since < oldest - 1:
+            # Entries after the cursor were trimmed; the client must reload
+            return ChangesResponse(
+                changes=[], cursor=latest, latest=latest, has_more=False, reset=True
+            )
+
+        changes = [
+            ChatChange(**change)
+            for change in self.db_service.get_changes(since, limit, workspace_id)
+        ]
+        cursor = changes[-1].seq if changes else since
+        if len(changes) < limit:
+            # Nothing else for this workspace up to `latest`; skip other workspaces'
+            cursor = max(cursor, latest)
+        return ChangesResponse(
+            changes=changes,
+            cursor=cursor,
+            latest=max(latest, cursor),
+            has_more=cursor < latest,
+        )
+
+    async def wait_for_changes(
+        self, since: int, timeout: float, workspace_id: str = DEFAULT_WORKSPACE
+    ) -> bool:
+        """Wait until the log has entries after `since`; False on timeout."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        self._watchers[workspace_id] = self._watchers.get(workspace_id, 0) + 1
+        try:
+            # Take the event before reading, so a change in between still wakes us
+            changed = self._ensure_poller()
+            if workspace_id not in self._latest:
+                # First waiters on this workspace; the poller keeps it current after
+                _, latest = await asyncio.shield(self._read_once(workspace_id))
+                self._publish(workspace_id, latest)
+
+            while self._latest[workspace_id] <= since:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return False
+                changed = self._changed
+            return True
+        finally:
+            self._watchers[workspace_id] -= 1
+            if not self._watchers[workspace_id]:
+                # Nobody keeps it current any more
+                del self._watchers[workspace_id]
+                self._latest.pop(workspace_id, None)
+
+    def _read_once(self, workspace_id: str) -> asyncio.Future:
+        reading = self._reading.get(workspace_id)
+        if reading is None:
+            reading = asyncio.get_running_loop().run_in_executor(
+                None, self.db_service.change_log_bounds, workspace_id
+            )
+            self._reading[workspace_id] = reading
+            reading.add_done_callback(lambda _: self._reading.pop(workspace_id, None))
+        return reading
+
+    def _publish(self, workspace_id: str, latest: int):
+        # Reads can finish out of order; the latest seq only moves forward
+        if workspace_id in self._watchers:
+            self._latest[workspace_id] = max(self._latest.get(workspace_id, 0), latest)
+
+    def _ensure_poller(self) -> asyncio.Event:
+        loop = asyncio.get_running_loop()
+        if (
+            self._poller is None
+            or self._poller.done()
+            or self._poller.get_loop() is not loop
+        ):
+            self._changed = asyncio.Event()
+            self._poller = loop.create_task(self._poll())
+        return self._changed
+
+    async def _poll(self):
+        loop = asyncio.get_running_loop()
+        # The first read always counts as a change, catching up waiters that
+        # read their workspace's latest seq before the poller started
+        version = None
+        while True:
+            current = await loop.run_in_executor(None, self.db_service.archive_version)
+            if current != version:
+                version = current
+                latest = await loop.run_in_executor(
+                    None, self._read_latest, list(self._watchers)
+                )
+                for workspace_id, seq in latest.items():
+                    self._publish(workspace_id, seq)
+                changed, self._changed = self._changed, asyncio.Event()
+                changed.set()
+            await asyncio.sleep(self.poll_interval)
+
+    def _read_latest(self, workspace_ids: List[str]) -> Dict[str, int]:
+        return {
+            workspace_id: self.db_service.change_log_bounds(workspace_id)[1]
+            for workspace_id in workspace_ids
+        }
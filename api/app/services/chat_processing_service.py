@@ -2,54 +2,336 @@
 from app.services.claude_service import ClaudeService
 from app.services.database_service import DatabaseService
 from app.services.pinecone_service import PineconeService
-from app.models.chat import ChatSummary
-from typing import Dict, Any
+from app.services.suggest_service import WorkspaceSuggestIndex
+from app.services.dedup_service import DedupService, Fingerprint
+from app.services.url_index_service import UrlIndexService
+from app.services.preprocess_service import ChatPreprocessor, estimate_tokens
+from app.services.related_service import RelatedService
+from app.services.tracing import annotate, stage
+from app.models.chat import (
+    DEFAULT_WORKSPACE,
+    STATUS_FAILED,
+    STATUS_READY,
+    ChatSummary,
+)
+from typing import Dict, Any, List, Optional, Set
+from uuid import uuid4
+import asyncio
+import contextvars
+import os
+from datetime import datetime
 
 
 class ChatProcessingService:
-    def __init__(self):
-        self.claude_service = ClaudeService()
-        self.db_service = DatabaseService()
-        self.pinecone_service = PineconeService()
+    def __init__(
+        self,
+        claude_service: Optional[ClaudeService] = None,
+        db_service: Optional[DatabaseService] = None,
+        pinecone_service: Optional[PineconeService] = None,
+        dedup_service: Optional[DedupService] = None,
+        suggest_service: Optional[WorkspaceSuggestIndex] = None,
+        url_index_service: Optional[UrlIndexService] = None,
+        preprocessor: Optional[ChatPreprocessor] = None,
+        related_service: Optional[RelatedService] = None,
+    ):
+        self.claude_service = claude_service or ClaudeService()
+        self.db_service = db_service or DatabaseService()
+        self.pinecone_service = pinecone_service or PineconeService()
+        self.dedup_service = dedup_service or DedupService(self.db_service)
+        self.suggest_service = suggest_service
+        self.url_index_service = url_index_service or UrlIndexService(self.db_service)
+        self.preprocessor = preprocessor or ChatPreprocessor()
+        self.related_service = related_service or RelatedService(
+            self.db_service, self.pinecone_service
+        )
+
+        # Two-phase mode: save and return the card fields first, add the recap later
+        self.two_phase = os.getenv("TWO_PHASE_SUMMARIES", "true").lower() == "true"
+        self.recap_concurrency = int(os.getenv("RECAP_CONCURRENCY", "4"))
+        self.recap_max_attempts = int(os.getenv("RECAP_MAX_ATTEMPTS", "3"))
+        # Claimed jobs untouched for this long belonged to a worker that died
+        self.recap_stale_seconds = float(os.getenv("RECAP_STALE_SECONDS", "600"))
+        self._recap_slots: Optional[asyncio.Semaphore] = None
+        self._recap_tasks: Dict[str, asyncio.Task] = {}  # chat_id -> task
+        self.recaps_completed = 0
+        self.recaps_failed = 0
+        # Related-chat updates run in the threadpool, a few at a time
+        self.related_concurrency = int(os.getenv("RELATED_CONCURRENCY", "2"))
+        self._related_slots: Optional[asyncio.Semaphore] = None
+        self._related_tasks: Set[asyncio.Task] = set()
 
     async def process_and_store_chat(self, input_data: Dict[str, Any]) -> ChatSummary:
         """Complete pipeline: LLM processing → Database storage → Pinecone embedding."""
 
-        # Step 1: Process with Claude (your existing functionality)
-        summary = await self.claude_service.summarize_chat(input_data)
+        # Step 0: Near-duplicate check, before paying for a model call
+        fingerprint = None
+        with stage("dedup"):
+            if self.dedup_service.enabled:
+                # to_thread copies the request's context, so the trace sees its SQL
+                fingerprint = await asyncio.to_thread(
+                    self.dedup_service.fingerprint, input_data.get("chat_content", "")
+                )
+            duplicate = (
+                self._handle_duplicate(input_data, fingerprint) if fingerprint else None
+            )
+        if duplicate:
+            return duplicate
+
+        # Step 1: Trim scraped boilerplate so the model only reads the conversation
+        with stage("preprocess"):
+            prepared = await asyncio.to_thread(self.preprocessor.prepare, input_data)
+        annotate(
+            tokens_before=estimate_tokens(input_data.get("chat_content", "")),
+            tokens_after=estimate_tokens(prepared.get("chat_content", "")),
+        )
+
+        two_phase = input_data.get("two_phase")
+        if two_phase if two_phase is not None else self.two_phase:
+            # Step 2: Card fields only; the recap is generated in the background
+            with stage("llm_card"):
+                summary = await self.claude_service.summarize_card(prepared)
+            summary.workspace_id = input_data.get("workspace_id", DEFAULT_WORKSPACE)
+
+            stored = self._store_summary(summary, fingerprint, recap_input=prepared)
+            self._start_recap(summary.id, summary.workspace_id, prepared, attempts=1)
+            return stored
+
+        # Step 2: Process with Claude (your existing functionality)
+        with stage("llm"):
+            summary = await self.claude_service.summarize_chat(prepared)
+        summary.workspace_id = input_data.get("workspace_id", DEFAULT_WORKSPACE)
+
+        return self._store_summary(summary, fingerprint)
+
+    def _start_recap(
+        self,
+        chat_id: str,
+        workspace_id: str,
+        input_data: Dict[str, Any],
+        attempts: int,
+    ):
+        # Fresh context: the request that saved the card is traced and done
+        task = asyncio.get_running_loop().create_task(
+            self._generate_recap(chat_id, workspace_id, input_data, attempts),
+            context=contextvars.Context(),
+        )
+        self._recap_tasks[chat_id] = task
+        task.add_done_callback(lambda _: self._recap_tasks.pop(chat_id, None))
+
+    async def _generate_recap(
+        self,
+        chat_id: str,
+        workspace_id: str,
+        input_data: Dict[str, Any],
+        attempts: int,
+    ):
+        """Generate a card's recap (retrying with backoff) and patch it in."""
+        if self._recap_slots is None:
+            self._recap_slots = asyncio.Semaphore(self.recap_concurrency)
+
+        async with self._recap_slots:
+            while True:
+                try:
+                    recap = await self.claude_service.generate_recap(input_data)
+                    status = STATUS_READY
+                    break
+                except Exception as e:
+                    print(f"Recap for chat {chat_id} failed (attempt {attempts}): {e}")
+                    if attempts >= self.recap_max_attempts:
+                        recap, status = "", STATUS_FAILED
+                        break
+                    await asyncio.sleep(2**attempts)
+                    attempts += 1
+
+        try:
+            updated = await asyncio.get_running_loop().run_in_executor(
+                None,
+                self.db_service.finish_recap,
+                chat_id,
+                workspace_id,
+                recap,
+                status,
+            )
+        except Exception as e:
+            # The job stays claimed and is retried once it goes stale
+            print(f"Error saving recap for chat {chat_id}: {e}")
+            return
+
+        if status == STATUS_READY:
+            self.recaps_completed += 1
+        else:
+            self.recaps_failed += 1
+        if updated:
+            print(f"Recap for chat {chat_id}: {status}")
+
+    async def resume_recaps(self) -> int:
+        """Restart recap jobs abandoned by a restart or a crashed worker."""
+        jobs = await asyncio.get_running_loop().run_in_executor(
+            None, self.db_service.claim_recap_jobs, self.recap_stale_seconds
+        )
+        for job in jobs:
+            if job["chat_id"] in self._recap_tasks:
+                # Still queued here behind other recaps, not abandoned
+                continue
+            if job["attempts"] > self.recap_max_attempts:
+                await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    self.db_service.finish_recap,
+                    job["chat_id"],
+                    job["workspace_id"],
+                    "",
+                    STATUS_FAILED,
+                )
+                self.recaps_failed += 1
+                continue
+            print(f"Resuming recap for chat {job['chat_id']}")
+            self._start_recap(
+                job["chat_id"], job["workspace_id"], job["input"], job["attempts"]
+            )
+        return len(jobs)
+
+    def recap_stats(self) -> Dict[str, Any]:
+        return {
+            "two_phase": self.two_phase,
+            "running": len(self._recap_tasks),
+            "completed": self.recaps_completed,
+            "failed": self.recaps_failed,
+            "related_pending": len(self._related_tasks),
+        }
+
+    def _handle_duplicate(
+        self, input_data: Dict[str, Any], fingerprint: Fingerprint
+    ) -> Optional[ChatSummary]:
+        """Link or reuse an existing card when the content is a near-duplicate."""
+        source_url = input_data.get("source_url", "")
+        workspace_id = input_data.get("workspace_id", DEFAULT_WORKSPACE)
+        match = self.dedup_service.find_duplicate(
+            fingerprint, exclude_source_url=source_url, workspace_id=workspace_id
+        )
+        if not match:
+            return None
+
+        existing = self.db_service.get_chat_summary(match.chat_id, workspace_id)
+        if not existing:
+            return None
+
+        print(
+            f"Near-duplicate of chat {existing.id} (similarity {match.similarity:.2f}), "
+            f"mode={self.dedup_service.mode}"
+        )
+
+        if self.dedup_service.mode == "reuse":
+            if existing.status != STATUS_READY:
+                # No finished recap to copy yet; summarize this chat on its own
+                return None
+            # New card for this URL, but with the existing summary (no model call)
+            summary = existing.model_copy(
+                update={
+                    "id": str(uuid4()),
+                    "source_url": source_url,
+                    "platform": input_data.get("platform", "") or existing.platform,
+                    "project": input_data.get("project", "General"),
+                    "tags": list(set(existing.tags + (input_data.get("tags") or []))),
+                    "created_at": datetime.utcnow(),
+                }
+            )
+            return self._store_summary(summary, fingerprint)
+
+        # Default "link" mode: no new row or vector, the URL points at the card
+        self.db_service.save_alias(
+            source_url, existing.id, match.similarity, workspace_id
+        )
+        self.url_index_service.add(source_url, workspace_id)
+        return existing
+
+    def _store_summary(
+        self,
+        summary: ChatSummary,
+        fingerprint: Optional[Fingerprint] = None,
+        recap_input: Optional[Dict[str, Any]] = None,
+    ) -> ChatSummary:
+        """Persist a summary to the database, its indexes and Pinecone."""
+
+        # Step 3: Store in database (with overwrite logic)
+        with stage("db_save"):
+            replaced_urls = self.db_service.save_chat_summary(summary, recap_input)
+            # Cards replaced through another variant of the URL are still
+            # indexed under their own source URL
+            stale_urls = [url for url in replaced_urls if url != summary.source_url]
+
+            if fingerprint:
+                self.dedup_service.store(summary.id, fingerprint)
+
+            self.url_index_service.add(summary.source_url, summary.workspace_id)
 
-        # Step 2: Store in database (with overwrite logic)
-        success = self.db_service.save_chat_summary(summary)
-        if not success:
-            raise Exception("Failed to save chat summary to database")
+        # Keep autocomplete in sync with the stored card
+        if self.suggest_service:
+            with stage("suggest_index"):
+                for url in stale_urls:
+                    self.suggest_service.remove_source(url, summary.workspace_id)
+                self.suggest_service.add_summary(summary)
 
-        # Step 3: Store embedding in Pinecone
-        embedding_success = self.pinecone_service.store_embedding(summary)
+        # Step 4: Store embedding in Pinecone
+        with stage("vector_store"):
+            for url in stale_urls:
+                self.pinecone_service.delete_embedding_by_source_url(
+                    url, summary.workspace_id
+                )
+            embedding_success = self.pinecone_service.store_embedding(summary)
         if not embedding_success:
             print(f"Warning: Failed to store embedding for chat {summary.id}")
             # Don't fail the whole operation, just log the warning
 
+        # Step 5: Related-chat lists, off the request path
+        task = asyncio.get_running_loop().create_task(
+            self._update_related(summary), context=contextvars.Context()
+        )
+        self._related_tasks.add(task)
+        task.add_done_callback(self._related_tasks.discard)
+
         return summary
 
-    def chat_exists(self, source_url: str) -> bool:
+    async def _update_related(self, summary: ChatSummary):
+        if self._related_slots is None:
+            self._related_slots = asyncio.Semaphore(self.related_concurrency)
+
+        try:
+            async with self._related_slots:
+                count = await asyncio.get_running_loop().run_in_executor(
+                    None, self.related_service.update_for, summary
+                )
+            print(f"Saved {count} related chats for chat {summary.id}")
+        except Exception as e:
+            print(f"Error updating related chats for {summary.id}: {e}")
+
+    def chat_exists(
+        self, source_url: str, workspace_id: str = DEFAULT_WORKSPACE
+    ) -> bool:
         """Check if chat already exists."""
-        return self.db_service.chat_exists(source_url)
+        return self.url_index_service.contains(source_url, workspace_id)
+
+    def chats_exist(
+        self, source_urls: List[str], workspace_id: str = DEFAULT_WORKSPACE
+    ) -> Dict[str, bool]:
+        """Check many source URLs at once."""
+        return self.url_index_service.contains_many(source_urls, workspace_id)
 
-    def get_chat_by_id(self, chat_id: str) -> ChatSummary:
+    def delete_chat(self, chat_id: str, workspace_id: str = DEFAULT_WORKSPACE) -> bool:
+        """Delete a card everywhere it is stored; False if it does not exist."""
+        source_url = self.db_service.delete_chat(chat_id, workspace_id)
+        if source_url is None:
+            return False
+
+        if self.suggest_service:
+            self.suggest_service.remove_source(source_url, workspace_id)
+        self.pinecone_service.delete_embedding_by_source_url(source_url, workspace_id)
+        return True
+
+    def get_chat_by_id(
+        self, chat_id: str, workspace_id: str = DEFAULT_WORKSPACE
+    ) -> ChatSummary:
         """Get a specific chat by ID."""
-        result = self.db_service.get_chat_by_id(chat_id)
+        result = self.db_service.get_chat_summary(chat_id, workspace_id)
         if not result:
             raise Exception(f"Chat with ID {chat_id} not found")
-
-        # Convert SearchResult back to ChatSummary
-        return ChatSummary(
-            id=result.id,
-            title=result.title,
-            synthesis=result.synthesis,
-            recap=result.recap,
-            project_name=result.project_name,
-            tags=result.tags,
-            source_url=result.source_url,
-            platform=result.platform,
-            created_at=result.created_at,
-        )
+        return result
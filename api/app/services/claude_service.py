@@ -3,29 +3,143 @@ import os
 import re
 import json
 import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime
 from uuid import uuid4
-from app.models.chat import ChatSummary
+from app.models.chat import STATUS_ENRICHING, ChatSummary
+from app.services.model_router import ModelRouter
+from app.services.preprocess_service import estimate_tokens
+from app.services.tracing import annotate
+
+
+# Output budget for the card-only first phase of two-phase summarization
+CARD_MAX_TOKENS = 400
 
 
 class ClaudeService:
-    def __init__(self):
+    def __init__(self, router: Optional[ModelRouter] = None):
         self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        self.router = router or ModelRouter.from_env()
 
-    def _make_sync_api_call(self, prompt: str, max_tokens: int = 2000) -> str:
-        """Make a synchronous API call to Claude."""
+    def _make_sync_api_call(
+        self,
+        prompt: str,
+        model: str,
+        max_tokens: int = 2000,
+        timeout: Optional[float] = None,
+    ) -> Tuple[str, Dict[str, int]]:
+        """Make a synchronous API call to Claude; returns the text and token usage."""
         try:
             message = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
+                model=model,
                 max_tokens=max_tokens,
                 messages=[{"role": "user", "content": prompt}],
+                timeout=timeout,
             )
-            return message.content[0].text.strip()
+            usage = {
+                "input_tokens": message.usage.input_tokens,
+                "output_tokens": message.usage.output_tokens,
+            }
+            return message.content[0].text.strip(), usage
         except Exception as e:
             print(f"API call error: {e}")
             raise e  # Re-raise to see the actual error
 
+    async def _call_model(
+        self,
+        prompt: str,
+        input_data: Dict[str, Any],
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """Route the prompt to a model (see ModelRouter) and return its reply."""
+        input_tokens = estimate_tokens(prompt)
+        route = self.router.select(
+            input_tokens,
+            platform=input_data.get("platform", ""),
+            verbose=input_data.get("verbose", False),
+            latency_budget_ms=input_data.get("latency_budget_ms"),
+        )
+        annotate(model_route=route.name)
+
+        response, used_route = await asyncio.get_event_loop().run_in_executor(
+            None,
+            self.router.call,
+            route,
+            lambda r: self._make_sync_api_call(
+                prompt,
+                r.model,
+                min(r.max_tokens, max_tokens or r.max_tokens),
+                r.timeout_s,
+            ),
+            input_tokens,
+        )
+        if used_route is not route:
+            annotate(model_route=used_route.name)
+        return response
+
+    async def summarize_card(self, input_data: Dict[str, Any]) -> ChatSummary:
+        """Fast first phase: title, synthesis, project and tags, without a recap."""
+        chat_content = input_data.get("chat_content", "")
+        highlights = input_data.get("highlights", [])
+        udf_tags = input_data.get("tags") or []
+        highlights_text = "\n".join(f"- {h}" for h in highlights)
+
+        prompt = f"""Identify what this content is about. Emphasize highlighted points.
+
+CONTENT: {chat_content}
+HIGHLIGHTS (PRIORITY): {highlights_text}
+
+Return a single-line JSON object and nothing else:
+{{"title": "Concise descriptive title", "synthesis": "2-3 sentence high-level summary", "suggested_project": "Most appropriate category (e.g. Current Events, Web Development, Team Planning, Personal Learning, Research, Work Discussion)", "suggested_tags": ["3-5 relevant topic tags"]}}"""
+
+        parsed: Dict[str, Any] = {}
+        try:
+            # The card is short whatever the verbose flag says; keep it on a fast route
+            response = await self._call_model(
+                prompt, {**input_data, "verbose": False}, CARD_MAX_TOKENS
+            )
+            json_match = re.search(r"\{.*\}", response, re.DOTALL)
+            parsed = json.loads(json_match.group(0) if json_match else response)
+        except Exception as e:
+            print(f"Error generating chat card: {e}")
+
+        suggested_tags = parsed.get("suggested_tags") or []
+        if not isinstance(suggested_tags, list):
+            suggested_tags = []
+        return ChatSummary(
+            id=str(uuid4()),
+            title=parsed.get("title", "Chat Summary"),
+            synthesis=parsed.get("synthesis", "Error processing chat content"),
+            recap="",
+            project_name=parsed.get("suggested_project", "General"),
+            project=input_data.get("project", "General"),
+            tags=list(set(list(udf_tags) + suggested_tags)),
+            source_url=input_data.get("source_url", ""),
+            platform=input_data.get("platform", ""),
+            created_at=datetime.utcnow(),
+            status=STATUS_ENRICHING,
+        )
+
+    async def generate_recap(self, input_data: Dict[str, Any]) -> str:
+        """Slow second phase: the detailed markdown recap. Raises on failure."""
+        chat_content = input_data.get("chat_content", "")
+        highlights = input_data.get("highlights", [])
+        highlights_text = "\n".join(f"- {h}" for h in highlights)
+
+        prompt = f"""Extract and structure the key information from this content. Emphasize highlighted points.
+
+CONTENT: {chat_content}
+HIGHLIGHTS (PRIORITY): {highlights_text}
+
+Instructions: Write well-structured markdown with headers, bullets, and bold formatting. Present information directly without conversational references. Return only the markdown."""
+
+        recap = await self._call_model(prompt, input_data)
+        # Strip a wrapping code fence if the model added one
+        fence_match = re.match(
+            r"^```(?:markdown|md)?\s*\n(.*)\n```$", recap, re.DOTALL
+        )
+        return fence_match.group(1).strip() if fence_match else recap
+
     async def summarize_chat(self, input_data: Dict[str, Any]) -> ChatSummary:
         """Summarize chat content with emphasis on highlights."""
         chat_content = input_data.get("chat_content", "")
@@ -50,9 +164,7 @@ Return a single-line JSON object with no line breaks:
 IMPORTANT: Return only valid JSON on a single line. Use \\n for line breaks within strings."""
 
         try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, self._make_sync_api_call, prompt
-            )
+            response = await self._call_model(prompt, input_data)
 
             print(f"Raw API response: {response}")  # Debug logging
 
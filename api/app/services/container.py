@@ -0,0 +1,188 @@
+# app/services/container.py
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+from app.services.claude_service import ClaudeService
+from app.services.model_router import ModelRouter
+from app.services.database_service import DatabaseService
+from app.services.pinecone_service import PineconeService
+from app.services.suggest_service import WorkspaceSuggestIndex
+from app.services.dedup_service import DedupService
+from app.services.url_index_service import UrlIndexService
+from app.services.preprocess_service import ChatPreprocessor
+from app.services.related_service import RelatedService
+from app.services.change_feed_service import ChangeFeedService
+from app.services.chat_processing_service import ChatProcessingService
+from app.services.search_service import SearchService
+from app.services.db_writer import remote_writer_from_env
+
+
+class ServiceContainer:
+    """One shared, lazily built instance of every service.
+
+    Nothing is constructed at import time. Local resources (SQLite) are created
+    on first use; network-bound warm-up (Pinecone, the suggestion index) runs in
+    a background thread so the app can serve liveness checks immediately.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.getenv("DATABASE_PATH", "chatcards.db")
+        self._lock = threading.RLock()
+        self._instances: Dict[str, Any] = {}
+        self._warm_up_thread = None
+        self.warm_up_done = False
+        self.started_at = time.time()
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = factory()
+                    self._instances[name] = instance
+        return instance
+
+    def override(self, **instances: Any):
+        """Replace services (e.g. with local fakes) before they are first used."""
+        with self._lock:
+            self._instances.update(instances)
+
+    @property
+    def db(self) -> DatabaseService:
+        # Under the multi-worker launcher, writes go through the writer process
+        return self._get(
+            "db",
+            lambda: DatabaseService(self.db_path, writer=remote_writer_from_env()),
+        )
+
+    @property
+    def model_router(self) -> ModelRouter:
+        return self._get("model_router", ModelRouter.from_env)
+
+    @property
+    def claude(self) -> ClaudeService:
+        return self._get("claude", lambda: ClaudeService(self.model_router))
+
+    @property
+    def pinecone(self) -> PineconeService:
+        # Connected by warm_up(), never on construction
+        return self._get("pinecone", lambda: PineconeService(connect=False))
+
+    @property
+    def suggest(self) -> WorkspaceSuggestIndex:
+        return self._get("suggest", self._create_suggest)
+
+    def _create_suggest(self) -> WorkspaceSuggestIndex:
+        # Other workers' saves only reach this process through the database
+        refresh_interval = None
+        if self.db.writer is not None:
+            refresh_interval = float(os.getenv("SUGGEST_REFRESH_SECONDS", "2"))
+        return WorkspaceSuggestIndex(self.db, refresh_interval=refresh_interval)
+
+    @property
+    def dedup(self) -> DedupService:
+        return self._get("dedup", lambda: DedupService(self.db))
+
+    @property
+    def url_index(self) -> UrlIndexService:
+        return self._get("url_index", lambda: UrlIndexService(self.db))
+
+    @property
+    def preprocessor(self) -> ChatPreprocessor:
+        return self._get("preprocessor", ChatPreprocessor)
+
+    @property
+    def related(self) -> RelatedService:
+        return self._get("related", lambda: RelatedService(self.db, self.pinecone))
+
+    @property
+    def change_feed(self) -> ChangeFeedService:
+        return self._get(
+            "change_feed",
+            lambda: ChangeFeedService(
+                self.db, poll_interval=float(os.getenv("CHANGE_POLL_SECONDS", "0.25"))
+            ),
+        )
+
+    @property
+    def chat_processing(self) -> ChatProcessingService:
+        return self._get(
+            "chat_processing",
+            lambda: ChatProcessingService(
+                claude_service=self.claude,
+                db_service=self.db,
+                pinecone_service=self.pinecone,
+                dedup_service=self.dedup,
+                suggest_service=self.suggest,
+                url_index_service=self.url_index,
+                preprocessor=self.preprocessor,
+                related_service=self.related,
+            ),
+        )
+
+    @property
+    def search(self) -> SearchService:
+        return self._get(
+            "search",
+            lambda: SearchService(db_service=self.db, pinecone_service=self.pinecone),
+        )
+
+    def start_warm_up(self):
+        """Warm up backends in a daemon thread (idempotent)."""
+        with self._lock:
+            if self._warm_up_thread is None:
+                self._warm_up_thread = threading.Thread(
+                    target=self.warm_up, name="service-warm-up", daemon=True
+                )
+                self._warm_up_thread.start()
+
+    def warm_up(self):
+        """Initialize the database, build in-memory indexes and connect Pinecone."""
+        # Retried with backoff: a transient failure must not leave the
+        # readiness probe at 503 for the life of the process
+        delay = 5
+        while True:
+            try:
+                self.db
+                self.suggest.build()
+                self.url_index.build()
+                break
+            except Exception as e:
+                print(f"Warm-up failed: {e}; retrying in {delay}s...")
+                time.sleep(delay)
+                delay = min(delay * 2, 300)
+
+        self.warm_up_done = True
+        print(f"Services warmed up in {time.time() - self.started_at:.2f}s")
+
+        # Pinecone is optional: keep retrying in the background while it errors.
+        # Cards saved meanwhile are held and embedded once it connects
+        delay = 5
+        while not self.pinecone.connect() and self.pinecone.status == "error":
+            print(f"Retrying Pinecone connection in {delay}s...")
+            time.sleep(delay)
+            delay = min(delay * 2, 300)
+
+    def readiness(self) -> Dict[str, Any]:
+        """Report backend state for the readiness probe."""
+        database_ok = True
+        try:
+            self.db.count_chats()
+        except Exception:
+            database_ok = False
+
+        pinecone = self.pinecone
+        return {
+            "ready": database_ok and self.warm_up_done,
+            "database": "ready" if database_ok else "error",
+            "suggest_index": "ready" if self.suggest.ready else "pending",
+            "url_index": "ready" if self.url_index.ready else "pending",
+            "pinecone": pinecone.status,
+            "pinecone_error": pinecone.last_error,
+            "uptime_s": round(time.time() - self.started_at, 1),
+        }
+
+
+container = ServiceContainer()
@@ -1,108 +1,621 @@
 # app/services/database_service.py
 import sqlite3
 import json
-from typing import List, Optional
-from datetime import datetime
-from app.models.chat import ChatSummary
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
+from app.models.chat import DEFAULT_WORKSPACE, ChatSummary
 from app.models.search import SearchResult, SearchRequest
+from app.services.migrations import (
+    LATEST_VERSION,
+    create_unique_url_index,
+    finish_migrations,
+    migrate,
+    schema_version,
+    to_epoch_ms,
+)
+from app.services.recap_codec import RecapCodec
+from app.services.tracing import current_trace
+from app.services.urls import normalize_url
+
+
+# Operations that modify the database; in multi-worker mode only the writer runs them
+WRITE_OPERATIONS = {
+    "save_chat_summary",
+    "insert_chat_summaries",
+    "delete_chat",
+    "save_fingerprint",
+    "save_alias",
+    "merge_duplicate_url",
+    "create_unique_url_index",
+    "finish_recap",
+    "claim_recap_jobs",
+    "save_neighbors",
+    "save_recap_dictionary",
+    "recompact_recaps",
+    "vacuum",
+}
+
+# Seconds a connection waits on a locked database before raising
+BUSY_TIMEOUT = 30.0
+
+# Bound parameters per statement for IN (...) lookups
+MAX_IN_PARAMS = 500
+
+# Change-log entries kept for incremental sync; older cursors must resync
+CHANGE_LOG_MAX_ROWS = int(os.getenv("CHANGE_LOG_MAX_ROWS", "100000"))
 
 
 class DatabaseService:
-    def __init__(self, db_path: str = "chatcards.db"):
+    def __init__(self, db_path: str = "chatcards.db", writer: Any = None):
         self.db_path = db_path
-        self.init_database()
+        # When set (multi-worker mode), writes are forwarded to the single
+        # writer process, which also owns schema setup
+        self.writer = writer
+        self._version_conn: Optional[sqlite3.Connection] = None
+        self._version_lock = threading.Lock()
+        # Last archive version read, and the data_version it was read at
+        self._archive_version: Optional[int] = None
+        self._archive_version_seen: Optional[int] = None
+        # Schema version last seen (PRAGMA user_version), see _schema_at_least
+        self._schema_version = 0
+        # Runs pending migration backfills after startup, see init_database
+        self._migration_thread: Optional[threading.Thread] = None
+        self.recap_codec = RecapCodec(self._load_recap_dictionary)
+        if writer is None:
+            self.init_database()
 
-    def init_database(self):
-        """Initialize SQLite database with chat summaries table."""
-        with sqlite3.connect(self.db_path) as conn:
-            # First, check if we need to add the project column
-            cursor = conn.execute("PRAGMA table_info(chat_summaries)")
-            columns = [row[1] for row in cursor.fetchall()]
-
-            if "project" not in columns:
-                # Add the project column to existing table
-                print("Adding 'project' column to existing chat_summaries table...")
-                conn.execute(
-                    "ALTER TABLE chat_summaries ADD COLUMN project TEXT DEFAULT 'General'"
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection; commit on success, roll back on error, always close."""
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+        conn.create_function("normalize_url", 1, normalize_url, deterministic=True)
+        conn.create_function(
+            "recap_decode", 3, self.recap_codec.decode, deterministic=True
+        )
+        trace = current_trace()
+        if trace is not None:
+            # Capture statements for the slow-request log (literals redacted)
+            conn.set_trace_callback(trace.record_query)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def data_version(self) -> int:
+        """Cheap change detector: bumps whenever another connection commits."""
+        with self._version_lock:
+            if self._version_conn is None:
+                self._version_conn = sqlite3.connect(
+                    self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False
                 )
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
 
-            conn.execute(
+    def archive_version(self) -> int:
+        """Global counter bumped by every write that changes stored chats or aliases.
+
+        Cached in-process and only re-read after SQLite reports a commit, so an
+        idle archive answers without touching any table.
+        """
+        seen = self.data_version()
+        with self._version_lock:
+            if self._archive_version is not None and seen == self._archive_version_seen:
+                return self._archive_version
+
+        with self._connect() as conn:
+            version = conn.execute(
+                "SELECT version FROM archive_version WHERE id = 1"
+            ).fetchone()[0]
+
+        with self._version_lock:
+            self._archive_version = version
+            self._archive_version_seen = seen
+        return version
+
+    def get_chat_version(
+        self, chat_id: str, workspace_id: str = DEFAULT_WORKSPACE
+    ) -> Optional[int]:
+        """Get a chat's row version (answered from an index), or None if missing."""
+        with self._connect() as conn:
+            # The primary-key index alone would still read the row from the table
+            row = conn.execute(
                 """
-                CREATE TABLE IF NOT EXISTS chat_summaries (
-                    id TEXT PRIMARY KEY,
-                    title TEXT NOT NULL,
-                    synthesis TEXT NOT NULL,
-                    recap TEXT NOT NULL,
-                    project_name TEXT NOT NULL,  -- AI suggested project
-                    project TEXT NOT NULL DEFAULT 'General',  -- User specified project
-                    tags TEXT NOT NULL,  -- JSON array
-                    source_url TEXT UNIQUE NOT NULL,
-                    platform TEXT NOT NULL,
-                    created_at TEXT NOT NULL
-                )
-            """
-            )
+                SELECT version FROM chat_summaries INDEXED BY idx_id_ws_version
+                WHERE id = ? AND workspace_id = ?
+            """,
+                (chat_id, workspace_id),
+            ).fetchone()
+        return row[0] if row else None
 
-            # Create indexes for search performance
-            conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_title ON chat_summaries(title)"
-            )
-            conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_project_name ON chat_summaries(project_name)"
-            )
-            conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_project ON chat_summaries(project)"
-            )  # New index
-            conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_platform ON chat_summaries(platform)"
-            )
+    @staticmethod
+    def _bump_archive_version(conn: sqlite3.Connection) -> int:
+        conn.execute("UPDATE archive_version SET version = version + 1 WHERE id = 1")
+        cursor = conn.execute("SELECT version FROM archive_version WHERE id = 1")
+        return cursor.fetchone()[0]
+
+    def explain_query_plan(self, sql: str) -> List[str]:
+        """Return SQLite's query plan for a statement, one line per step."""
+        with self._connect() as conn:
+            conn.set_trace_callback(None)
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        return [row[-1] for row in rows]
+
+    def _schema_at_least(self, version: int) -> bool:
+        """Whether a migration has landed (its backfill included).
+
+        While a backfill is still running, in the background or in the writer
+        process, readers keep to the previous schema's columns and indexes.
+        """
+        if self._schema_version < version:
+            with self._connect() as conn:
+                self._schema_version = schema_version(conn)
+        return self._schema_version >= version
+
+    def _created_column(self) -> str:
+        """Column to filter and sort on by creation time."""
+        return "created_ts" if self._schema_at_least(2) else "created_at"
+
+    def _recap_column(self, include_recap: bool, table: str = "chat_summaries") -> str:
+        """Select-list expression for a card's recap ('' when not wanted).
+
+        Bodies are stored compressed in chat_recaps and only read (and
+        decompressed) for full cards; rows from before the move keep theirs
+        inline until the v3 backfill has copied them.
+        """
+        if not include_recap:
+            return "'' AS recap"
+        return f"""COALESCE(
+                (SELECT recap_decode(r.codec, r.dict_id, r.body)
+                 FROM chat_recaps r WHERE r.chat_id = {table}.id),
+                {table}.recap) AS recap"""
+
+    def _load_recap_dictionary(self, dict_id: int) -> bytes:
+        # Own connection: this runs inside recap_decode, mid-query
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+        try:
+            row = conn.execute(
+                "SELECT data FROM recap_dictionaries WHERE id = ?", (dict_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            raise ValueError(f"Recap dictionary {dict_id} is missing")
+        return row[0]
+
+    def _store_recap(self, conn: sqlite3.Connection, chat_id: str, recap: str):
+        conn.execute("DELETE FROM chat_recaps WHERE chat_id = ?", (chat_id,))
+        if recap:
             conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_source_url ON chat_summaries(source_url)"
+                """
+                INSERT INTO chat_recaps (chat_id, codec, dict_id, body, raw_bytes)
+                VALUES (?, ?, ?, ?, ?)
+            """,
+                self.recap_codec.row(chat_id, recap, self._newest_dictionary(conn)),
             )
-            conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_created_at ON chat_summaries(created_at)"
+
+    @staticmethod
+    def _newest_dictionary(conn: sqlite3.Connection) -> Optional[int]:
+        return conn.execute("SELECT MAX(id) FROM recap_dictionaries").fetchone()[0]
+
+    def _write(self, operation: str, *args) -> Any:
+        """Run a write locally, or through the single writer when configured."""
+        if self.writer is not None:
+            return self.writer.submit(operation, *args)
+        return self.apply_write(operation, *args)
+
+    def apply_write(self, operation: str, *args) -> Any:
+        """Execute a named write operation on this process's connection."""
+        if operation not in WRITE_OPERATIONS:
+            raise ValueError(f"Unknown write operation: {operation}")
+        return getattr(self, f"_{operation}")(*args)
+
+    def init_database(self):
+        """Initialize the SQLite database and apply pending schema migrations.
+
+        Schema steps run here; their backfills run on a background thread, so
+        startup does not wait on archive-sized work.
+        """
+        with self._connect() as conn:
+            # WAL lets readers in other processes run while a write is in progress
+            conn.execute("PRAGMA journal_mode=WAL")
+
+            self._schema_version = migrate(conn)
+
+        if self._schema_version < LATEST_VERSION:
+            self._migration_thread = threading.Thread(
+                target=self._finish_migrations, name="db-migrations", daemon=True
             )
+            self._migration_thread.start()
+
+    def _finish_migrations(self):
+        try:
+            with self._connect() as conn:
+                self._schema_version = finish_migrations(conn)
+        except Exception as e:
+            # Backfills are resumable; the next start picks up where this stopped
+            print(f"Background migration failed: {e}")
+
+    def wait_for_migrations(self):
+        """Block until background migration backfills have finished."""
+        if self._migration_thread is not None:
+            self._migration_thread.join()
+
+    def save_chat_summary(
+        self, summary: ChatSummary, recap_input: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        """Save or update chat summary (Option 2: Always Overwrite).
+
+        A card is identified by its normalized source URL (see `normalize_url`),
+        the same key existence checks use, so saving a variant of a stored URL
+        replaces that card. Returns the source URLs of the replaced cards.
+
+        With `recap_input`, a recap job for the card is queued in the same
+        transaction, already claimed by the caller.
+        """
+        return self._write("save_chat_summary", summary, recap_input)
+
+    def _save_chat_summary(
+        self, summary: ChatSummary, recap_input: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        with self._connect() as conn:
+            key = (summary.workspace_id, normalize_url(summary.source_url))
+            old_rows = conn.execute(
+                """
+                SELECT id, source_url FROM chat_summaries
+                WHERE workspace_id = ? AND normalized_url = ?
+            """,
+                key,
+            ).fetchall()
+            old_ids = [row[0] for row in old_rows]
 
-    def save_chat_summary(self, summary: ChatSummary) -> bool:
-        """Save or update chat summary (Option 2: Always Overwrite)."""
-        with sqlite3.connect(self.db_path) as conn:
             # Delete existing record if it exists
+            for old_id in old_ids:
+                conn.execute("DELETE FROM chat_summaries WHERE id = ?", (old_id,))
+                self._delete_fingerprint(conn, old_id)
+                self._delete_neighbors(conn, old_id)
+                conn.execute("DELETE FROM chat_recap_jobs WHERE chat_id = ?", (old_id,))
+                conn.execute("DELETE FROM chat_recaps WHERE chat_id = ?", (old_id,))
+                # Links to the overwritten card follow it to the new one
+                conn.execute(
+                    "UPDATE chat_aliases SET chat_id = ? WHERE chat_id = ?",
+                    (summary.id, old_id),
+                )
+            # The URL now has a card of its own
             conn.execute(
-                "DELETE FROM chat_summaries WHERE source_url = ?", (summary.source_url,)
+                "DELETE FROM chat_aliases WHERE workspace_id = ? AND normalized_url = ?",
+                key,
             )
 
             # Insert new record
+            version = self._bump_archive_version(conn)
             conn.execute(
                 """
                 INSERT INTO chat_summaries 
-                (id, title, synthesis, recap, project_name, project, tags, source_url, platform, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                (id, workspace_id, title, synthesis, recap, project_name, project, tags, source_url, platform, created_at, created_ts, version, normalized_url, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
                 (
                     summary.id,
+                    summary.workspace_id,
                     summary.title,
                     summary.synthesis,
-                    summary.recap,
+                    "",  # recap body is stored in chat_recaps
                     summary.project_name,
                     summary.project,  # Add user project
                     json.dumps(summary.tags),
                     summary.source_url,
                     summary.platform,
                     summary.created_at.isoformat(),
+                    to_epoch_ms(summary.created_at),
+                    version,
+                    normalize_url(summary.source_url),
+                    summary.status,
                 ),
             )
+            self._store_recap(conn, summary.id, summary.recap)
+            if recap_input is not None:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO chat_recap_jobs
+                    (chat_id, workspace_id, input, attempts, claimed_at)
+                    VALUES (?, ?, ?, 1, ?)
+                """,
+                    (
+                        summary.id,
+                        summary.workspace_id,
+                        json.dumps(recap_input),
+                        datetime.utcnow().isoformat(),
+                    ),
+                )
+            for old_id, old_url in old_rows:
+                if old_url != summary.source_url:
+                    # Under another URL variant: tell sync clients (and other
+                    # workers' indexes) that card is gone from its URL
+                    self._record_change(
+                        conn, summary.workspace_id, "delete", old_id, old_url
+                    )
+            self._record_change(
+                conn,
+                summary.workspace_id,
+                "overwrite" if old_ids else "insert",
+                summary.id,
+                summary.source_url,
+                replaced_id=old_ids[0] if old_ids else None,
+            )
+            return [row[1] for row in old_rows]
+
+    def insert_chat_summaries(self, summaries: List[ChatSummary]) -> int:
+        """Bulk insert summaries in one transaction (imports and benchmark corpora).
+
+        Unlike save_chat_summary this skips per-card overwrite bookkeeping, so it
+        is meant for loading chats whose source URLs are not stored yet.
+        """
+        return self._write("insert_chat_summaries", summaries)
+
+    def _insert_chat_summaries(self, summaries: List[ChatSummary]) -> int:
+        with self._connect() as conn:
+            version = self._bump_archive_version(conn)
+            conn.executemany(
+                """
+                INSERT INTO chat_summaries
+                (id, workspace_id, title, synthesis, recap, project_name, project, tags, source_url, platform, created_at, created_ts, version, normalized_url, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                [
+                    (
+                        summary.id,
+                        summary.workspace_id,
+                        summary.title,
+                        summary.synthesis,
+                        "",
+                        summary.project_name,
+                        summary.project,
+                        json.dumps(summary.tags),
+                        summary.source_url,
+                        summary.platform,
+                        summary.created_at.isoformat(),
+                        to_epoch_ms(summary.created_at),
+                        version,
+                        normalize_url(summary.source_url),
+                        summary.status,
+                    )
+                    for summary in summaries
+                ],
+            )
+            dict_id = self._newest_dictionary(conn)
+            conn.executemany(
+                """
+                INSERT INTO chat_recaps (chat_id, codec, dict_id, body, raw_bytes)
+                VALUES (?, ?, ?, ?, ?)
+            """,
+                [
+                    self.recap_codec.row(summary.id, summary.recap, dict_id)
+                    for summary in summaries
+                    if summary.recap
+                ],
+            )
+            now = datetime.utcnow().isoformat()
+            conn.executemany(
+                """
+                INSERT INTO chat_changes (workspace_id, op, chat_id, source_url, changed_at)
+                VALUES (?, 'insert', ?, ?, ?)
+            """,
+                [
+                    (summary.workspace_id, summary.id, summary.source_url, now)
+                    for summary in summaries
+                ],
+            )
+        return len(summaries)
+
+    def delete_chat(self, chat_id: str, workspace_id: str = DEFAULT_WORKSPACE) -> Optional[str]:
+        """Delete a card, its fingerprint and aliases; returns its source URL if found."""
+        return self._write("delete_chat", chat_id, workspace_id)
+
+    def _delete_chat(self, chat_id: str, workspace_id: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT source_url FROM chat_summaries WHERE id = ? AND workspace_id = ?",
+                (chat_id, workspace_id),
+            ).fetchone()
+            if not row:
+                return None
+
+            conn.execute("DELETE FROM chat_summaries WHERE id = ?", (chat_id,))
+            conn.execute("DELETE FROM chat_recap_jobs WHERE chat_id = ?", (chat_id,))
+            conn.execute("DELETE FROM chat_recaps WHERE chat_id = ?", (chat_id,))
+            self._delete_fingerprint(conn, chat_id)
+            self._delete_neighbors(conn, chat_id)
+            conn.execute("DELETE FROM chat_aliases WHERE chat_id = ?", (chat_id,))
+            self._bump_archive_version(conn)
+            self._record_change(conn, workspace_id, "delete", chat_id, row[0])
+            return row[0]
+
+    def finish_recap(
+        self, chat_id: str, workspace_id: str, recap: str, status: str
+    ) -> bool:
+        """Patch a generated recap (or the failed status) into an enriching card.
+
+        Returns False when the card was overwritten or deleted in the meantime.
+        """
+        return self._write("finish_recap", chat_id, workspace_id, recap, status)
+
+    def _finish_recap(
+        self, chat_id: str, workspace_id: str, recap: str, status: str
+    ) -> bool:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM chat_recap_jobs WHERE chat_id = ?", (chat_id,))
+            row = conn.execute(
+                """
+                SELECT source_url FROM chat_summaries
+                WHERE id = ? AND workspace_id = ? AND status = 'enriching'
+            """,
+                (chat_id, workspace_id),
+            ).fetchone()
+            if not row:
+                return False
+
+            version = self._bump_archive_version(conn)
+            conn.execute(
+                "UPDATE chat_summaries SET status = ?, version = ? WHERE id = ?",
+                (status, version, chat_id),
+            )
+            self._store_recap(conn, chat_id, recap)
+            self._record_change(conn, workspace_id, "update", chat_id, row[0])
             return True
 
-    def keyword_search(self, request: SearchRequest) -> List[SearchResult]:
+    def claim_recap_jobs(
+        self, stale_after_s: float, limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Claim recap jobs nobody is working on (never claimed, or claimed long ago)."""
+        return self._write("claim_recap_jobs", stale_after_s, limit)
+
+    def _claim_recap_jobs(self, stale_after_s: float, limit: int) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        cutoff = (now - timedelta(seconds=stale_after_s)).isoformat()
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                UPDATE chat_recap_jobs
+                SET claimed_at = ?, attempts = attempts + 1
+                WHERE chat_id IN (
+                    SELECT chat_id FROM chat_recap_jobs
+                    WHERE claimed_at IS NULL OR claimed_at < ?
+                    LIMIT ?
+                )
+                RETURNING chat_id, workspace_id, input, attempts
+            """,
+                (now.isoformat(), cutoff, limit),
+            ).fetchall()
+        return [
+            {
+                "chat_id": chat_id,
+                "workspace_id": workspace_id,
+                "input": json.loads(input_json),
+                "attempts": attempts,
+            }
+            for chat_id, workspace_id, input_json, attempts in rows
+        ]
+
+    @staticmethod
+    def _record_change(
+        conn: sqlite3.Connection,
+        workspace_id: str,
+        op: str,
+        chat_id: str,
+        source_url: str,
+        replaced_id: Optional[str] = None,
+    ):
+        cursor = conn.execute(
+            """
+            INSERT INTO chat_changes
+            (workspace_id, op, chat_id, replaced_id, source_url, changed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """,
+            (
+                workspace_id,
+                op,
+                chat_id,
+                replaced_id,
+                source_url,
+                datetime.utcnow().isoformat(),
+            ),
+        )
+        # Trim the log from the front; a primary-key range delete
+        conn.execute(
+            "DELETE FROM chat_changes WHERE seq <= ?",
+            (cursor.lastrowid - CHANGE_LOG_MAX_ROWS,),
+        )
+
+    def get_changes(
+        self,
+        since: int = 0,
+        limit: int = 500,
+        workspace_id: str = DEFAULT_WORKSPACE,
+        include_recap: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Get change-log entries after a cursor, with the current card for each.
+
+        `chat` is None for deletes, and when the card has since been overwritten
+        or deleted (a later entry describes that).
+        """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(
+                f"""
+                SELECT ch.seq, ch.op, ch.chat_id, ch.replaced_id,
+                       ch.source_url AS change_source_url, ch.changed_at,
+                       c.id, c.workspace_id, c.title, c.synthesis,
+                       {self._recap_column(include_recap, "c")},
+                       c.project_name, COALESCE(c.project, 'General') as project,
+                       c.tags, c.source_url, c.platform, c.created_at, c.status
+                FROM chat_changes ch
+                LEFT JOIN chat_summaries c ON c.id = ch.chat_id AND ch.op != 'delete'
+                WHERE ch.workspace_id = ? AND ch.seq > ?
+                ORDER BY ch.seq
+                LIMIT ?
+            """,
+                (workspace_id, since, limit),
+            )
+            rows = cursor.fetchall()
+
+        return [
+            {
+                "seq": row["seq"],
+                "op": row["op"],
+                "chat_id": row["chat_id"],
+                "replaced_id": row["replaced_id"],
+                "source_url": row["change_source_url"],
+                "changed_at": datetime.fromisoformat(row["changed_at"]),
+                "chat": self._row_to_chat_summary(row) if row["id"] else None,
+            }
+            for row in rows
+        ]
+
+    def change_log_bounds(self, workspace_id: Optional[str] = None) -> Tuple[int, int]:
+        """Get the (oldest, latest) sequence numbers in the change log (0 if empty).
+
+        The log is trimmed as a whole, so `oldest` is global. For a workspace,
+        `latest` is the newest cursor worth resuming from: its last entry, or
+        the trimmed front of the log if that is later.
+        """
+        with self._connect() as conn:
+            # Separate subqueries so each is a single index seek
+            oldest, latest, workspace_latest = conn.execute(
+                """
+                SELECT (SELECT MIN(seq) FROM chat_changes),
+                       (SELECT MAX(seq) FROM chat_changes),
+                       (SELECT MAX(seq) FROM chat_changes WHERE workspace_id = ?)
+            """,
+                (workspace_id,),
+            ).fetchone()
+            if latest is None:
+                # Keep cursors monotonic even after the log was trimmed empty
+                row = conn.execute(
+                    "SELECT seq FROM sqlite_sequence WHERE name = 'chat_changes'"
+                ).fetchone()
+                latest = row[0] if row else 0
+                oldest = latest + 1
+
+        if workspace_id is not None:
+            latest = max(workspace_latest or 0, oldest - 1)
+        return oldest, latest
+
+    def keyword_search(
+        self, request: SearchRequest, workspace_id: str = DEFAULT_WORKSPACE
+    ) -> List[SearchResult]:
         """Perform keyword search on metadata."""
         query_parts = []
-        params = []
+        params: List[Any] = [workspace_id]
+        created = self._created_column()
 
         # Base search query
-        base_query = """
-            SELECT id, title, synthesis, recap, project_name, project, tags, 
-                   source_url, platform, created_at
-            FROM chat_summaries WHERE 1=1
+        base_query = f"""
+            SELECT id, title, synthesis, {self._recap_column(request.include_recap)},
+                   project_name, project, tags, source_url, platform, created_at
+            FROM chat_summaries WHERE workspace_id = ?
         """
 
         # Add text search
@@ -124,21 +637,23 @@ class DatabaseService:
             query_parts.append("AND platform = ?")
             params.append(request.platform_filter)
 
+        # Filters and the sort are all answered by one (workspace, filter,
+        # created_ts) index, read newest first until LIMIT rows match
         if request.date_from:
-            query_parts.append("AND created_at >= ?")
-            params.append(request.date_from.isoformat())
+            query_parts.append(f"AND {created} >= ?")
+            params.append(self._created_param(created, request.date_from))
 
         if request.date_to:
-            query_parts.append("AND created_at <= ?")
-            params.append(request.date_to.isoformat())
+            query_parts.append(f"AND {created} <= ?")
+            params.append(self._created_param(created, request.date_to))
 
         # Complete query
         full_query = (
-            base_query + "".join(query_parts) + " ORDER BY created_at DESC LIMIT ?"
+            base_query + " ".join(query_parts) + f" ORDER BY {created} DESC LIMIT ?"
         )
         params.append(request.limit)
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.execute(full_query, params)
             rows = cursor.fetchall()
@@ -162,17 +677,26 @@ class DatabaseService:
 
         return results
 
-    def get_chat_by_id(self, chat_id: str) -> Optional[SearchResult]:
+    @staticmethod
+    def _created_param(column: str, value: datetime) -> Any:
+        return to_epoch_ms(value) if column == "created_ts" else value.isoformat()
+
+    def get_chat_by_id(
+        self,
+        chat_id: str,
+        workspace_id: str = DEFAULT_WORKSPACE,
+        include_recap: bool = True,
+    ) -> Optional[SearchResult]:
         """Get a specific chat by ID."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.execute(
-                """
-                SELECT id, title, synthesis, recap, project_name, tags, 
-                       source_url, platform, created_at
-                FROM chat_summaries WHERE id = ?
+                f"""
+                SELECT id, title, synthesis, {self._recap_column(include_recap)},
+                       project_name, tags, source_url, platform, created_at
+                FROM chat_summaries WHERE id = ? AND workspace_id = ?
             """,
-                (chat_id,),
+                (chat_id, workspace_id),
             )
             row = cursor.fetchone()
 
@@ -192,10 +716,597 @@ class DatabaseService:
             search_type="direct",
         )
 
-    def chat_exists(self, source_url: str) -> bool:
-        """Check if a chat with this source URL already exists."""
-        with sqlite3.connect(self.db_path) as conn:
+    def list_chats(
+        self,
+        limit: int = 100,
+        offset: int = 0,
+        workspace_id: str = DEFAULT_WORKSPACE,
+        include_recap: bool = True,
+    ) -> List[ChatSummary]:
+        """Get stored chats, newest first."""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(
+                f"""
+                SELECT id, workspace_id, title, synthesis,
+                       {self._recap_column(include_recap)}, project_name,
+                       COALESCE(project, 'General') as project, tags,
+                       source_url, platform, created_at, status
+                FROM chat_summaries
+                WHERE workspace_id = ?
+                ORDER BY {self._created_column()} DESC
+                LIMIT ? OFFSET ?
+            """,
+                (workspace_id, limit, offset),
+            )
+            rows = cursor.fetchall()
+
+        return [self._row_to_chat_summary(row) for row in rows]
+
+    def get_chat_summary(
+        self, chat_id: str, workspace_id: str = DEFAULT_WORKSPACE
+    ) -> Optional[ChatSummary]:
+        """Get a specific chat by ID as a full ChatSummary (including user project)."""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(
+                f"""
+                SELECT id, workspace_id, title, synthesis,
+                       {self._recap_column(True)}, project_name,
+                       COALESCE(project, 'General') as project, tags,
+                       source_url, platform, created_at, status
+                FROM chat_summaries WHERE id = ? AND workspace_id = ?
+            """,
+                (chat_id, workspace_id),
+            )
+            row = cursor.fetchone()
+
+        return self._row_to_chat_summary(row) if row else None
+
+    def count_chats(self, workspace_id: Optional[str] = DEFAULT_WORKSPACE) -> int:
+        """Get total count of stored chats (across all workspaces for None)."""
+        with self._connect() as conn:
+            if workspace_id is None:
+                cursor = conn.execute("SELECT COUNT(*) FROM chat_summaries")
+            else:
+                cursor = conn.execute(
+                    "SELECT COUNT(*) FROM chat_summaries WHERE workspace_id = ?",
+                    (workspace_id,),
+                )
+            return cursor.fetchone()[0]
+
+    def has_chats(self, workspace_id: str) -> bool:
+        """Whether the workspace has any stored chat (one index seek)."""
+        with self._connect() as conn:
+            return (
+                conn.execute(
+                    "SELECT 1 FROM chat_summaries WHERE workspace_id = ? LIMIT 1",
+                    (workspace_id,),
+                ).fetchone()
+                is not None
+            )
+
+    def iter_chat_summaries(
+        self,
+        after_rowid: int = 0,
+        chunk_size: int = 1000,
+        workspace_id: Optional[str] = None,
+        include_recap: bool = True,
+    ) -> Iterator[List[Tuple[int, ChatSummary]]]:
+        """Stream stored chats in rowid order, one chunk of (rowid, summary) at a time.
+
+        Uses keyset pagination so each chunk is an index range scan, and a fresh
+        connection per chunk so long runs never hold a read transaction open.
+        """
+        while True:
+            with self._connect() as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.execute(
+                    f"""
+                    SELECT rowid, id, workspace_id, title, synthesis,
+                           {self._recap_column(include_recap)},
+                           project_name, COALESCE(project, 'General') as project,
+                           tags, source_url, platform, created_at, status
+                    FROM chat_summaries
+                    WHERE rowid > ?1 AND (?2 IS NULL OR workspace_id = ?2)
+                    ORDER BY rowid
+                    LIMIT ?3
+                """,
+                    (after_rowid, workspace_id, chunk_size),
+                )
+                rows = cursor.fetchall()
+
+            if not rows:
+                return
+
+            yield [(row["rowid"], self._row_to_chat_summary(row)) for row in rows]
+            after_rowid = rows[-1]["rowid"]
+
+    def get_suggestion_sources(self, workspace_id: str = DEFAULT_WORKSPACE) -> List[sqlite3.Row]:
+        """Get the fields the suggestion index is built from (no recap/synthesis)."""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(
+                """
+                SELECT source_url, title, tags, project_name,
+                       COALESCE(project, 'General') as project
+                FROM chat_summaries
+                WHERE workspace_id = ?
+            """,
+                (workspace_id,),
+            )
+            return cursor.fetchall()
+
+    def chat_exists(self, source_url: str, workspace_id: str = DEFAULT_WORKSPACE) -> bool:
+        """Check if a chat with this source URL already exists (directly or linked)."""
+        return bool(
+            self.existing_normalized_urls([normalize_url(source_url)], workspace_id)
+        )
+
+    def existing_normalized_urls(
+        self, normalized_urls: List[str], workspace_id: str = DEFAULT_WORKSPACE
+    ) -> Set[str]:
+        """Get which of these normalized URLs belong to a stored chat or alias."""
+        existing: Set[str] = set()
+        if not normalized_urls:
+            return existing
+
+        with self._connect() as conn:
+            for start in range(0, len(normalized_urls), MAX_IN_PARAMS):
+                chunk = normalized_urls[start : start + MAX_IN_PARAMS]
+                placeholders = ", ".join("?" for _ in chunk)
+                cursor = conn.execute(
+                    f"""
+                    SELECT normalized_url FROM chat_summaries
+                    WHERE workspace_id = ? AND normalized_url IN ({placeholders})
+                    UNION
+                    SELECT normalized_url FROM chat_aliases
+                    WHERE workspace_id = ? AND normalized_url IN ({placeholders})
+                """,
+                    [workspace_id] + chunk + [workspace_id] + chunk,
+                )
+                existing.update(row[0] for row in cursor)
+        return existing
+
+    def iter_normalized_urls(
+        self, after_version: Optional[int] = None
+    ) -> Iterator[Tuple[str, str]]:
+        """Stream (workspace_id, normalized URL) of chats and aliases (optionally only newer ones)."""
+        since = -1 if after_version is None else after_version
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """
+                SELECT workspace_id, normalized_url FROM chat_summaries WHERE version > ?
+                UNION ALL
+                SELECT workspace_id, normalized_url FROM chat_aliases WHERE version > ?
+            """,
+                (since, since),
+            )
+            for row in cursor:
+                yield row[0], row[1]
+
+    def save_fingerprint(self, chat_id: str, signature: bytes, buckets: List[int]):
+        """Store a chat's MinHash signature and one LSH bucket per band."""
+        return self._write("save_fingerprint", chat_id, signature, buckets)
+
+    def _save_fingerprint(self, chat_id: str, signature: bytes, buckets: List[int]):
+        with self._connect() as conn:
+            self._delete_fingerprint(conn, chat_id)
+            conn.execute(
+                "INSERT INTO chat_fingerprints (chat_id, signature) VALUES (?, ?)",
+                (chat_id, signature),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO chat_lsh_bands (band, bucket, chat_id) VALUES (?, ?, ?)",
+                [(band, bucket, chat_id) for band, bucket in enumerate(buckets)],
+            )
+
+    def find_fingerprint_candidates(
+        self,
+        buckets: List[int],
+        exclude_source_url: str = "",
+        workspace_id: str = DEFAULT_WORKSPACE,
+    ) -> List[Tuple[str, bytes]]:
+        """Get (chat_id, signature) for chats sharing at least one LSH bucket.
+
+        The card stored under `exclude_source_url`, or any URL normalizing to
+        it, is left out: a resubmitted chat is never its own duplicate.
+        """
+        placeholders = ", ".join("(?, ?)" for _ in buckets)
+        params = [value for pair in enumerate(buckets) for value in pair]
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"""
+                SELECT DISTINCT f.chat_id, f.signature
+                FROM chat_lsh_bands b
+                JOIN chat_fingerprints f ON f.chat_id = b.chat_id
+                JOIN chat_summaries c ON c.id = f.chat_id
+                WHERE (b.band, b.bucket) IN (VALUES {placeholders})
+                  AND c.workspace_id = ?
+                  AND COALESCE(c.normalized_url, normalize_url(c.source_url)) != ?
+            """,
+                params + [workspace_id, normalize_url(exclude_source_url)],
+            )
+            return cursor.fetchall()
+
+    def duplicate_url_groups(self) -> List[Dict[str, Any]]:
+        """Normalized URLs held by several cards, each with its cards newest first.
+
+        Archives can hold these from before saves were keyed on the normalized
+        URL; see `dedupe_urls.py`.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT workspace_id, normalized_url, id, source_url, title, created_at
+                FROM chat_summaries
+                WHERE (workspace_id, normalized_url) IN (
+                    SELECT workspace_id, normalized_url FROM chat_summaries
+                    GROUP BY workspace_id, normalized_url
+                    HAVING COUNT(*) > 1
+                )
+                ORDER BY workspace_id, normalized_url, created_ts DESC, rowid DESC
+            """
+            ).fetchall()
+
+        groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for workspace_id, normalized_url, chat_id, source_url, title, created in rows:
+            group = groups.setdefault(
+                (workspace_id, normalized_url),
+                {
+                    "workspace_id": workspace_id,
+                    "normalized_url": normalized_url,
+                    "cards": [],
+                },
+            )
+            group["cards"].append(
+                {
+                    "id": chat_id,
+                    "source_url": source_url,
+                    "title": title,
+                    "created_at": created,
+                }
+            )
+        return list(groups.values())
+
+    def merge_duplicate_url(
+        self, workspace_id: str, normalized_url: str
+    ) -> List[Tuple[str, str]]:
+        """Keep the newest card for a normalized URL; alias the others' URLs to it.
+
+        Returns the (chat_id, source_url) of each removed card, whose vectors
+        the caller deletes.
+        """
+        return self._write("merge_duplicate_url", workspace_id, normalized_url)
+
+    def _merge_duplicate_url(
+        self, workspace_id: str, normalized_url: str
+    ) -> List[Tuple[str, str]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, source_url FROM chat_summaries
+                WHERE workspace_id = ? AND normalized_url = ?
+                ORDER BY created_ts DESC, rowid DESC
+            """,
+                (workspace_id, normalized_url),
+            ).fetchall()
+            if len(rows) < 2:
+                return []
+
+            kept_id, kept_url = rows[0]
+            version = self._bump_archive_version(conn)
+            removed = []
+            for chat_id, source_url in rows[1:]:
+                for table in ("chat_recap_jobs", "chat_recaps"):
+                    conn.execute(f"DELETE FROM {table} WHERE chat_id = ?", (chat_id,))
+                conn.execute("DELETE FROM chat_summaries WHERE id = ?", (chat_id,))
+                self._delete_fingerprint(conn, chat_id)
+                self._delete_neighbors(conn, chat_id)
+                conn.execute(
+                    "UPDATE chat_aliases SET chat_id = ? WHERE chat_id = ?",
+                    (kept_id, chat_id),
+                )
+                if source_url != kept_url:
+                    # The URL it was saved under keeps leading to the kept card
+                    conn.execute(
+                        """
+                        INSERT OR REPLACE INTO chat_aliases
+                        (workspace_id, source_url, chat_id, similarity, created_at,
+                         version, normalized_url)
+                        VALUES (?, ?, ?, 1.0, ?, ?, ?)
+                    """,
+                        (
+                            workspace_id,
+                            source_url,
+                            kept_id,
+                            datetime.utcnow().isoformat(),
+                            version,
+                            normalized_url,
+                        ),
+                    )
+                self._record_change(conn, workspace_id, "delete", chat_id, source_url)
+                removed.append((chat_id, source_url))
+            return removed
+
+    def create_unique_url_index(self) -> bool:
+        """Enforce one card per normalized URL; False while duplicates remain."""
+        return self._write("create_unique_url_index")
+
+    def _create_unique_url_index(self) -> bool:
+        with self._connect() as conn:
+            return create_unique_url_index(conn)
+
+    def save_alias(
+        self,
+        source_url: str,
+        chat_id: str,
+        similarity: float,
+        workspace_id: str = DEFAULT_WORKSPACE,
+    ):
+        """Link a source URL to an existing card."""
+        return self._write("save_alias", source_url, chat_id, similarity, workspace_id)
+
+    def _save_alias(
+        self, source_url: str, chat_id: str, similarity: float, workspace_id: str
+    ):
+        with self._connect() as conn:
+            version = self._bump_archive_version(conn)
+            # One alias per normalized URL, like cards
+            conn.execute(
+                "DELETE FROM chat_aliases WHERE workspace_id = ? AND normalized_url = ?",
+                (workspace_id, normalize_url(source_url)),
+            )
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO chat_aliases
+                (workspace_id, source_url, chat_id, similarity, created_at, version, normalized_url)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+                (
+                    workspace_id,
+                    source_url,
+                    chat_id,
+                    similarity,
+                    datetime.utcnow().isoformat(),
+                    version,
+                    normalize_url(source_url),
+                ),
+            )
+
+    @staticmethod
+    def _delete_fingerprint(conn: sqlite3.Connection, chat_id: str):
+        conn.execute("DELETE FROM chat_fingerprints WHERE chat_id = ?", (chat_id,))
+        conn.execute("DELETE FROM chat_lsh_bands WHERE chat_id = ?", (chat_id,))
+
+    @staticmethod
+    def _delete_neighbors(conn: sqlite3.Connection, chat_id: str):
+        conn.execute("DELETE FROM chat_neighbors WHERE chat_id = ?", (chat_id,))
+        conn.execute("DELETE FROM chat_neighbors WHERE neighbor_id = ?", (chat_id,))
+
+    def save_neighbors(
+        self, chat_id: str, neighbors: List[Tuple[str, float]], k: int
+    ) -> int:
+        """Replace a card's neighbor list and add it to each neighbor's list.
+
+        Neighbor lists are kept to the `k` highest scores, so adding the card
+        to a full list pushes out that list's weakest entry.
+        """
+        return self._write("save_neighbors", chat_id, neighbors, k)
+
+    def _save_neighbors(
+        self, chat_id: str, neighbors: List[Tuple[str, float]], k: int
+    ) -> int:
+        with self._connect() as conn:
+            # Skip cards deleted or overwritten since the neighbors were found
+            existing = {
+                row[0]
+                for row in conn.execute(
+                    f"""
+                    SELECT id FROM chat_summaries
+                    WHERE id IN ({",".join("?" * (len(neighbors) + 1))})
+                """,
+                    [chat_id] + [neighbor_id for neighbor_id, _ in neighbors],
+                )
+            }
+            if chat_id not in existing:
+                return 0
+            neighbors = [
+                (neighbor_id, score)
+                for neighbor_id, score in neighbors[:k]
+                if neighbor_id in existing and neighbor_id != chat_id
+            ]
+
+            conn.execute("DELETE FROM chat_neighbors WHERE chat_id = ?", (chat_id,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO chat_neighbors (chat_id, neighbor_id, score) VALUES (?, ?, ?)",
+                [(chat_id, neighbor_id, score) for neighbor_id, score in neighbors]
+                + [(neighbor_id, chat_id, score) for neighbor_id, score in neighbors],
+            )
+            for neighbor_id, _ in neighbors:
+                conn.execute(
+                    """
+                    DELETE FROM chat_neighbors
+                    WHERE chat_id = ?1 AND neighbor_id NOT IN (
+                        SELECT neighbor_id FROM chat_neighbors
+                        WHERE chat_id = ?1 ORDER BY score DESC LIMIT ?2
+                    )
+                """,
+                    (neighbor_id, k),
+                )
+            return len(neighbors)
+
+    def get_related(
+        self,
+        chat_id: str,
+        workspace_id: str = DEFAULT_WORKSPACE,
+        limit: int = 10,
+        project_filter: Optional[str] = None,
+        platform_filter: Optional[str] = None,
+        include_recap: bool = False,
+    ) -> List[SearchResult]:
+        """A card's precomputed neighbors, nearest first (one primary-key range)."""
+        query = f"""
+            SELECT c.id, c.title, c.synthesis, {self._recap_column(include_recap, "c")},
+                   c.project_name, c.tags, c.source_url, c.platform, c.created_at,
+                   n.score
+            FROM chat_neighbors n
+            JOIN chat_summaries c ON c.id = n.neighbor_id
+            WHERE n.chat_id = ? AND c.workspace_id = ?
+        """
+        params: List[Any] = [chat_id, workspace_id]
+        if project_filter:
+            query += " AND c.project_name = ?"
+            params.append(project_filter)
+        if platform_filter:
+            query += " AND c.platform = ?"
+            params.append(platform_filter)
+        query += " ORDER BY n.score DESC LIMIT ?"
+        params.append(limit)
+
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(query, params).fetchall()
+
+        return [
+            SearchResult(
+                id=row["id"],
+                title=row["title"],
+                synthesis=row["synthesis"],
+                recap=row["recap"],
+                project_name=row["project_name"],
+                tags=json.loads(row["tags"]),
+                source_url=row["source_url"],
+                platform=row["platform"],
+                created_at=datetime.fromisoformat(row["created_at"]),
+                relevance_score=row["score"],
+                search_type="related",
+            )
+            for row in rows
+        ]
+
+    def sample_recaps(self, limit: int) -> List[str]:
+        """Random stored recap bodies (decompressed), for dictionary training."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT recap_decode(codec, dict_id, body) FROM chat_recaps
+                WHERE rowid IN (
+                    SELECT rowid FROM chat_recaps ORDER BY RANDOM() LIMIT ?
+                )
+            """,
+                (limit,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def save_recap_dictionary(self, data: bytes, samples: int) -> int:
+        """Store a trained dictionary for new recaps to use; returns its id."""
+        return self._write("save_recap_dictionary", data, samples)
+
+    def _save_recap_dictionary(self, data: bytes, samples: int) -> int:
+        with self._connect() as conn:
             cursor = conn.execute(
-                "SELECT 1 FROM chat_summaries WHERE source_url = ?", (source_url,)
+                """
+                INSERT INTO recap_dictionaries (data, samples, created_at)
+                VALUES (?, ?, ?)
+            """,
+                (data, samples, datetime.utcnow().isoformat()),
+            )
+            return cursor.lastrowid
+
+    def recompact_recaps(
+        self, after_rowid: int = 0, limit: int = 500
+    ) -> Tuple[Optional[int], int]:
+        """Recompress one batch of recaps not on the current codec and dictionary.
+
+        Returns (last rowid scanned, or None when done; bodies rewritten). Each
+        batch is its own short transaction, so this runs on a live archive.
+        """
+        return self._write("recompact_recaps", after_rowid, limit)
+
+    def _recompact_recaps(
+        self, after_rowid: int, limit: int
+    ) -> Tuple[Optional[int], int]:
+        with self._connect() as conn:
+            codec, dict_id = self.recap_codec.target(self._newest_dictionary(conn))
+            rows = conn.execute(
+                """
+                SELECT rowid, chat_id, codec, dict_id, body FROM chat_recaps
+                WHERE rowid > ?
+                ORDER BY rowid
+                LIMIT ?
+            """,
+                (after_rowid, limit),
+            ).fetchall()
+            if not rows:
+                return None, 0
+
+            rewritten = [
+                self.recap_codec.row(
+                    chat_id,
+                    self.recap_codec.decode(row_codec, row_dict_id, body),
+                    dict_id,
+                )
+                for _, chat_id, row_codec, row_dict_id, body in rows
+                # Short bodies stay raw whatever the target
+                if row_codec != "raw" and (row_codec, row_dict_id) != (codec, dict_id)
+            ]
+            conn.executemany(
+                """
+                UPDATE chat_recaps SET codec = ?, dict_id = ?, body = ?, raw_bytes = ?
+                WHERE chat_id = ?
+            """,
+                [
+                    (row_codec, row_dict_id, body, raw_bytes, chat_id)
+                    for chat_id, row_codec, row_dict_id, body, raw_bytes in rewritten
+                ],
             )
-            return cursor.fetchone() is not None
+            return rows[-1][0], len(rewritten)
+
+    def recap_storage_stats(self) -> Dict[str, Any]:
+        """Stored recap counts and sizes per (codec, dictionary); scans chat_recaps."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT codec, dict_id, COUNT(*), SUM(raw_bytes), SUM(LENGTH(body))
+                FROM chat_recaps
+                GROUP BY codec, dict_id
+            """
+            ).fetchall()
+        return {
+            f"{codec}:{dict_id}" if dict_id else codec: {
+                "recaps": count,
+                "raw_bytes": raw_bytes,
+                "stored_bytes": stored_bytes,
+                "ratio": round(raw_bytes / stored_bytes, 2) if stored_bytes else None,
+            }
+            for codec, dict_id, count, raw_bytes, stored_bytes in rows
+        }
+
+    def vacuum(self):
+        """Rebuild the database file, returning pages freed by moved recaps.
+
+        Blocks other writers for the duration; run it off-peak.
+        """
+        return self._write("vacuum")
+
+    def _vacuum(self):
+        with self._connect() as conn:
+            conn.execute("VACUUM")
+
+    @staticmethod
+    def _row_to_chat_summary(row: sqlite3.Row) -> ChatSummary:
+        return ChatSummary(
+            id=row["id"],
+            workspace_id=row["workspace_id"],
+            title=row["title"],
+            synthesis=row["synthesis"],
+            recap=row["recap"],
+            project_name=row["project_name"],
+            project=row["project"],
+            tags=json.loads(row["tags"]),
+            source_url=row["source_url"],
+            platform=row["platform"],
+            created_at=datetime.fromisoformat(row["created_at"]),
+            status=row["status"],
+        )
@@ -0,0 +1,227 @@
+# app/services/db_writer.py
+"""Single-writer support for running several API worker processes.
+
+SQLite allows one writer at a time, so with N uvicorn workers every write is
+forwarded to one dedicated writer process, which applies them in order on a
+single thread. Reads stay in the workers (WAL mode lets them run concurrently).
+"""
+import multiprocessing
+import os
+import queue
+import secrets
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+from typing import Any, Optional, Tuple
+
+# Environment variables the workers read to find the writer
+WRITER_ADDRESS_ENV = "CIMI_WRITER_ADDRESS"
+WRITER_AUTHKEY_ENV = "CIMI_WRITER_AUTHKEY"
+
+_SHUTDOWN = "__shutdown__"
+
+
+class LocalWriter:
+    """Applies write operations one at a time on a dedicated thread."""
+
+    def __init__(self, db_service):
+        self.db_service = db_service
+        self._queue: "queue.Queue[Optional[Tuple[Future, str, tuple]]]" = (
+            queue.Queue()
+        )
+        self._thread = threading.Thread(
+            target=self._run, name="db-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, operation: str, *args) -> Any:
+        future: Future = Future()
+        self._queue.put((future, operation, args))
+        return future.result()
+
+    def stop(self):
+        """Finish queued writes, then stop the thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, operation, args = item
+            try:
+                future.set_result(self.db_service.apply_write(operation, *args))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class RemoteWriter:
+    """Forwards write operations from a worker to the writer process."""
+
+    def __init__(self, address: str, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def submit(self, operation: str, *args) -> Any:
+        # One connection per thread. A kept connection may predate a writer
+        # restart, so a failed send is retried once on a fresh one. Once sent,
+        # the operation may have been applied: a lost reply is never resent,
+        # since most writes (change-log entries, jobs, aliases) are not idempotent
+        for attempt in range(2):
+            reused = getattr(self._local, "conn", None) is not None
+            conn = self._connection()
+            try:
+                conn.send((operation, args))
+            except OSError:
+                self._local.conn = None
+                if attempt or not reused:
+                    raise
+                continue
+            try:
+                ok, result = conn.recv()
+            except (EOFError, OSError) as e:
+                self._local.conn = None
+                raise RuntimeError(
+                    f"Lost the DB writer's reply to {operation}; "
+                    "it may or may not have been applied"
+                ) from e
+            break
+        if not ok:
+            raise result
+        return result
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+
+def remote_writer_from_env() -> Optional[RemoteWriter]:
+    """Return a RemoteWriter when this process runs under a writer process."""
+    address = os.getenv(WRITER_ADDRESS_ENV)
+    if not address:
+        return None
+    return RemoteWriter(address, bytes.fromhex(os.environ[WRITER_AUTHKEY_ENV]))
+
+
+def _serve_client(conn, writer: LocalWriter, stop: threading.Event):
+    with conn:
+        while not stop.is_set():
+            try:
+                operation, args = conn.recv()
+            except (EOFError, OSError):
+                return
+            if operation == _SHUTDOWN:
+                stop.set()
+                conn.send((True, None))
+                return
+            try:
+                conn.send((True, writer.submit(operation, *args)))
+            except Exception as e:
+                conn.send((False, e))
+
+
+def run_writer(address: str, authkey: bytes, db_path: str, ready=None):
+    """Writer process entry point: own the schema, then serve writes until shutdown.
+
+    `ready` (a pipe end) is sent True once the socket accepts connections.
+    """
+    # Imported here so the parent process stays light
+    from app.services.database_service import DatabaseService
+
+    # Ctrl+C reaches the whole process group; the launcher stops us after the
+    # workers have drained, so in-flight writes are not cut off
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    db_service = DatabaseService(db_path)
+    writer = LocalWriter(db_service)
+    stop = threading.Event()
+
+    with Listener(address, family="AF_UNIX", authkey=authkey) as listener:
+        print(f"DB writer listening on {address}")
+        if ready is not None:
+            ready.send(True)
+            ready.close()
+        # accept() blocks, so a helper unblocks it once shutdown is requested
+        threading.Thread(
+            target=_wake_on_stop, args=(address, authkey, stop), daemon=True
+        ).start()
+        while not stop.is_set():
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"DB writer rejected a connection: {e}")
+                continue
+            threading.Thread(
+                target=_serve_client, args=(conn, writer, stop), daemon=True
+            ).start()
+
+    writer.stop()
+    print("DB writer stopped")
+
+
+def _wake_on_stop(address: str, authkey: bytes, stop: threading.Event):
+    stop.wait()
+    try:
+        Client(address, family="AF_UNIX", authkey=authkey).close()
+    except OSError:
+        pass
+
+
+class WriterProcess:
+    """Starts the writer process and exposes its address to worker processes."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.address = os.path.join(tempfile.mkdtemp(prefix="cimi-"), "writer.sock")
+        self.authkey = secrets.token_bytes(32)
+        self._ready, self._ready_sender = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(
+            target=run_writer,
+            args=(self.address, self.authkey, db_path, self._ready_sender),
+            name="cimi-db-writer",
+        )
+
+    def start(self):
+        self.process.start()
+        # Only the writer's copy may stay open, so its exit reads as EOF
+        self._ready_sender.close()
+        # Wait until the schema is ready and the socket accepts connections.
+        # Schema setup on a large archive can take a while, so there is no
+        # deadline: only a writer that died is a failed start
+        started = time.time()
+        try:
+            while not self._ready.poll(1.0):
+                if not self.process.is_alive():
+                    raise EOFError
+            self._ready.recv()
+        except EOFError:
+            raise RuntimeError("DB writer process failed to start") from None
+        finally:
+            self._ready.close()
+        print(f"DB writer ready after {time.time() - started:.1f}s")
+
+        # Workers are spawned after this, so they inherit the environment
+        os.environ[WRITER_ADDRESS_ENV] = self.address
+        os.environ[WRITER_AUTHKEY_ENV] = self.authkey.hex()
+
+    def stop(self, timeout: float = 10.0):
+        """Ask the writer to drain and exit; kill it if it does not."""
+        if self.process.is_alive():
+            try:
+                RemoteWriter(self.address, self.authkey).submit(_SHUTDOWN)
+            except Exception as e:
+                print(f"Could not stop DB writer cleanly: {e}")
+            self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        os.environ.pop(WRITER_ADDRESS_ENV, None)
+        os.environ.pop(WRITER_AUTHKEY_ENV, None)
@@ -0,0 +1,122 @@
+# app/services/dedup_service.py
+import hashlib
+import os
+import re
+from array import array
+from dataclasses import dataclass
+from typing import List, Optional
+from app.services.database_service import DatabaseService
+from app.models.chat import DEFAULT_WORKSPACE
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_MAX_HASH = (1 << 64) - 1
+
+# 32 bands x 4 rows: pairs above ~0.6 Jaccard almost always share a bucket,
+# and every candidate is verified against the configured threshold anyway
+NUM_BANDS = 32
+ROWS_PER_BAND = 4
+NUM_HASHES = NUM_BANDS * ROWS_PER_BAND
+
+
+@dataclass
+class Fingerprint:
+    signature: List[int]
+    buckets: List[int]
+
+    def to_bytes(self) -> bytes:
+        return array("Q", self.signature).tobytes()
+
+
+@dataclass
+class DuplicateMatch:
+    chat_id: str
+    similarity: float
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+class DedupService:
+    """Near-duplicate detection for incoming chats using MinHash + LSH.
+
+    Signatures use one-permutation hashing: every shingle is hashed once and the
+    minimum is kept per bin, so fingerprinting stays linear in the transcript
+    size even for very long chats. Band buckets live in SQLite, so a lookup is
+    one indexed query.
+    """
+
+    def __init__(self, db_service: Optional[DatabaseService] = None):
+        self.db_service = db_service or DatabaseService()
+        self.enabled = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+        self.threshold = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+        # "link": point the new URL at the existing card
+        # "reuse": store a new card for the URL with the existing card's summary
+        self.mode = os.getenv("DEDUP_MODE", "link")
+        self.shingle_size = int(os.getenv("DEDUP_SHINGLE_SIZE", "5"))
+        # Very short chats share too many shingles by chance to be compared
+        self.min_shingles = int(os.getenv("DEDUP_MIN_SHINGLES", "20"))
+
+    def fingerprint(self, chat_content: str) -> Optional[Fingerprint]:
+        """Compute the MinHash signature and LSH buckets for chat content."""
+        words = _WORD_RE.findall(chat_content.lower())
+        k = self.shingle_size
+        shingles = {" ".join(words[i : i + k]) for i in range(len(words) - k + 1)}
+        if len(shingles) < self.min_shingles:
+            return None
+
+        signature = [_MAX_HASH] * NUM_HASHES
+        for shingle in shingles:
+            value = _hash64(shingle.encode())
+            slot = value % NUM_HASHES
+            if value < signature[slot]:
+                signature[slot] = value
+
+        # Densify: fill empty bins from the next non-empty one (rotation)
+        for slot in range(NUM_HASHES):
+            if signature[slot] == _MAX_HASH:
+                for offset in range(1, NUM_HASHES):
+                    donor = signature[(slot + offset) % NUM_HASHES]
+                    if donor != _MAX_HASH:
+                        signature[slot] = _hash64(
+                            donor.to_bytes(8, "little") + offset.to_bytes(2, "little")
+                        )
+                        break
+
+        buckets = []
+        for band in range(NUM_BANDS):
+            rows = signature[band * ROWS_PER_BAND : (band + 1) * ROWS_PER_BAND]
+            # Keep buckets within SQLite's signed 64-bit INTEGER range
+            buckets.append(_hash64(array("Q", rows).tobytes()) >> 1)
+
+        return Fingerprint(signature=signature, buckets=buckets)
+
+    def find_duplicate(
+        self,
+        fingerprint: Fingerprint,
+        exclude_source_url: str = "",
+        workspace_id: str = DEFAULT_WORKSPACE,
+    ) -> Optional[DuplicateMatch]:
+        """Return the workspace's most similar stored chat at or above the threshold."""
+        best = None
+        for chat_id, blob in self.db_service.find_fingerprint_candidates(
+            fingerprint.buckets, exclude_source_url, workspace_id
+        ):
+            similarity = self.similarity(fingerprint.signature, array("Q", blob))
+            if similarity >= self.threshold and (
+                best is None or similarity > best.similarity
+            ):
+                best = DuplicateMatch(chat_id=chat_id, similarity=similarity)
+        return best
+
+    def store(self, chat_id: str, fingerprint: Fingerprint):
+        """Index a stored chat's fingerprint for future lookups."""
+        self.db_service.save_fingerprint(
+            chat_id, fingerprint.to_bytes(), fingerprint.buckets
+        )
+
+    @staticmethod
+    def similarity(signature_a, signature_b) -> float:
+        """Estimated Jaccard similarity: the fraction of matching signature slots."""
+        matches = sum(1 for a, b in zip(signature_a, signature_b) if a == b)
+        return matches / NUM_HASHES
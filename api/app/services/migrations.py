@@ -0,0 +1,640 @@
+# app/services/migrations.py
+"""Versioned schema migrations for the SQLite archive.
+
+The schema version is kept in `PRAGMA user_version`. Databases created before
+versioning report version 0 and are brought up to date by the baseline, which
+recognizes every earlier shape of the schema.
+
+A migration has a schema step (new tables and columns; quick) and optionally a
+backfill (filling them from existing rows, new indexes, cleanup; proportional to
+the archive). `migrate` runs every pending schema step at startup, so the code
+can write in the new shape right away, and `finish_migrations` then runs the
+backfills in the background. Backfills commit in batches and are idempotent, so
+an interrupted one simply resumes; the version is only bumped once a migration
+has fully landed, and until then readers keep using the previous schema's
+columns and indexes (see `DatabaseService._schema_at_least`).
+"""
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, List, Optional
+from app.models.chat import DEFAULT_WORKSPACE
+from app.services.recap_codec import RecapCodec
+
+# Rows updated per transaction by backfills
+BACKFILL_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    # Quick schema changes, run at startup
+    apply: Optional[Callable[[sqlite3.Connection], None]] = None
+    # Data changes, run in the background before the version is bumped
+    backfill: Optional[Callable[[sqlite3.Connection], None]] = None
+
+
+def to_epoch_ms(value: datetime) -> int:
+    """Epoch milliseconds for `created_ts` (naive datetimes are taken as UTC)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(milliseconds=1)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply every pending schema step; returns the resulting schema version.
+
+    Migrations without a backfill land here. The version stops at the first
+    one with a backfill, for `finish_migrations` to complete.
+    """
+    current = schema_version(conn)
+    if current > LATEST_VERSION:
+        print(
+            f"Warning: database schema v{current} is newer than this code "
+            f"(v{LATEST_VERSION}); skipping migrations"
+        )
+        return current
+
+    landing = True
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        landing = landing and migration.backfill is None
+        if migration.apply is not None:
+            print(
+                f"Applying schema for v{migration.version} "
+                f"({migration.description})..."
+            )
+            migration.apply(conn)
+            conn.commit()
+        if landing:
+            current = _set_version(conn, migration)
+            print(f"Database at v{current}")
+    return current
+
+
+def finish_migrations(conn: sqlite3.Connection) -> int:
+    """Run pending backfills in order, bumping the version after each."""
+    current = schema_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        print(
+            f"Migrating database to v{migration.version} "
+            f"({migration.description})..."
+        )
+        start_time = time.time()
+        if migration.backfill is not None:
+            migration.backfill(conn)
+            conn.commit()
+        current = _set_version(conn, migration)
+        print(f"Database at v{current} after {time.time() - start_time:.2f}s")
+    return current
+
+
+def _set_version(conn: sqlite3.Connection, migration: Migration) -> int:
+    conn.execute(f"PRAGMA user_version = {migration.version}")
+    conn.commit()
+    return migration.version
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _backfill(
+    conn: sqlite3.Connection,
+    table: str,
+    column: str,
+    source: str,
+    convert: Callable[[Any], Any],
+):
+    """Fill a new column from an existing one in rowid batches, committing after each.
+
+    Short transactions keep readers and other writers moving on a large archive,
+    and rows already filled are skipped, so an interrupted backfill resumes.
+    """
+    filled = 0
+    last_rowid = 0
+    while True:
+        # Read and update in one transaction, so no write lands in between
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            f"""
+            SELECT rowid, {source} FROM {table}
+            WHERE rowid > ? AND {column} IS NULL
+            ORDER BY rowid
+            LIMIT ?
+        """,
+            (last_rowid, BACKFILL_BATCH_SIZE),
+        ).fetchall()
+        if not rows:
+            conn.commit()
+            break
+
+        conn.executemany(
+            f"UPDATE {table} SET {column} = ? WHERE rowid = ?",
+            [(convert(value), rowid) for rowid, value in rows],
+        )
+        conn.commit()
+        filled += len(rows)
+        last_rowid = rows[-1][0]
+    if filled:
+        print(f"Backfilled {column} for {filled} rows in {table}")
+
+
+def _v1_baseline(conn: sqlite3.Connection):
+    """The schema as it stood before versioning, including its in-place upgrades."""
+    # First, check if we need to add the project column
+    cursor = conn.execute("PRAGMA table_info(chat_summaries)")
+    columns = [row[1] for row in cursor.fetchall()]
+
+    if columns and "project" not in columns:
+        # Add the project column to existing table
+        print("Adding 'project' column to existing chat_summaries table...")
+        conn.execute(
+            "ALTER TABLE chat_summaries ADD COLUMN project TEXT DEFAULT 'General'"
+        )
+
+    if columns and "version" not in columns:
+        print("Adding 'version' column to existing chat_summaries table...")
+        conn.execute(
+            "ALTER TABLE chat_summaries ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+        )
+
+    if columns and "normalized_url" not in columns:
+        print("Adding 'normalized_url' column to existing chat_summaries table...")
+        conn.execute("ALTER TABLE chat_summaries ADD COLUMN normalized_url TEXT")
+
+    if columns and "status" not in columns:
+        print("Adding 'status' column to existing chat_summaries table...")
+        conn.execute(
+            "ALTER TABLE chat_summaries ADD COLUMN status TEXT NOT NULL DEFAULT 'ready'"
+        )
+
+    # Source URLs are unique per workspace, which needs a new table
+    # (SQLite cannot change constraints in place); copy rows over below
+    alias_columns = [
+        row[1] for row in conn.execute("PRAGMA table_info(chat_aliases)")
+    ]
+    partition = columns and "workspace_id" not in columns
+    if partition:
+        print("Partitioning chat tables by workspace...")
+        conn.execute("BEGIN")
+        conn.execute("ALTER TABLE chat_summaries RENAME TO chat_summaries_old")
+        if alias_columns:
+            conn.execute("ALTER TABLE chat_aliases RENAME TO chat_aliases_old")
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_summaries (
+            id TEXT PRIMARY KEY,
+            workspace_id TEXT NOT NULL DEFAULT 'default',
+            title TEXT NOT NULL,
+            synthesis TEXT NOT NULL,
+            recap TEXT NOT NULL,
+            project_name TEXT NOT NULL,  -- AI suggested project
+            project TEXT NOT NULL DEFAULT 'General',  -- User specified project
+            tags TEXT NOT NULL,  -- JSON array
+            source_url TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,  -- archive version of last write
+            normalized_url TEXT,  -- canonical source_url for existence checks
+            status TEXT NOT NULL DEFAULT 'ready',  -- ready, enriching or failed
+            UNIQUE (workspace_id, source_url)
+        )
+    """
+    )
+
+    # Source URLs linked to an existing card instead of being re-summarized
+    if alias_columns and "normalized_url" not in alias_columns:
+        print("Adding URL index columns to existing chat_aliases table...")
+        table = "chat_aliases_old" if partition else "chat_aliases"
+        conn.execute(
+            f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+        )
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN normalized_url TEXT")
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_aliases (
+            workspace_id TEXT NOT NULL DEFAULT 'default',
+            source_url TEXT NOT NULL,
+            chat_id TEXT NOT NULL,
+            similarity REAL NOT NULL,
+            created_at TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            normalized_url TEXT,
+            PRIMARY KEY (workspace_id, source_url)
+        )
+    """
+    )
+
+    if partition:
+        # Everything stored before workspaces belongs to the default one
+        conn.execute(
+            f"""
+            INSERT INTO chat_summaries
+            (id, workspace_id, title, synthesis, recap, project_name, project, tags,
+             source_url, platform, created_at, version, normalized_url, status)
+            SELECT id, '{DEFAULT_WORKSPACE}', title, synthesis, recap, project_name,
+                   COALESCE(project, 'General'), tags, source_url, platform,
+                   created_at, version, normalized_url, status
+            FROM chat_summaries_old
+        """
+        )
+        conn.execute("DROP TABLE chat_summaries_old")
+        if alias_columns:
+            conn.execute(
+                f"""
+                INSERT INTO chat_aliases
+                (workspace_id, source_url, chat_id, similarity, created_at,
+                 version, normalized_url)
+                SELECT '{DEFAULT_WORKSPACE}', source_url, chat_id, similarity,
+                       created_at, version, normalized_url
+                FROM chat_aliases_old
+            """
+            )
+            conn.execute("DROP TABLE chat_aliases_old")
+
+    # Single-row counter behind ETags; bumped by every write to chat data
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archive_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO archive_version (id, version) VALUES (1, 0)"
+    )
+
+    # Create indexes for search performance. Every query is scoped to one
+    # workspace, so the workspace leads each index and a small workspace
+    # never scans a large one's rows
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_title ON chat_summaries(title)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ws_project_name ON chat_summaries(workspace_id, project_name)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ws_project ON chat_summaries(workspace_id, project)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ws_platform ON chat_summaries(workspace_id, platform)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ws_created_at ON chat_summaries(workspace_id, created_at)"
+    )
+    # Covers conditional GETs of a single card
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_id_ws_version ON chat_summaries(id, workspace_id, version)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ws_normalized_url ON chat_summaries(workspace_id, normalized_url)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_version ON chat_summaries(version)"
+    )
+
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_alias_chat_id ON chat_aliases(chat_id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_alias_normalized_url ON chat_aliases(workspace_id, normalized_url)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_alias_version ON chat_aliases(version)"
+    )
+
+    # Near-duplicate detection: MinHash signatures and their LSH band buckets
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_fingerprints (
+            chat_id TEXT PRIMARY KEY,
+            signature BLOB NOT NULL
+        )
+    """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_lsh_bands (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            chat_id TEXT NOT NULL,
+            PRIMARY KEY (band, bucket, chat_id)
+        ) WITHOUT ROWID
+    """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_lsh_chat_id ON chat_lsh_bands(chat_id)"
+    )
+
+    # "More like this": each card's nearest neighbors, precomputed at ingest
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_neighbors (
+            chat_id TEXT NOT NULL,
+            neighbor_id TEXT NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (chat_id, neighbor_id)
+        ) WITHOUT ROWID
+    """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_neighbors_neighbor_id ON chat_neighbors(neighbor_id)"
+    )
+
+    # Recaps still to be generated for cards saved in two-phase mode. Jobs
+    # are claimed with a timestamp so a crashed worker's jobs are retried
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_recap_jobs (
+            chat_id TEXT PRIMARY KEY,
+            workspace_id TEXT NOT NULL,
+            input TEXT NOT NULL,  -- JSON summarize input
+            attempts INTEGER NOT NULL DEFAULT 0,
+            claimed_at TEXT
+        )
+    """
+    )
+
+    # Monotonic log of card inserts, overwrites and deletes for client sync
+    change_columns = [
+        row[1] for row in conn.execute("PRAGMA table_info(chat_changes)")
+    ]
+    if change_columns and "workspace_id" not in change_columns:
+        conn.execute(
+            "ALTER TABLE chat_changes ADD COLUMN workspace_id TEXT NOT NULL DEFAULT 'default'"
+        )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            workspace_id TEXT NOT NULL DEFAULT 'default',
+            op TEXT NOT NULL,  -- insert, overwrite, update or delete
+            chat_id TEXT NOT NULL,
+            replaced_id TEXT,  -- card an overwrite replaced
+            source_url TEXT NOT NULL,
+            changed_at TEXT NOT NULL
+        )
+    """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_changes_ws_seq ON chat_changes(workspace_id, seq)"
+    )
+    if not change_columns:
+        # Cards stored before the log existed become its first entries
+        conn.execute(
+            """
+            INSERT INTO chat_changes (workspace_id, op, chat_id, source_url, changed_at)
+            SELECT workspace_id, 'insert', id, source_url, created_at
+            FROM chat_summaries ORDER BY created_at
+        """
+        )
+
+    # Single-column indexes superseded by the workspace-led ones
+    for index in (
+        "idx_project_name",
+        "idx_project",
+        "idx_platform",
+        "idx_source_url",
+        "idx_created_at",
+        "idx_normalized_url",
+        "idx_id_version",
+    ):
+        conn.execute(f"DROP INDEX IF EXISTS {index}")
+
+    # Backfill rows stored before URLs were normalized
+    for table in ("chat_summaries", "chat_aliases"):
+        cursor = conn.execute(
+            f"UPDATE {table} SET normalized_url = normalize_url(source_url) "
+            "WHERE normalized_url IS NULL"
+        )
+        if cursor.rowcount:
+            print(f"Normalized {cursor.rowcount} source URLs in {table}")
+
+
+def _v2_created_ts_column(conn: sqlite3.Connection):
+    """Integer creation timestamps (epoch milliseconds), written by new rows.
+
+    `created_at` stays as ISO text for the API and exports; `created_ts` is what
+    queries filter and sort on once v2 has landed.
+    """
+    if "created_ts" not in _columns(conn, "chat_summaries"):
+        conn.execute("ALTER TABLE chat_summaries ADD COLUMN created_ts INTEGER")
+
+
+def _v2_epoch_timestamps(conn: sqlite3.Connection):
+    """Fill `created_ts` for existing rows, then the composite (filter, time) indexes.
+
+    Each filterable column gets an index ending in `created_ts`, so filtered,
+    newest-first pages are read in index order and stop at the LIMIT, without
+    a sort.
+    """
+    _backfill(
+        conn,
+        "chat_summaries",
+        "created_ts",
+        "created_at",
+        lambda created_at: to_epoch_ms(datetime.fromisoformat(created_at)),
+    )
+
+    for name, columns in (
+        ("idx_ws_created_ts", "workspace_id, created_ts"),
+        ("idx_ws_project_name_created_ts", "workspace_id, project_name, created_ts"),
+        ("idx_ws_project_created_ts", "workspace_id, project, created_ts"),
+        ("idx_ws_platform_created_ts", "workspace_id, platform, created_ts"),
+    ):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON chat_summaries({columns})")
+
+    # Their prefixes of the indexes above; dropped last, as v1 readers use them
+    for index in (
+        "idx_ws_created_at",
+        "idx_ws_project_name",
+        "idx_ws_project",
+        "idx_ws_platform",
+    ):
+        conn.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+def _v3_recap_table(conn: sqlite3.Connection):
+    """Compressed recap bodies in their own table, where new cards store theirs.
+
+    Recaps are most of a row's bytes but only needed for a full card, so out of
+    line the metadata rows stay small and lists, searches and scans touch far
+    fewer pages.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_recaps (
+            chat_id TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,  -- raw, zlib or zstd
+            dict_id INTEGER,  -- recap_dictionaries.id the body was compressed with
+            body BLOB NOT NULL,
+            raw_bytes INTEGER NOT NULL  -- uncompressed size
+        )
+    """
+    )
+    # zstd dictionaries trained on the archive's recaps; never modified, since
+    # bodies compressed with one need it to be read back
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS recap_dictionaries (
+            id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL,
+            samples INTEGER NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """
+    )
+
+
+def _v3_copy_recaps(conn: sqlite3.Connection):
+    """Copy existing rows' recaps into chat_recaps (cleared from the rows by v4)."""
+    # No dictionary exists yet, so nothing needs loading
+    codec = RecapCodec(load_dictionary=lambda dict_id: b"")
+    copied = 0
+    last_rowid = 0
+    while True:
+        # Read and copy in one transaction, so no card is deleted in between
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            """
+            SELECT rowid, id, recap FROM chat_summaries
+            WHERE rowid > ?
+            ORDER BY rowid
+            LIMIT ?
+        """,
+            (last_rowid, BACKFILL_BATCH_SIZE),
+        ).fetchall()
+        if not rows:
+            conn.commit()
+            break
+
+        # Rows copied before an interruption are kept
+        cursor = conn.executemany(
+            """
+            INSERT OR IGNORE INTO chat_recaps (chat_id, codec, dict_id, body, raw_bytes)
+            VALUES (?, ?, ?, ?, ?)
+        """,
+            [codec.row(chat_id, recap) for _, chat_id, recap in rows if recap],
+        )
+        conn.commit()
+        copied += cursor.rowcount
+        last_rowid = rows[-1][0]
+    if copied:
+        print(f"Copied {copied} recaps to chat_recaps ({codec.codec})")
+
+
+def _v4_clear_inline_recaps(conn: sqlite3.Connection):
+    """Empty `chat_summaries.recap` for bodies now stored in chat_recaps.
+
+    The column stays (SQLite would rebuild the table to drop it); the freed
+    space is reused by new rows, or returned by `compact_recaps.py --vacuum`.
+    """
+    cleared = 0
+    last_rowid = 0
+    while True:
+        batch_end = conn.execute(
+            """
+            SELECT MAX(rowid) FROM (
+                SELECT rowid FROM chat_summaries WHERE rowid > ? ORDER BY rowid LIMIT ?
+            )
+        """,
+            (last_rowid, BACKFILL_BATCH_SIZE),
+        ).fetchone()[0]
+        if batch_end is None:
+            break
+
+        cursor = conn.execute(
+            """
+            UPDATE chat_summaries SET recap = ''
+            WHERE rowid > ? AND rowid <= ? AND recap != ''
+              AND id IN (SELECT chat_id FROM chat_recaps)
+        """,
+            (last_rowid, batch_end),
+        )
+        conn.commit()
+        cleared += cursor.rowcount
+        last_rowid = batch_end
+    if cleared:
+        print(f"Cleared {cleared} inline recaps from chat_summaries")
+
+
+def duplicate_url_count(conn: sqlite3.Connection) -> int:
+    """Number of normalized source URLs held by more than one card."""
+    return conn.execute(
+        """
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM chat_summaries
+            GROUP BY workspace_id, normalized_url
+            HAVING COUNT(*) > 1
+        )
+    """
+    ).fetchone()[0]
+
+
+def create_unique_url_index(conn: sqlite3.Connection) -> bool:
+    """Enforce one card per normalized URL; False while duplicates remain."""
+    if duplicate_url_count(conn):
+        return False
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_ws_normalized_url_unique
+        ON chat_summaries(workspace_id, normalized_url)
+    """
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_ws_normalized_url")
+    return True
+
+
+def _v5_unique_normalized_urls(conn: sqlite3.Connection):
+    """One card per normalized source URL, enforced by a unique index.
+
+    Archives can hold several cards saved under variants of one URL from before
+    saves were keyed on the normalized URL. They are never removed here: the
+    normalizer is a heuristic, so some may be different pages. Without any,
+    the unique index is created now; otherwise `dedupe_urls.py` reviews and
+    merges them, then creates it.
+    """
+    if not create_unique_url_index(conn):
+        print(
+            f"{duplicate_url_count(conn)} normalized URLs have several cards; "
+            "run dedupe_urls.py to review and merge them"
+        )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline schema", apply=_v1_baseline),
+    Migration(
+        2,
+        "epoch timestamps and composite indexes",
+        apply=_v2_created_ts_column,
+        backfill=_v2_epoch_timestamps,
+    ),
+    Migration(
+        3,
+        "compressed recap table",
+        apply=_v3_recap_table,
+        backfill=_v3_copy_recaps,
+    ),
+    Migration(4, "clear inline recaps", backfill=_v4_clear_inline_recaps),
+    Migration(
+        5, "unique normalized source URLs", backfill=_v5_unique_normalized_urls
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
@@ -0,0 +1,243 @@
+# app/services/model_router.py
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Checked in order; the first matching route wins and the last one catches
+# everything. Costs are USD per million tokens.
+DEFAULT_ROUTES: List[Dict[str, Any]] = [
+    {
+        "name": "small",
+        "model": "claude-3-5-haiku-20241022",
+        "max_tokens": 1024,
+        "max_input_tokens": 4000,
+        "verbose": False,
+        "expected_latency_ms": 4000,
+        "timeout_s": 30,
+        "input_cost_per_mtok": 0.8,
+        "output_cost_per_mtok": 4.0,
+        "fallbacks": ["standard"],
+    },
+    {
+        "name": "verbose",
+        "model": "claude-3-5-sonnet-20241022",
+        "max_tokens": 4000,
+        "verbose": True,
+        "expected_latency_ms": 30000,
+        "timeout_s": 120,
+        "input_cost_per_mtok": 3.0,
+        "output_cost_per_mtok": 15.0,
+        "fallbacks": ["small"],
+    },
+    {
+        "name": "standard",
+        "model": "claude-3-5-sonnet-20241022",
+        "max_tokens": 2000,
+        "max_input_tokens": 60000,
+        "expected_latency_ms": 15000,
+        "timeout_s": 90,
+        "input_cost_per_mtok": 3.0,
+        "output_cost_per_mtok": 15.0,
+        "fallbacks": ["small"],
+    },
+    {
+        "name": "long",
+        "model": "claude-3-5-sonnet-20241022",
+        "max_tokens": 4000,
+        "expected_latency_ms": 30000,
+        "timeout_s": 180,
+        "input_cost_per_mtok": 3.0,
+        "output_cost_per_mtok": 15.0,
+        "fallbacks": ["small"],
+    },
+]
+
+# Recent latencies kept per route for percentiles
+LATENCY_WINDOW = 500
+
+
+@dataclass
+class ModelRoute:
+    name: str
+    model: str
+    max_tokens: int = 2000
+    # Conditions (None matches anything)
+    max_input_tokens: Optional[int] = None
+    platforms: Optional[List[str]] = None
+    verbose: Optional[bool] = None
+    # Used for latency budgets until the route has observed calls
+    expected_latency_ms: float = 15000
+    timeout_s: float = 120
+    input_cost_per_mtok: float = 0.0
+    output_cost_per_mtok: float = 0.0
+    fallbacks: List[str] = field(default_factory=list)
+
+    def matches(self, input_tokens: int, platform: str, verbose: bool) -> bool:
+        if self.max_input_tokens is not None and input_tokens > self.max_input_tokens:
+            return False
+        if self.platforms and (platform or "").lower() not in self.platforms:
+            return False
+        return self.verbose is None or self.verbose == bool(verbose)
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+class RouteStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.fallback_calls = 0  # calls served after an earlier route failed
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost_usd = 0.0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ModelRouter:
+    """Picks the model and output budget for each summarization call.
+
+    Routes are matched in order on input size, platform and the verbose flag.
+    With a latency budget, the first matching route expected to finish in time
+    is used, else the fastest matching one: a route too small for the input
+    would cut the summary short, which is worse than being slow. Failed calls
+    walk the route's fallback chain, skipping routes too small for the input.
+    Latency, token and cost stats are kept per route, and the
+    observed median replaces `expected_latency_ms` once a route has traffic.
+    """
+
+    def __init__(self, routes: List[ModelRoute]):
+        if not routes:
+            raise ValueError("At least one model route is required")
+        self.routes = routes
+        self._by_name = {route.name: route for route in routes}
+        self._stats = {route.name: RouteStats() for route in routes}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """Routes from MODEL_ROUTES_FILE (a JSON list), else the defaults."""
+        path = os.getenv("MODEL_ROUTES_FILE")
+        if path:
+            with open(path) as f:
+                configs = json.load(f)
+        else:
+            configs = DEFAULT_ROUTES
+        return cls([ModelRoute(**config) for config in configs])
+
+    def select(
+        self,
+        input_tokens: int,
+        platform: str = "",
+        verbose: bool = False,
+        latency_budget_ms: Optional[float] = None,
+    ) -> ModelRoute:
+        candidates = [
+            route
+            for route in self.routes
+            if route.matches(input_tokens, platform, verbose)
+        ] or [self.routes[-1]]
+        if not latency_budget_ms:
+            return candidates[0]
+
+        for route in candidates:
+            if self.expected_latency_ms(route) <= latency_budget_ms:
+                return route
+        # Nothing fits the budget: take the fastest route that can handle the
+        # input, never one whose input or output limits are too small for it
+        return min(candidates, key=self.expected_latency_ms)
+
+    def expected_latency_ms(self, route: ModelRoute) -> float:
+        observed = self._stats[route.name].percentile(0.5)
+        return observed if observed is not None else route.expected_latency_ms
+
+    def call(
+        self,
+        route: ModelRoute,
+        invoke: Callable[[ModelRoute], Tuple[str, Dict[str, int]]],
+        input_tokens: Optional[int] = None,
+    ) -> Tuple[str, ModelRoute]:
+        """Run `invoke` on the route, then its fallbacks until one succeeds.
+
+        `invoke` returns the response text and token usage
+        (`input_tokens`, `output_tokens`). With `input_tokens`, fallbacks whose
+        `max_input_tokens` is smaller are skipped.
+        """
+        chain = [route] + [
+            self._by_name[name]
+            for name in route.fallbacks
+            if name in self._by_name
+            and name != route.name
+            and (
+                input_tokens is None
+                or self._by_name[name].max_input_tokens is None
+                or input_tokens <= self._by_name[name].max_input_tokens
+            )
+        ]
+        last_error: Optional[Exception] = None
+        for attempt, candidate in enumerate(chain):
+            start = time.perf_counter()
+            try:
+                text, usage = invoke(candidate)
+            except Exception as e:
+                with self._lock:
+                    self._stats[candidate.name].errors += 1
+                print(f"Model route {candidate.name} ({candidate.model}) failed: {e}")
+                last_error = e
+                continue
+
+            self._record(
+                candidate, (time.perf_counter() - start) * 1000, usage, attempt > 0
+            )
+            return text, candidate
+        raise last_error
+
+    def _record(
+        self,
+        route: ModelRoute,
+        latency_ms: float,
+        usage: Dict[str, int],
+        fallback: bool,
+    ):
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        with self._lock:
+            stats = self._stats[route.name]
+            stats.calls += 1
+            stats.fallback_calls += int(fallback)
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.cost_usd += (
+                input_tokens * route.input_cost_per_mtok
+                + output_tokens * route.output_cost_per_mtok
+            ) / 1_000_000
+            stats.latencies.append(latency_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                route.name: {
+                    "model": route.model,
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "fallback_calls": stats.fallback_calls,
+                    "p50_ms": _round(stats.percentile(0.5)),
+                    "p95_ms": _round(stats.percentile(0.95)),
+                    "input_tokens": stats.input_tokens,
+                    "output_tokens": stats.output_tokens,
+                    "cost_usd": round(stats.cost_usd, 4),
+                }
+                for route in self.routes
+                for stats in [self._stats[route.name]]
+            }
@@ -1,7 +1,8 @@
 # app/services/pinecone_service.py
 import os
-from typing import List, Dict, Any
-from app.models.chat import ChatSummary
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+from app.models.chat import DEFAULT_WORKSPACE, ChatSummary
 from app.models.search import SearchRequest
 
 # Only import pinecone if the API key is available
@@ -13,26 +14,50 @@ except ImportError:
     PINECONE_AVAILABLE = False
     print("Warning: Pinecone not installed. Semantic search will be disabled.")
 
+# Cards held for embedding while the connection is not up yet (per process)
+MAX_PENDING_EMBEDDINGS = int(os.getenv("PINECONE_MAX_PENDING", "10000"))
+
 
 class PineconeService:
-    def __init__(self):
+    def __init__(
+        self,
+        index_name: Optional[str] = None,
+        namespace: Optional[str] = None,
+        connect: bool = True,
+    ):
         self.enabled = False
+        # "pending" until connect() runs, then "ready", "disabled" or "error"
+        self.status = "pending"
+        self.last_error: Optional[str] = None
+        self.index_name = index_name or os.getenv("PINECONE_INDEX", "chatcards")
+        self.namespace = namespace or os.getenv("PINECONE_NAMESPACE", "chat-summaries")
+        self.embed_model = os.getenv("PINECONE_EMBED_MODEL", "multilingual-e5-large")
+        # Cards saved before connect() succeeded, by (workspace, source URL)
+        self._pending: Dict[Tuple[str, str], ChatSummary] = {}
+        self._pending_lock = threading.Lock()
+
+        if connect:
+            self.connect()
 
+    def connect(self) -> bool:
+        """Create the client and make sure the index exists (network I/O)."""
         # Check if Pinecone is available and configured
         if not PINECONE_AVAILABLE:
             print("Pinecone service disabled: library not available")
-            return
+            self.status = "disabled"
+            self._drop_pending()
+            return False
 
         api_key = os.getenv("PINECONE_API_KEY")
         if not api_key:
             print("Pinecone service disabled: PINECONE_API_KEY not set")
-            return
+            self.status = "disabled"
+            self._drop_pending()
+            return False
 
         try:
             # Initialize Pinecone client
             self.pc = Pinecone(api_key=api_key)
-            self.index_name = "chatcards"
-            self.namespace = "chat-summaries"
 
             # Create index with integrated embedding model if it doesn't exist
             if not self.pc.has_index(self.index_name):
@@ -42,7 +67,7 @@ class PineconeService:
                     cloud="aws",
                     region="us-east-1",
                     embed={
-                        "model": "multilingual-e5-large",  # Good general-purpose model
+                        "model": self.embed_model,  # Good general-purpose model
                         "field_map": {
                             "text": "content"
                         },  # Map our 'content' field to embeddings
@@ -51,44 +76,80 @@ class PineconeService:
 
             self.index = self.pc.Index(self.index_name)
             self.enabled = True
+            self.status = "ready"
+            self.last_error = None
             print("Pinecone service initialized successfully")
+            self.flush_pending()
+            return True
 
         except Exception as e:
             print(f"Failed to initialize Pinecone: {e}")
             print("Semantic search will be disabled")
+            self.status = "error"
+            self.last_error = str(e)
+            return False
+
+    def namespace_for(self, workspace_id: str) -> str:
+        """Each workspace searches only its own namespace."""
+        if workspace_id == DEFAULT_WORKSPACE:
+            return self.namespace
+        return f"{self.namespace}-{workspace_id}"
 
     def prepare_content_text(self, summary: ChatSummary) -> str:
         """Prepare text for embedding: title + synthesis + tags."""
         tags_text = " ".join(summary.tags)
         return f"{summary.title} {summary.synthesis} {tags_text}"
 
-    def store_embedding(self, summary: ChatSummary) -> bool:
-        """Store chat summary in Pinecone using integrated embeddings."""
+    def build_record(self, summary: ChatSummary) -> Dict[str, Any]:
+        """Build the upsert record for a summary (content gets embedded by Pinecone)."""
+        return {
+            "_id": summary.id,
+            "content": self.prepare_content_text(summary),
+            "title": summary.title,
+            "synthesis": summary.synthesis,
+            "source_url": summary.source_url,
+            "project_name": summary.project_name,
+            "platform": summary.platform,
+            "created_at": summary.created_at.isoformat(),
+            "tags": summary.tags,
+        }
+
+    def upsert_records(
+        self, records: List[Dict[str, Any]], namespace: Optional[str] = None
+    ):
+        """Upsert a batch of records in one call. Raises on failure so callers can retry."""
         if not self.enabled:
-            print("Pinecone not enabled, skipping embedding storage")
-            return False
+            raise RuntimeError("Pinecone not enabled")
+        self.index.upsert_records(namespace or self.namespace, records)
+
+    def store_embedding(self, summary: ChatSummary) -> bool:
+        """Store chat summary in Pinecone using integrated embeddings.
+
+        Until connect() has succeeded (at startup, or while it keeps retrying
+        after errors) the card is held and embedded once it does.
+        """
+        with self._pending_lock:
+            if not self.enabled:
+                if self.status == "disabled":
+                    print("Pinecone not enabled, skipping embedding storage")
+                elif len(self._pending) >= MAX_PENDING_EMBEDDINGS:
+                    print("Pinecone not connected and backlog full, skipping embedding")
+                else:
+                    key = (summary.workspace_id, summary.source_url)
+                    self._pending[key] = summary
+                    print(f"Pinecone not connected, holding embedding for {summary.id}")
+                return False
 
         try:
             # Delete existing record first (Option 2: Always Overwrite)
-            self.delete_embedding_by_source_url(summary.source_url)
-
-            # Prepare record for upsert
-            content_text = self.prepare_content_text(summary)
-
-            record = {
-                "_id": summary.id,
-                "content": content_text,  # This gets embedded automatically
-                "title": summary.title,
-                "synthesis": summary.synthesis,
-                "source_url": summary.source_url,
-                "project_name": summary.project_name,
-                "platform": summary.platform,
-                "created_at": summary.created_at.isoformat(),
-                "tags": summary.tags,
-            }
+            self.delete_embedding_by_source_url(
+                summary.source_url, summary.workspace_id
+            )
 
             # Upsert using new API
-            self.index.upsert_records(self.namespace, [record])
+            self.upsert_records(
+                [self.build_record(summary)], self.namespace_for(summary.workspace_id)
+            )
             print(f"Stored embedding for chat: {summary.title}")
             return True
 
@@ -96,15 +157,37 @@ class PineconeService:
             print(f"Error storing embedding: {e}")
             return False
 
-    def delete_embedding_by_source_url(self, source_url: str):
+    def flush_pending(self) -> int:
+        """Embed the cards held while disconnected; returns how many were stored."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        stored = sum(self.store_embedding(summary) for summary in pending.values())
+        print(f"Stored {stored}/{len(pending)} embeddings held while disconnected")
+        return stored
+
+    def _drop_pending(self):
+        with self._pending_lock:
+            if self._pending:
+                count = len(self._pending)
+                print(f"Pinecone disabled, dropping {count} held embeddings")
+            self._pending = {}
+
+    def delete_embedding_by_source_url(
+        self, source_url: str, workspace_id: str = DEFAULT_WORKSPACE
+    ):
         """Delete existing embeddings with this source_url."""
+        with self._pending_lock:
+            self._pending.pop((workspace_id, source_url), None)
         if not self.enabled:
             return
 
+        namespace = self.namespace_for(workspace_id)
         try:
             # Search for existing records with this source_url
             search_results = self.index.search(
-                namespace=self.namespace,
+                namespace=namespace,
                 query={
                     "top_k": 100,
                     "inputs": {"text": "dummy"},  # Dummy query
@@ -117,7 +200,7 @@ class PineconeService:
                 ids_to_delete = [hit["_id"] for hit in search_results["result"]["hits"]]
 
                 if ids_to_delete:
-                    self.index.delete(ids=ids_to_delete, namespace=self.namespace)
+                    self.index.delete(ids=ids_to_delete, namespace=namespace)
                     print(
                         f"Deleted {len(ids_to_delete)} existing embeddings for {source_url}"
                     )
@@ -125,12 +208,21 @@ class PineconeService:
         except Exception as e:
             print(f"Error deleting embeddings: {e}")
 
-    def semantic_search(self, request: SearchRequest) -> List[Dict[str, Any]]:
+    def delete_namespace(self):
+        """Remove every vector in this service's namespace."""
+        if not self.enabled:
+            raise RuntimeError("Pinecone not enabled")
+        self.index.delete(delete_all=True, namespace=self.namespace)
+
+    def semantic_search(
+        self, request: SearchRequest, workspace_id: str = DEFAULT_WORKSPACE
+    ) -> List[Dict[str, Any]]:
         """Perform semantic search using Pinecone's integrated embeddings."""
         if not self.enabled:
             print("Pinecone not enabled, returning empty semantic results")
             return []
 
+        namespace = self.namespace_for(workspace_id)
         try:
             # Build filter
             filter_dict = {}
@@ -142,7 +234,7 @@ class PineconeService:
             # Search using new API
             if not filter_dict:
                 search_results = self.index.search(
-                    namespace=self.namespace,
+                    namespace=namespace,
                     query={
                         "top_k": request.limit,
                         "inputs": {"text": request.query},
@@ -151,7 +243,7 @@ class PineconeService:
                 )
             else:
                 search_results = self.index.search(
-                    namespace=self.namespace,
+                    namespace=namespace,
                     query={
                         "top_k": request.limit,
                         "inputs": {"text": request.query},
@@ -186,15 +278,51 @@ class PineconeService:
             print(f"Error in semantic search: {e}")
             return []
 
-    def get_vector_count(self) -> int:
+    def find_neighbors(
+        self,
+        chat_id: str,
+        text: str,
+        workspace_id: str = DEFAULT_WORKSPACE,
+        top_k: int = 20,
+    ) -> List[Tuple[str, float]]:
+        """Nearest stored records to a chat, as (id, score), excluding the chat itself.
+
+        Queries with the chat's stored vector; a record upserted moments ago may
+        not be searchable yet, in which case its text is embedded instead.
+        """
+        if not self.enabled:
+            return []
+
+        namespace = self.namespace_for(workspace_id)
+        for query in ({"id": chat_id}, {"inputs": {"text": text}}):
+            try:
+                search_results = self.index.search(
+                    namespace=namespace, query={"top_k": top_k + 1, **query}
+                )
+            except Exception as e:
+                print(f"Error finding neighbors for {chat_id}: {e}")
+                continue
+
+            if "result" in search_results and "hits" in search_results["result"]:
+                hits = [
+                    (hit["_id"], hit["_score"])
+                    for hit in search_results["result"]["hits"]
+                    if hit["_id"] != chat_id
+                ]
+                if hits:
+                    return hits[:top_k]
+        return []
+
+    def get_vector_count(self, namespace: Optional[str] = None) -> int:
         """Get count of stored vectors."""
         if not self.enabled:
             return 0
 
+        namespace = namespace or self.namespace
         try:
             stats = self.index.describe_index_stats()
-            if "namespaces" in stats and self.namespace in stats["namespaces"]:
-                return stats["namespaces"][self.namespace]["vector_count"]
+            if "namespaces" in stats and namespace in stats["namespaces"]:
+                return stats["namespaces"][namespace]["vector_count"]
             return 0
         except Exception as e:
             print(f"Error getting vector count: {e}")
@@ -0,0 +1,361 @@
+# app/services/preprocess_service.py
+import math
+import os
+import re
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Pattern, Set, Tuple
+from urllib.parse import urlsplit
+
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_ZERO_WIDTH_RE = re.compile("[\u200b\u200c\u200d\u2060\ufeff]")
+_INLINE_SPACE_RE = re.compile("[ \t\u00a0]+")
+# Inline attachments (data URIs) and bare base64 runs far longer than any word
+_DATA_URI_RE = re.compile(r"data:[\w.+-]+/[\w.+-]+;base64,[A-Za-z0-9+/=\s]{64,}")
+_BASE64_RUN_RE = re.compile(r"[A-Za-z0-9+/]{200,}={0,2}")
+
+# UI text that scrapes along with the transcript: buttons, disclaimers,
+# response counters. Patterns match whole (stripped) lines only.
+COMMON_CHROME = [
+    r"Copy( code)?",
+    r"Copied!?",
+    r"Edit",
+    r"Retry",
+    r"Share",
+    r"Regenerate( response)?",
+    r"Read aloud",
+    r"(Good|Bad) response",
+]
+PLATFORM_CHROME: Dict[str, List[str]] = {
+    "chatgpt": [
+        r"ChatGPT can make mistakes\..*",
+        r"(Thought|Reasoned) for .{1,40}",
+        r"Searched \d+ sites?",
+        r"Is this conversation helpful so far\?",
+        r"Open in canvas",
+    ],
+    "claude": [
+        r"Claude can make mistakes\..*",
+        r"Claude does not have the ability to run the code it generates yet\.?",
+        r"Click to open (code|document|image|component)",
+    ],
+    "gemini": [
+        r"Gemini (can|may) make mistakes.*",
+        r"Show (drafts|thinking)",
+        r"Modify response",
+        # Material icon names leak into innerText
+        r"expand_more|expand_less|more_vert|content_copy|thumb_up|thumb_down",
+    ],
+    "perplexity": [
+        r"Rewrite",
+        r"Sources",
+        r"Related",
+        r"View \d+ more",
+    ],
+}
+# Response variant switchers ("2/2") read like any fraction or score, so they
+# only count as chrome on a line next to a button label
+PLATFORM_SWITCHERS: Dict[str, str] = {
+    "chatgpt": r"\d+ ?/ ?\d+",
+}
+PLATFORM_HOSTS = {
+    "chatgpt.com": "chatgpt",
+    "chat.openai.com": "chatgpt",
+    "claude.ai": "claude",
+    "gemini.google.com": "gemini",
+    "perplexity.ai": "perplexity",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English and code)."""
+    return math.ceil(len(text) / 4)
+
+
+def _compile_chrome(patterns: List[str]) -> Pattern:
+    return re.compile(r"^(?:" + "|".join(patterns) + r")$", re.IGNORECASE)
+
+
+@dataclass
+class PreprocessResult:
+    content: str
+    tokens_before: int
+    tokens_after: int
+    # Per-step counts: chrome lines, duplicates, truncated blocks, blobs
+    removed: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+class ChatPreprocessor:
+    """Shrinks scraped chat content before it is sent to the model.
+
+    Normalizes whitespace, drops known platform chrome (button labels,
+    disclaimers), removes repeated lines and code blocks, replaces base64 blobs
+    and cuts oversized code blocks down to their head and tail with a
+    placeholder; prose is never cut. Highlights are never touched: every line
+    overlapping one is passed through verbatim, and any block containing one is
+    kept whole.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("PREPROCESS_ENABLED", "true").lower() == "true"
+        self.strip_chrome = (
+            os.getenv("PREPROCESS_STRIP_CHROME", "true").lower() == "true"
+        )
+        self.dedup_blocks = (
+            os.getenv("PREPROCESS_DEDUP_BLOCKS", "true").lower() == "true"
+        )
+        # Short blocks ("Yes", "Thanks!") legitimately repeat
+        self.dedup_min_chars = int(os.getenv("PREPROCESS_DEDUP_MIN_CHARS", "40"))
+        # Code blocks past these limits keep their head and tail (0 disables)
+        self.max_block_lines = int(os.getenv("PREPROCESS_MAX_BLOCK_LINES", "80"))
+        self.max_block_chars = int(os.getenv("PREPROCESS_MAX_BLOCK_CHARS", "6000"))
+
+        self._common_chrome = _compile_chrome(COMMON_CHROME)
+        self._platform_chrome = {
+            platform: _compile_chrome(patterns)
+            for platform, patterns in PLATFORM_CHROME.items()
+        }
+        self._switchers = {
+            platform: _compile_chrome([pattern])
+            for platform, pattern in PLATFORM_SWITCHERS.items()
+        }
+
+        self.processed = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.removed: Dict[str, int] = {
+            "chrome_lines": 0,
+            "duplicates": 0,
+            "truncated_blocks": 0,
+            "base64_blobs": 0,
+        }
+
+    def prepare(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of the summarize input with its chat content preprocessed."""
+        if not self.enabled:
+            return input_data
+
+        result = self.process(
+            input_data.get("chat_content", ""),
+            platform=input_data.get("platform", ""),
+            source_url=input_data.get("source_url", ""),
+            highlights=input_data.get("highlights") or [],
+        )
+        print(
+            f"Preprocessed chat: {result.tokens_before} -> {result.tokens_after} "
+            f"tokens ({result.tokens_saved} saved)"
+        )
+        return {**input_data, "chat_content": result.content}
+
+    def process(
+        self,
+        content: str,
+        platform: str = "",
+        source_url: str = "",
+        highlights: Optional[List[str]] = None,
+    ) -> PreprocessResult:
+        removed = dict.fromkeys(self.removed, 0)
+        keep = [
+            _ZERO_WIDTH_RE.sub("", h.replace("\r\n", "\n").replace("\r", "\n")).strip()
+            for h in highlights or []
+            if h and h.strip()
+        ]
+
+        text = content.replace("\r\n", "\n").replace("\r", "\n")
+        text = _ZERO_WIDTH_RE.sub("", text)
+        text = self._replace_blobs(text, keep, removed)
+        # Located in the raw text, before any line is rewritten
+        pinned_lines = self._pinned_lines(text, keep)
+
+        chrome, switcher = self._chrome_for(platform, source_url)
+        seen = set()
+        blocks = []
+        for block, is_code, start in self._split_blocks(text):
+            end = start + block.count("\n") + 1
+            pinned = not pinned_lines.isdisjoint(range(start, end))
+            if is_code:
+                if not pinned:
+                    block = "\n".join(line.rstrip() for line in block.split("\n"))
+                    if self._is_repeat(block, seen):
+                        removed["duplicates"] += 1
+                        continue
+            else:
+                # Scraped messages often share a paragraph with a speaker label,
+                # so prose repeats are caught line by line
+                block = self._clean_prose(
+                    block, start, pinned_lines, chrome, switcher, seen, removed
+                )
+            if not block.strip():
+                continue
+
+            if is_code and not pinned:
+                block = self._truncate(block, removed)
+            blocks.append(block)
+
+        processed = "\n\n".join(blocks)
+        result = PreprocessResult(
+            content=processed,
+            tokens_before=estimate_tokens(content),
+            tokens_after=estimate_tokens(processed),
+            removed=removed,
+        )
+
+        self.processed += 1
+        self.tokens_before += result.tokens_before
+        self.tokens_after += result.tokens_after
+        for step, count in removed.items():
+            self.removed[step] += count
+        return result
+
+    def _chrome_for(
+        self, platform: str, source_url: str
+    ) -> Tuple[Optional[Pattern], Optional[Pattern]]:
+        """The platform's chrome and variant switcher patterns, if known."""
+        if not self.strip_chrome:
+            return None, None
+        platform = (platform or "").lower()
+        if platform not in self._platform_chrome and source_url:
+            host = (urlsplit(source_url).hostname or "").removeprefix("www.")
+            platform = PLATFORM_HOSTS.get(host, platform)
+        return self._platform_chrome.get(platform), self._switchers.get(platform)
+
+    @staticmethod
+    def _pinned_lines(text: str, keep: List[str]) -> Set[int]:
+        """Indices of the lines overlapping any occurrence of a highlight."""
+        if not keep:
+            return set()
+        line_starts = [0] + [match.end() for match in re.finditer("\n", text)]
+        pinned = set()
+        for highlight in keep:
+            pos = text.find(highlight)
+            while pos != -1:
+                first = bisect_right(line_starts, pos) - 1
+                last = bisect_right(line_starts, pos + len(highlight) - 1) - 1
+                pinned.update(range(first, last + 1))
+                pos = text.find(highlight, pos + 1)
+        return pinned
+
+    @staticmethod
+    def _split_blocks(text: str) -> Iterator[Tuple[str, bool, int]]:
+        """Yield (block, is_code, start): fenced code blocks, else paragraphs.
+
+        `start` is the index of the block's first line in `text`; a block's
+        lines are contiguous there.
+        """
+        lines: List[str] = []
+        start = 0
+        fence = None
+        for index, line in enumerate(text.split("\n")):
+            match = _FENCE_RE.match(line)
+            if fence is None and match:
+                if lines:
+                    yield "\n".join(lines), False, start
+                lines, fence, start = [line], match.group(1), index
+            elif fence is not None:
+                lines.append(line)
+                if match and match.group(1) == fence:
+                    yield "\n".join(lines), True, start
+                    lines, fence = [], None
+            elif line.strip():
+                if not lines:
+                    start = index
+                lines.append(line)
+            elif lines:
+                yield "\n".join(lines), False, start
+                lines = []
+        if lines:
+            # An unterminated fence still holds code
+            yield "\n".join(lines), fence is not None, start
+
+    def _is_repeat(self, text: str, seen: set) -> bool:
+        """Record a block or line; True if an identical long one came earlier."""
+        if not self.dedup_blocks or len(text) < self.dedup_min_chars:
+            return False
+        key = _INLINE_SPACE_RE.sub(" ", text).strip().lower()
+        if key in seen:
+            return True
+        seen.add(key)
+        return False
+
+    def _clean_prose(
+        self,
+        block: str,
+        start: int,
+        pinned_lines: Set[int],
+        chrome: Optional[Pattern],
+        switcher: Optional[Pattern],
+        seen: set,
+        removed: Dict[str, int],
+    ) -> str:
+        raw_lines = block.split("\n")
+        stripped = [_INLINE_SPACE_RE.sub(" ", line).strip() for line in raw_lines]
+        is_chrome = [
+            self.strip_chrome
+            and bool(
+                self._common_chrome.match(line) or (chrome and chrome.match(line))
+            )
+            for line in stripped
+        ]
+        lines = []
+        for offset, line in enumerate(stripped):
+            if start + offset in pinned_lines:
+                lines.append(raw_lines[offset])
+                continue
+            next_to_button = (offset > 0 and is_chrome[offset - 1]) or (
+                offset + 1 < len(is_chrome) and is_chrome[offset + 1]
+            )
+            if is_chrome[offset] or (
+                switcher and next_to_button and switcher.match(line)
+            ):
+                removed["chrome_lines"] += 1
+                continue
+            if self._is_repeat(line, seen):
+                removed["duplicates"] += 1
+                continue
+            lines.append(line)
+        return "\n".join(lines)
+
+    def _replace_blobs(
+        self, text: str, keep: List[str], removed: Dict[str, int]
+    ) -> str:
+        def placeholder(match: re.Match) -> str:
+            blob = match.group(0)
+            if any(h in blob for h in keep):
+                return blob
+            removed["base64_blobs"] += 1
+            return f"[base64 data omitted: {len(blob) * 3 // 4 // 1024 or 1} KB]"
+
+        text = _DATA_URI_RE.sub(placeholder, text)
+        return _BASE64_RUN_RE.sub(placeholder, text)
+
+    def _truncate(self, block: str, removed: Dict[str, int]) -> str:
+        lines = block.split("\n")
+        if self.max_block_lines and len(lines) > self.max_block_lines:
+            head = lines[: self.max_block_lines * 3 // 4]
+            tail = lines[-(self.max_block_lines // 8 or 1) :]
+            omitted = len(lines) - len(head) - len(tail)
+            lines = head + [f"[... {omitted} lines of code omitted ...]"] + tail
+            removed["truncated_blocks"] += 1
+            block = "\n".join(lines)
+        elif self.max_block_chars and len(block) > self.max_block_chars:
+            # One enormous line (minified code, pasted logs or data)
+            head = block[: self.max_block_chars * 3 // 4]
+            tail = block[-(self.max_block_chars // 8) :]
+            omitted = len(block) - len(head) - len(tail)
+            block = f"{head}\n[... {omitted} characters omitted ...]\n{tail}"
+            removed["truncated_blocks"] += 1
+        return block
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "processed": self.processed,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_before - self.tokens_after,
+            "removed": dict(self.removed),
+        }
@@ -0,0 +1,118 @@
+# app/services/recap_codec.py
+import os
+import threading
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    print("Warning: zstandard not installed. Recaps will be compressed with zlib.")
+
+CODEC_RAW = "raw"
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+
+# Recaps shorter than this are stored as-is; compression would barely pay off
+MIN_COMPRESS_BYTES = 64
+
+
+class RecapCodec:
+    """Compresses recap bodies for the `chat_recaps` table.
+
+    Uses zstd when the `zstandard` package is installed, optionally with a
+    dictionary trained on the archive's own recaps (recaps are short and
+    share a lot of markdown structure, which a dictionary captures), and zlib
+    otherwise. Every body records its codec and dictionary, so rows written
+    under any configuration stay readable, and recompaction can move them to
+    the current one.
+    """
+
+    def __init__(self, load_dictionary: Callable[[int], bytes]):
+        # Fetches a stored dictionary by id (dictionaries are immutable)
+        self.load_dictionary = load_dictionary
+        preferred = os.getenv("RECAP_COMPRESSION", CODEC_ZSTD).lower()
+        if preferred == CODEC_ZSTD and not ZSTD_AVAILABLE:
+            preferred = CODEC_ZLIB
+        self.codec = preferred
+        self.zstd_level = int(os.getenv("RECAP_ZSTD_LEVEL", "9"))
+        self.zlib_level = int(os.getenv("RECAP_ZLIB_LEVEL", "6"))
+
+        self._dictionaries: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+        self._dictionaries_lock = threading.Lock()
+        # zstd (de)compressor objects must not be shared between threads
+        self._local = threading.local()
+
+    def target(self, dict_id: Optional[int]) -> Tuple[str, Optional[int]]:
+        """(codec, dictionary) for new bodies, given the newest stored dictionary."""
+        if self.codec == CODEC_ZSTD:
+            return CODEC_ZSTD, dict_id
+        return self.codec, None
+
+    def encode(
+        self, text: str, dict_id: Optional[int] = None
+    ) -> Tuple[str, Optional[int], bytes]:
+        """Compress a recap; returns (codec, dictionary id, body)."""
+        data = text.encode("utf-8")
+        codec, dict_id = self.target(dict_id)
+        if len(data) < MIN_COMPRESS_BYTES or codec == CODEC_RAW:
+            return CODEC_RAW, None, data
+        if codec == CODEC_ZSTD:
+            return CODEC_ZSTD, dict_id, self._compressor(dict_id).compress(data)
+        return CODEC_ZLIB, None, zlib.compress(data, self.zlib_level)
+
+    def row(
+        self, chat_id: str, text: str, dict_id: Optional[int] = None
+    ) -> Tuple[str, str, Optional[int], bytes, int]:
+        """Values for a `chat_recaps` insert: id, codec, dictionary, body, raw size."""
+        return (chat_id, *self.encode(text, dict_id), len(text.encode("utf-8")))
+
+    def decode(self, codec: str, dict_id: Optional[int], body: bytes) -> str:
+        if codec == CODEC_RAW:
+            data = body
+        elif codec == CODEC_ZLIB:
+            data = zlib.decompress(body)
+        elif codec == CODEC_ZSTD:
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError("zstandard is required to read zstd recaps")
+            data = self._decompressor(dict_id).decompress(body)
+        else:
+            raise ValueError(f"Unknown recap codec: {codec}")
+        return data.decode("utf-8")
+
+    @staticmethod
+    def train_dictionary(samples: List[str], size: int) -> bytes:
+        """Train a zstd dictionary of about `size` bytes on sample recaps."""
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("zstandard is required to train a recap dictionary")
+        encoded = [sample.encode("utf-8") for sample in samples]
+        return zstandard.train_dictionary(size, encoded).as_bytes()
+
+    def _dictionary(self, dict_id: int) -> "zstandard.ZstdCompressionDict":
+        with self._dictionaries_lock:
+            dictionary = self._dictionaries.get(dict_id)
+        if dictionary is None:
+            dictionary = zstandard.ZstdCompressionDict(self.load_dictionary(dict_id))
+            with self._dictionaries_lock:
+                self._dictionaries[dict_id] = dictionary
+        return dictionary
+
+    def _compressor(self, dict_id: Optional[int]) -> "zstandard.ZstdCompressor":
+        compressors = self._local.__dict__.setdefault("compressors", {})
+        if dict_id not in compressors:
+            compressors[dict_id] = zstandard.ZstdCompressor(
+                level=self.zstd_level,
+                dict_data=self._dictionary(dict_id) if dict_id else None,
+            )
+        return compressors[dict_id]
+
+    def _decompressor(self, dict_id: Optional[int]) -> "zstandard.ZstdDecompressor":
+        decompressors = self._local.__dict__.setdefault("decompressors", {})
+        if dict_id not in decompressors:
+            decompressors[dict_id] = zstandard.ZstdDecompressor(
+                dict_data=self._dictionary(dict_id) if dict_id else None
+            )
+        return decompressors[dict_id]
@@ -0,0 +1,84 @@
+# app/services/related_service.py
+import os
+import re
+from typing import List, Optional, Set, Tuple
+from app.services.database_service import DatabaseService
+from app.services.pinecone_service import PineconeService
+from app.models.chat import DEFAULT_WORKSPACE, ChatSummary
+from app.models.search import SearchRequest, SearchResult
+
+_WORD_RE = re.compile(r"\w{3,}", re.UNICODE)
+
+# Keyword matches gathered per tag when Pinecone is unavailable
+FALLBACK_CANDIDATES_PER_TERM = 50
+
+
+def _terms(title: str, synthesis: str, tags: List[str]) -> Set[str]:
+    return set(_WORD_RE.findall(f"{title} {synthesis} {' '.join(tags)}".lower()))
+
+
+class RelatedService:
+    """Precomputed "more like this" lists: the k nearest cards to each card.
+
+    Neighbors are found once, when a card is stored: by the card's stored
+    vector in Pinecone, or by term overlap with keyword matches when Pinecone
+    is unavailable. Edges are saved in both directions, so cards ingested
+    earlier pick up newer neighbors too, and a related panel is one indexed
+    lookup instead of a vector query per view.
+    """
+
+    def __init__(
+        self,
+        db_service: Optional[DatabaseService] = None,
+        pinecone_service: Optional[PineconeService] = None,
+    ):
+        self.db_service = db_service or DatabaseService()
+        self.pinecone_service = pinecone_service or PineconeService()
+        self.k = int(os.getenv("RELATED_NEIGHBORS", "20"))
+
+    def update_for(self, summary: ChatSummary) -> int:
+        """Find and save a stored card's neighbors; returns how many were saved."""
+        neighbors = self.pinecone_service.find_neighbors(
+            summary.id,
+            self.pinecone_service.prepare_content_text(summary),
+            summary.workspace_id,
+            top_k=self.k,
+        )
+        if not neighbors:
+            neighbors = self._text_neighbors(summary)
+        return self.db_service.save_neighbors(summary.id, neighbors, self.k)
+
+    def _text_neighbors(self, summary: ChatSummary) -> List[Tuple[str, float]]:
+        """Jaccard similarity against cards sharing a tag (or title word)."""
+        base = _terms(summary.title, summary.synthesis, summary.tags)
+        probes = summary.tags[:5] or sorted(_terms(summary.title, "", []))[:5]
+
+        candidates = {}
+        for probe in probes:
+            request = SearchRequest(query=probe, limit=FALLBACK_CANDIDATES_PER_TERM)
+            for result in self.db_service.keyword_search(request, summary.workspace_id):
+                if result.id != summary.id:
+                    candidates[result.id] = result
+
+        scored = []
+        for chat_id, result in candidates.items():
+            terms = _terms(result.title, result.synthesis, result.tags)
+            union = len(base | terms)
+            if union and base & terms:
+                scored.append((chat_id, len(base & terms) / union))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[: self.k]
+
+    def related(
+        self,
+        chat_id: str,
+        workspace_id: str = DEFAULT_WORKSPACE,
+        limit: int = 10,
+        project_filter: Optional[str] = None,
+        platform_filter: Optional[str] = None,
+        include_recap: bool = False,
+    ) -> List[SearchResult]:
+        """A card's stored neighbors, nearest first. Filters apply to those k."""
+        return self.db_service.get_related(
+            chat_id, workspace_id, limit, project_filter, platform_filter, include_recap
+        )
@@ -1,33 +1,44 @@
 # app/services/search_service.py
 import time
-from typing import List
+from typing import List, Optional
 from app.services.database_service import DatabaseService
 from app.services.pinecone_service import PineconeService
+from app.services.tracing import stage
+from app.models.chat import DEFAULT_WORKSPACE
 from app.models.search import SearchRequest, SearchResponse, SearchResult
 
 
 class SearchService:
-    def __init__(self):
-        self.db_service = DatabaseService()
-        self.pinecone_service = PineconeService()
-
-    def search(self, request: SearchRequest) -> SearchResponse:
-        """Perform combined semantic + keyword search."""
+    def __init__(
+        self,
+        db_service: Optional[DatabaseService] = None,
+        pinecone_service: Optional[PineconeService] = None,
+    ):
+        self.db_service = db_service or DatabaseService()
+        self.pinecone_service = pinecone_service or PineconeService()
+
+    def search(
+        self, request: SearchRequest, workspace_id: str = DEFAULT_WORKSPACE
+    ) -> SearchResponse:
+        """Perform combined semantic + keyword search within one workspace."""
         start_time = time.time()
 
         print(f"Searching for: '{request.query}'")
 
         # Perform both searches
         print("Performing keyword search...")
-        keyword_results = self.db_service.keyword_search(request)
+        with stage("keyword_search"):
+            keyword_results = self.db_service.keyword_search(request, workspace_id)
         print(f"Keyword search found {len(keyword_results)} results")
 
         print("Performing semantic search...")
-        semantic_results = self._get_semantic_results(request)
+        with stage("semantic_search"):
+            semantic_results = self._get_semantic_results(request, workspace_id)
         print(f"Semantic search found {len(semantic_results)} results")
 
         # Combine and deduplicate results
-        combined_results = self._combine_results(semantic_results, keyword_results)
+        with stage("combine_results"):
+            combined_results = self._combine_results(semantic_results, keyword_results)
         print(f"Combined search found {len(combined_results)} unique results")
 
         # Calculate search time
@@ -40,19 +51,23 @@ class SearchService:
             search_time_ms=search_time_ms,
         )
 
-    def _get_semantic_results(self, request: SearchRequest) -> List[SearchResult]:
+    def _get_semantic_results(
+        self, request: SearchRequest, workspace_id: str
+    ) -> List[SearchResult]:
         """Get semantic search results from Pinecone (placeholder for now)."""
         if not self.pinecone_service.enabled:
             print("Pinecone not enabled, skipping semantic search")
             return []
 
         print("Performing semantic search...")
-        pinecone_matches = self.pinecone_service.semantic_search(request)
+        pinecone_matches = self.pinecone_service.semantic_search(request, workspace_id)
 
         semantic_results = []
         for match in pinecone_matches:
             # Get full chat data from database using the ID
-            chat_data = self.db_service.get_chat_by_id(match["id"])
+            chat_data = self.db_service.get_chat_by_id(
+                match["id"], workspace_id, include_recap=request.include_recap
+            )
             if chat_data:
                 chat_data.relevance_score = match["score"]
                 chat_data.search_type = "semantic"
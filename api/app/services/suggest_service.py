@@ -0,0 +1,577 @@
+# app/services/suggest_service.py
+import bisect
+import json
+import math
+import os
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from app.services.database_service import DatabaseService
+from app.models.chat import DEFAULT_WORKSPACE, ChatSummary
+from app.models.search import Suggestion, SuggestResponse
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_EDIT_ALPHABET = string.ascii_lowercase + string.digits
+# Sorts after every character a key can contain
+_MAX_CHAR = "\U0010ffff"
+
+# Ranking weight per suggestion kind (titles are the most useful completions)
+KIND_WEIGHTS = {"title": 3.0, "project": 2.0, "tag": 1.5}
+
+# Prefixes matching at most this many keys are scanned; wider ones (one-letter
+# prefixes on a big archive) are served from a cached top list per prefix
+MAX_SCAN = 400
+# Phrases kept per cached prefix, above the largest limit the API accepts
+TOP_PER_PREFIX = 64
+MAX_FUZZY_VARIANTS = 3
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse text to space separated word tokens."""
+    return " ".join(_WORD_RE.findall((text or "").lower()))
+
+
+def _edits1(word: str) -> Iterable[str]:
+    """All strings one edit (delete, transpose, replace, insert) away from word."""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    for left, right in splits:
+        if right:
+            yield left + right[1:]
+        if len(right) > 1:
+            yield left + right[1] + right[0] + right[2:]
+        for c in _EDIT_ALPHABET:
+            if right:
+                yield left + c + right[1:]
+            yield left + c + right
+
+
+class SuggestService:
+    """In-memory prefix index over chat titles, tags and project names.
+
+    Every phrase is indexed under each of its word offsets, so "api dev" completes
+    "Discussion about API Development". Keys live in a sorted list and prefix
+    lookups are a bisect plus a scan of the matching keys. Prefixes matching
+    more than MAX_SCAN keys keep their best-scoring phrases in a cache that
+    saves update in place. When the exact prefix finds too little, query
+    tokens are corrected against the vocabulary with one edit.
+    """
+
+    def __init__(
+        self,
+        db_service: Optional[DatabaseService] = None,
+        refresh_interval: Optional[float] = None,
+        workspace_id: str = DEFAULT_WORKSPACE,
+    ):
+        self.db_service = db_service or DatabaseService()
+        self.workspace_id = workspace_id
+        self._lock = threading.RLock()
+        # (kind, normalized phrase) -> [display text, reference count]
+        self._phrases: Dict[Tuple[str, str], list] = {}
+        # Sorted (key, kind, normalized phrase) entries, one per word offset
+        self._keys: List[Tuple[str, str, str]] = []
+        # word -> reference count, plus the sorted word list for prefix lookups
+        self._vocab: Dict[str, int] = {}
+        self._vocab_sorted: List[str] = []
+        # source_url -> phrases contributed, so overwrites can be undone
+        self._by_source: Dict[str, List[Tuple[str, str, str]]] = {}
+        # prefix -> [(-score, kind, norm) best first, floor]: phrases left out
+        # of the list score at most `floor` (-inf when none were left out)
+        self._top: Dict[str, list] = {}
+        self._top_depth = 0  # longest cached prefix
+        self.ready = False
+
+        # Saves seen while a build is running, replayed once it swaps in
+        self._building = False
+        self._pending: List[ChatSummary] = []
+
+        # With several worker processes, other workers' saves only show up in
+        # the database, so poll its data version and replay the change log
+        self.refresh_interval = refresh_interval
+        self._last_refresh_check = 0.0
+        self._seen_version: Optional[int] = None
+        self._change_cursor = 0
+        self._refreshing = False
+
+    def build(self):
+        """(Re)build the index from every stored chat, then swap it in."""
+        with self._lock:
+            self._building = True
+            self._pending = []
+
+        try:
+            version = self.db_service.data_version() if self.refresh_interval else None
+            # Changes after this point are replayed by the next refresh
+            _, change_cursor = self.db_service.change_log_bounds(self.workspace_id)
+            fresh = SuggestService(self.db_service, workspace_id=self.workspace_id)
+            for row in self.db_service.get_suggestion_sources(self.workspace_id):
+                phrases = self._phrases_for(
+                    row["title"],
+                    json.loads(row["tags"]),
+                    row["project_name"],
+                    row["project"],
+                )
+                fresh._by_source[row["source_url"]] = phrases
+                for kind, norm, display in phrases:
+                    fresh._ref_phrase(kind, norm, display, insert_keys=False)
+
+            fresh._keys = sorted(
+                (key, kind, norm)
+                for (kind, norm) in fresh._phrases
+                for key in self._phrase_keys(norm)
+            )
+            fresh._vocab_sorted = sorted(fresh._vocab)
+
+            with self._lock:
+                self._phrases = fresh._phrases
+                self._keys = fresh._keys
+                self._vocab = fresh._vocab
+                self._vocab_sorted = fresh._vocab_sorted
+                self._by_source = fresh._by_source
+                self._top = {}
+                self._top_depth = 0
+                self._seen_version = version
+                self._change_cursor = change_cursor
+                self.ready = True
+                for summary in self._pending:
+                    self._index_summary(summary)
+        finally:
+            with self._lock:
+                self._building = False
+                self._pending = []
+
+        print(
+            f"Suggestion index built for workspace {self.workspace_id}: "
+            f"{len(self._phrases)} phrases, {len(self._keys)} keys"
+        )
+
+    def add_summary(self, summary: ChatSummary):
+        """Index a newly saved summary, replacing any card with the same source_url."""
+        with self._lock:
+            if self._building:
+                self._pending.append(summary)
+            self._index_summary(summary)
+
+    def _index_summary(self, summary: ChatSummary):
+        phrases = self._phrases_for(
+            summary.title, summary.tags, summary.project_name, summary.project
+        )
+        with self._lock:
+            self.remove_source(summary.source_url)
+            self._by_source[summary.source_url] = phrases
+            for kind, norm, display in phrases:
+                self._ref_phrase(kind, norm, display)
+
+    def _maybe_refresh(self):
+        """Catch up in the background if another process changed the database."""
+        now = time.monotonic()
+        if (
+            not self.refresh_interval
+            or self._refreshing
+            or now - self._last_refresh_check < self.refresh_interval
+        ):
+            return
+        self._last_refresh_check = now
+        version = self.db_service.data_version()
+        if version == self._seen_version:
+            return
+
+        self._refreshing = True
+
+        def refresh():
+            try:
+                self._apply_changes()
+                self._seen_version = version
+            except Exception as e:
+                print(f"Suggestion index refresh failed: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=refresh, name="suggest-refresh", daemon=True).start()
+
+    def _apply_changes(self):
+        """Replay change-log entries since the last build or refresh."""
+        oldest, _ = self.db_service.change_log_bounds(self.workspace_id)
+        if oldest > self._change_cursor + 1:
+            # Entries we have not seen were trimmed from the log
+            self.build()
+            return
+
+        while True:
+            changes = self.db_service.get_changes(
+                self._change_cursor,
+                limit=1000,
+                workspace_id=self.workspace_id,
+                include_recap=False,
+            )
+            if not changes:
+                return
+            for change in changes:
+                if change["op"] == "delete":
+                    self.remove_source(change["source_url"])
+                elif change["chat"] is not None:
+                    # Skipped when the card was replaced later in the log
+                    self.add_summary(change["chat"])
+            self._change_cursor = changes[-1]["seq"]
+
+    def remove_source(self, source_url: str):
+        """Drop the phrases contributed by the card stored under source_url."""
+        with self._lock:
+            for kind, norm, _ in self._by_source.pop(source_url, []):
+                self._unref_phrase(kind, norm)
+
+    def suggest(self, query: str, limit: int = 8) -> SuggestResponse:
+        """Return ranked completions for a partially typed query."""
+        start_time = time.perf_counter()
+        self._maybe_refresh()
+        norm_query = normalize_text(query)
+        # Keep a trailing space meaningful: "react " should not complete "reactive"
+        if norm_query and query[-1:].isspace():
+            norm_query += " "
+
+        candidates: Dict[Tuple[str, str], Tuple[float, bool]] = {}
+        with self._lock:
+            if norm_query:
+                self._collect(norm_query, candidates, limit, fuzzy=False)
+                if len(candidates) < limit:
+                    for variant in self._fuzzy_variants(norm_query):
+                        self._collect(variant, candidates, limit, fuzzy=True)
+
+            ranked = sorted(candidates.items(), key=lambda item: -item[1][0])[:limit]
+            suggestions = [
+                Suggestion(
+                    text=self._phrases[phrase][0],
+                    kind=phrase[0],
+                    score=round(score, 4),
+                    fuzzy=fuzzy,
+                )
+                for phrase, (score, fuzzy) in ranked
+            ]
+
+        return SuggestResponse(
+            suggestions=suggestions,
+            query=query,
+            took_ms=round((time.perf_counter() - start_time) * 1000, 3),
+        )
+
+    def _collect(
+        self,
+        prefix: str,
+        candidates: Dict[Tuple[str, str], Tuple[float, bool]],
+        limit: int,
+        fuzzy: bool,
+    ):
+        """Score phrases having a key that starts with prefix."""
+        start = bisect.bisect_left(self._keys, (prefix,))
+        end = bisect.bisect_left(self._keys, (prefix + _MAX_CHAR,), start)
+        if end - start <= MAX_SCAN or limit > TOP_PER_PREFIX:
+            scored = self._scan(prefix, start, end).items()
+        else:
+            scored = [
+                ((kind, norm), -negated)
+                for negated, kind, norm in self._top_phrases(prefix, limit, start, end)
+            ]
+
+        for phrase, score in scored:
+            if fuzzy:
+                score *= 0.5
+            existing = candidates.get(phrase)
+            if existing is None or score > existing[0]:
+                candidates[phrase] = (score, fuzzy)
+
+    def _scan(self, prefix: str, start: int, end: int) -> Dict[Tuple[str, str], float]:
+        scores: Dict[Tuple[str, str], float] = {}
+        for position in range(start, end):
+            _, kind, norm = self._keys[position]
+            if (kind, norm) not in scores:
+                scores[(kind, norm)] = self._phrase_score(prefix, kind, norm)
+        return scores
+
+    def _phrase_score(self, prefix: str, kind: str, norm: str) -> float:
+        count = self._phrases[(kind, norm)][1]
+        score = KIND_WEIGHTS.get(kind, 1.0) * math.log1p(count)
+        if norm.startswith(prefix):
+            score *= 1.5  # Match at the start of the phrase
+        return score
+
+    def _top_phrases(
+        self, prefix: str, limit: int, start: int, end: int
+    ) -> List[Tuple[float, str, str]]:
+        """The prefix's best `limit` phrases, from the cache while it is exact."""
+        cached = self._top.get(prefix)
+        if cached is not None:
+            entries, floor = cached
+            if len(entries) >= limit and -entries[limit - 1][0] >= floor:
+                return entries[:limit]
+            if floor == -math.inf:
+                return entries
+
+        # First lookup, or removals left too few phrases known to beat the rest
+        ranked = sorted(
+            (-score, kind, norm)
+            for (kind, norm), score in self._scan(prefix, start, end).items()
+        )
+        floor = -math.inf
+        if len(ranked) > TOP_PER_PREFIX:
+            floor = -ranked[TOP_PER_PREFIX][0]
+        self._top[prefix] = [ranked[:TOP_PER_PREFIX], floor]
+        self._top_depth = max(self._top_depth, len(prefix))
+        return ranked[:limit]
+
+    def _update_top(self, kind: str, norm: str):
+        """Re-rank a phrase whose count changed in the cached prefixes it matches."""
+        if not self._top:
+            return
+        prefixes = {
+            key[:length]
+            for key in self._phrase_keys(norm)
+            for length in range(1, min(len(key), self._top_depth) + 1)
+            if key[:length] in self._top
+        }
+        for prefix in prefixes:
+            cached = self._top[prefix]
+            entries = cached[0]
+            for position, (_, entry_kind, entry_norm) in enumerate(entries):
+                if entry_kind == kind and entry_norm == norm:
+                    del entries[position]
+                    break
+            if (kind, norm) not in self._phrases:
+                continue
+            score = self._phrase_score(prefix, kind, norm)
+            # A phrase below the floor may rank under phrases left out earlier
+            if score >= cached[1]:
+                bisect.insort(entries, (-score, kind, norm))
+                if len(entries) > TOP_PER_PREFIX:
+                    cached[1] = max(cached[1], -entries.pop()[0])
+
+    def _fuzzy_variants(self, norm_query: str) -> List[str]:
+        """Rewrite the query with each token corrected by at most one edit."""
+        tokens = norm_query.split()
+        if not tokens:
+            return []
+        last_is_prefix = not norm_query.endswith(" ")
+
+        corrected = []
+        for token in tokens[:-1] if last_is_prefix else tokens:
+            if token in self._vocab or len(token) < 3:
+                corrected.append(token)
+                continue
+            options = [w for w in set(_edits1(token)) if w in self._vocab]
+            if not options:
+                return []
+            corrected.append(max(options, key=lambda w: self._vocab[w]))
+
+        if not last_is_prefix:
+            return [" ".join(corrected) + " "]
+
+        last = tokens[-1]
+        if len(last) < 3:
+            return []
+        # The last token is still being typed, so correct it as a prefix
+        options = []
+        for variant in set(_edits1(last)):
+            if variant and variant != last and self._has_vocab_prefix(variant):
+                options.append(variant)
+        options.sort(key=lambda v: -self._vocab_prefix_weight(v))
+
+        head = " ".join(corrected)
+        return [
+            f"{head} {option}" if head else option
+            for option in options[:MAX_FUZZY_VARIANTS]
+        ]
+
+    def _has_vocab_prefix(self, prefix: str) -> bool:
+        position = bisect.bisect_left(self._vocab_sorted, prefix)
+        return position < len(self._vocab_sorted) and self._vocab_sorted[
+            position
+        ].startswith(prefix)
+
+    def _vocab_prefix_weight(self, prefix: str) -> int:
+        position = bisect.bisect_left(self._vocab_sorted, prefix)
+        if position < len(self._vocab_sorted):
+            return self._vocab.get(self._vocab_sorted[position], 0)
+        return 0
+
+    def _phrases_for(
+        self, title: str, tags: List[str], project_name: str, project: str
+    ) -> List[Tuple[str, str, str]]:
+        """Collect the (kind, normalized, display) phrases a card contributes."""
+        phrases = []
+        seen = set()
+        for kind, texts in (
+            ("title", [title]),
+            ("tag", tags or []),
+            ("project", [project_name, project]),
+        ):
+            for text in texts:
+                norm = normalize_text(text)
+                if norm and (kind, norm) not in seen:
+                    seen.add((kind, norm))
+                    phrases.append((kind, norm, text.strip()))
+        return phrases
+
+    @staticmethod
+    def _phrase_keys(norm: str) -> List[str]:
+        """Every word-aligned suffix of a phrase."""
+        words = norm.split(" ")
+        return [" ".join(words[i:]) for i in range(len(words))]
+
+    def _ref_phrase(self, kind: str, norm: str, display: str, insert_keys: bool = True):
+        entry = self._phrases.get((kind, norm))
+        if entry:
+            entry[0] = display
+            entry[1] += 1
+            self._update_top(kind, norm)
+            return
+
+        self._phrases[(kind, norm)] = [display, 1]
+        for word in norm.split(" "):
+            if word not in self._vocab:
+                self._vocab[word] = 0
+                if insert_keys:
+                    bisect.insort(self._vocab_sorted, word)
+            self._vocab[word] += 1
+        if insert_keys:
+            for key in self._phrase_keys(norm):
+                bisect.insort(self._keys, (key, kind, norm))
+            self._update_top(kind, norm)
+
+    def _unref_phrase(self, kind: str, norm: str):
+        entry = self._phrases.get((kind, norm))
+        if not entry:
+            return
+        entry[1] -= 1
+        if entry[1] > 0:
+            self._update_top(kind, norm)
+            return
+
+        del self._phrases[(kind, norm)]
+        for key in self._phrase_keys(norm):
+            position = bisect.bisect_left(self._keys, (key, kind, norm))
+            if position < len(self._keys) and self._keys[position] == (key, kind, norm):
+                del self._keys[position]
+        for word in norm.split(" "):
+            self._vocab[word] -= 1
+            if self._vocab[word] <= 0:
+                del self._vocab[word]
+                position = bisect.bisect_left(self._vocab_sorted, word)
+                if (
+                    position < len(self._vocab_sorted)
+                    and self._vocab_sorted[position] == word
+                ):
+                    del self._vocab_sorted[position]
+        self._update_top(kind, norm)
+
+
+class WorkspaceSuggestIndex:
+    """One SuggestService per workspace, so lookups only see that workspace.
+
+    The default workspace is built at warm-up; others are built on a background
+    thread on first use, costing time proportional to that workspace's own
+    archive. Until then their lookups answer with no suggestions. Workspaces
+    without chats get no index, and at most SUGGEST_MAX_WORKSPACES are kept,
+    least recently used evicted first.
+    """
+
+    def __init__(
+        self,
+        db_service: Optional[DatabaseService] = None,
+        refresh_interval: Optional[float] = None,
+    ):
+        self.db_service = db_service or DatabaseService()
+        self.refresh_interval = refresh_interval
+        self.max_workspaces = int(os.getenv("SUGGEST_MAX_WORKSPACES", "64"))
+        self._services: "OrderedDict[str, SuggestService]" = OrderedDict()
+        self._building: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        service = self._services.get(DEFAULT_WORKSPACE)
+        return service is not None and service.ready
+
+    def get(self, workspace_id: str) -> Optional[SuggestService]:
+        """The workspace's index, or None while it is being built."""
+        with self._lock:
+            service = self._services.get(workspace_id)
+            if service is not None:
+                self._services.move_to_end(workspace_id)
+                return service
+            if workspace_id == DEFAULT_WORKSPACE or workspace_id in self._building:
+                # The default workspace is built by warm-up
+                return None
+
+        # Any well-formed id is accepted, so never build for one without chats
+        if not self.db_service.has_chats(workspace_id):
+            return None
+        with self._lock:
+            if workspace_id in self._building or workspace_id in self._services:
+                return self._services.get(workspace_id)
+            self._building.add(workspace_id)
+        threading.Thread(
+            target=self._load_in_background,
+            args=(workspace_id,),
+            name="suggest-build",
+            daemon=True,
+        ).start()
+        return None
+
+    def _load(self, workspace_id: str) -> SuggestService:
+        service = SuggestService(self.db_service, self.refresh_interval, workspace_id)
+        service.build()
+        with self._lock:
+            self._services[workspace_id] = service
+            while len(self._services) > max(self.max_workspaces, 1):
+                oldest = next(iter(self._services))
+                if oldest == DEFAULT_WORKSPACE:
+                    self._services.move_to_end(oldest)
+                    oldest = next(iter(self._services))
+                del self._services[oldest]
+                print(f"Evicted suggestion index for workspace {oldest}")
+        # Saves that landed during the build only reached the log
+        service._apply_changes()
+        return service
+
+    def _load_in_background(self, workspace_id: str):
+        try:
+            self._load(workspace_id)
+        except Exception as e:
+            print(f"Suggestion index build failed for workspace {workspace_id}: {e}")
+        finally:
+            with self._lock:
+                self._building.discard(workspace_id)
+
+    def build(self):
+        """(Re)build the default workspace's index."""
+        service = self._services.get(DEFAULT_WORKSPACE)
+        if service is None:
+            self._load(DEFAULT_WORKSPACE)
+        else:
+            service.build()
+
+    def add_summary(self, summary: ChatSummary):
+        # Workspaces without an index yet pick the card up when they build
+        service = self._services.get(summary.workspace_id)
+        if service is not None:
+            service.add_summary(summary)
+
+    def remove_source(self, source_url: str, workspace_id: str = DEFAULT_WORKSPACE):
+        service = self._services.get(workspace_id)
+        if service is not None:
+            service.remove_source(source_url)
+
+    def suggest(
+        self, query: str, limit: int = 8, workspace_id: str = DEFAULT_WORKSPACE
+    ) -> SuggestResponse:
+        service = self.get(workspace_id)
+        if service is None or not service.ready:
+            # Still building, or a workspace without chats
+            building = (
+                workspace_id == DEFAULT_WORKSPACE or workspace_id in self._building
+            )
+            return SuggestResponse(
+                suggestions=[], query=query, took_ms=0.0, building=building
+            )
+        return service.suggest(query, limit)
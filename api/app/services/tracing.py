@@ -0,0 +1,81 @@
+# app/services/tracing.py
+"""Per-request trace: stage timings, parameters and executed SQL.
+
+The profiling middleware starts a trace for each request; services mark stages
+with `stage()` and the database layer records statements while a trace is
+active. Outside a request every helper here is a no-op.
+"""
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+# Keep traces bounded for requests that run many statements
+MAX_QUERIES = 50
+
+# SQLite hands the trace callback statements with their values inlined; string
+# and blob literals (chat text, recaps, fingerprints) are replaced by their size
+_LITERAL_RE = re.compile(r"(?<!\w)[xX]?'((?:[^']|'')*)'")
+
+
+def redact_literals(sql: str) -> str:
+    """Replace string and blob literals with a placeholder giving their size."""
+    return _LITERAL_RE.sub(lambda match: f"'<{len(match.group(1))} chars>'", sql)
+
+
+class RequestTrace:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.params: Dict[str, Any] = {}
+        self.stages: List[Dict[str, Any]] = []
+        self.queries: List[str] = []
+        self.started = time.perf_counter()
+
+    def record_query(self, sql: str):
+        if len(self.queries) < MAX_QUERIES:
+            self.queries.append(redact_literals(sql))
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar(
+    "current_trace", default=None
+)
+
+
+def start_trace(method: str, path: str) -> RequestTrace:
+    trace = RequestTrace(method, path)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def annotate(**params: Any):
+    """Attach request parameters worth logging (e.g. the search query)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.params.update(params)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a named stage of the current request."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.stages.append(
+            {"stage": name, "ms": round((time.perf_counter() - start) * 1000, 3)}
+        )
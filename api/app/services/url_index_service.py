@@ -0,0 +1,105 @@
+# app/services/url_index_service.py
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+from app.services.database_service import DatabaseService
+from app.services.urls import normalize_url
+from app.models.chat import DEFAULT_WORKSPACE
+
+
+class UrlIndexService:
+    """In-memory membership filter over the normalized source URLs of stored chats.
+
+    Holds one 64-bit hash per stored (workspace, URL) pair. A miss is a
+    definite "no" answered without touching SQLite; hits are possible positives
+    that are confirmed in a single batched query, so SQLite stays the authority
+    (hash collisions, deleted chats). The filter follows the database's archive
+    version, which picks up saves from other workers and bulk imports too.
+    """
+
+    def __init__(self, db_service: Optional[DatabaseService] = None):
+        self.db_service = db_service or DatabaseService()
+        self._lock = threading.Lock()
+        self._hashes: Set[int] = set()
+        # Archive version the filter reflects (None until built)
+        self._version: Optional[int] = None
+        self.ready = False
+
+        self.lookups = 0
+        self.filtered = 0  # definite misses, never sent to SQLite
+        self.confirmed = 0
+        self.false_positives = 0
+
+    def build(self):
+        """Load the hash of every stored (workspace, URL) pair."""
+        start_time = time.time()
+        # Read the version first: anything committed later is picked up by _sync
+        version = self.db_service.archive_version()
+        hashes = {hash(entry) for entry in self.db_service.iter_normalized_urls()}
+        with self._lock:
+            self._hashes = hashes
+            self._version = version
+            self.ready = True
+        print(
+            f"URL index built: {len(hashes)} URLs in {time.time() - start_time:.2f}s"
+        )
+
+    def add(self, source_url: str, workspace_id: str = DEFAULT_WORKSPACE):
+        """Record a saved chat or alias URL."""
+        with self._lock:
+            self._hashes.add(hash((workspace_id, normalize_url(source_url))))
+
+    def _sync(self):
+        """Pull URLs written since the filter's version."""
+        version = self.db_service.archive_version()
+        with self._lock:
+            if version == self._version:
+                return
+            since = self._version
+        new_entries = self.db_service.iter_normalized_urls(after_version=since)
+        new_hashes = [hash(entry) for entry in new_entries]
+        with self._lock:
+            self._hashes.update(new_hashes)
+            if self._version is None or version > self._version:
+                self._version = version
+
+    def contains_many(
+        self, source_urls: List[str], workspace_id: str = DEFAULT_WORKSPACE
+    ) -> Dict[str, bool]:
+        """Map each source URL to whether a chat (or alias) exists for it."""
+        normalized = {url: normalize_url(url) for url in source_urls}
+        self.lookups += len(normalized)
+
+        if self.ready:
+            self._sync()
+            with self._lock:
+                candidates = {
+                    n
+                    for n in normalized.values()
+                    if hash((workspace_id, n)) in self._hashes
+                }
+            self.filtered += len(set(normalized.values())) - len(candidates)
+        else:
+            # Still loading: let SQLite answer everything
+            candidates = set(normalized.values())
+
+        existing = self.db_service.existing_normalized_urls(
+            list(candidates), workspace_id
+        )
+        self.confirmed += len(existing)
+        self.false_positives += len(candidates) - len(existing)
+        return {url: n in existing for url, n in normalized.items()}
+
+    def contains(self, source_url: str, workspace_id: str = DEFAULT_WORKSPACE) -> bool:
+        return self.contains_many([source_url], workspace_id)[source_url]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "urls": len(self._hashes),
+            "version": self._version,
+            "lookups": self.lookups,
+            "filtered": self.filtered,
+            "confirmed": self.confirmed,
+            "false_positives": self.false_positives,
+        }
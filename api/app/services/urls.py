@@ -0,0 +1,42 @@
+# app/services/urls.py
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that never identify a conversation
+TRACKING_PARAMS = {"fbclid", "gclid", "ref", "ref_src", "source"}
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a chat URL, so trivial variants count as the same chat.
+
+    Lowercases scheme and host, drops "www.", default ports, fragments, trailing
+    slashes and tracking parameters, and sorts the remaining query parameters.
+    """
+    url = (url or "").strip()
+    if not url:
+        return ""
+
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").removeprefix("www.")
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host
+    if port is not None and str(port) != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{port}"
+
+    path = parts.path.rstrip("/")
+    query = urlencode(
+        sorted(
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if key.lower() not in TRACKING_PARAMS and not key.lower().startswith("utm_")
+        )
+    )
+    return urlunsplit((scheme, netloc, path, query, ""))
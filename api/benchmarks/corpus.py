@@ -0,0 +1,85 @@
+# benchmarks/corpus.py
+"""Synthetic, reproducible chat corpora for benchmarking."""
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+from uuid import UUID
+from app.models.chat import ChatSummary
+from app.services.database_service import DatabaseService
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+
+TOPICS = [
+    "react", "hooks", "python", "fastapi", "sqlite", "indexing", "pinecone",
+    "embeddings", "docker", "kubernetes", "pricing", "roadmap", "hiring",
+    "onboarding", "marketing", "analytics", "caching", "latency", "testing",
+    "security", "oauth", "billing", "design", "typescript", "rust", "golang",
+    "migration", "postgres", "search", "ranking", "summaries", "extension",
+]
+FILLER = [
+    "the", "we", "discussed", "how", "to", "improve", "with", "a", "new",
+    "approach", "for", "and", "then", "compared", "options", "about", "our",
+]
+PROJECTS = ["Web Development", "Research", "Team Planning", "Personal Learning"]
+USER_PROJECTS = ["General", "ChatCards MVP", "Side Project", "Work"]
+PLATFORMS = ["ChatGPT", "Claude", "Gemini", "Perplexity"]
+
+START_DATE = datetime(2024, 1, 1)
+SOURCE_URL = "https://chat.example.com/c/{:08d}"
+
+
+def source_url(index: int) -> str:
+    return SOURCE_URL.format(index)
+
+
+def make_summary(index: int, rng: random.Random, recap_chars: int = 600) -> ChatSummary:
+    """Build one synthetic card; identical for the same index and generator state."""
+    topics = rng.sample(TOPICS, 4)
+    words = [rng.choice(topics if rng.random() < 0.3 else FILLER) for _ in range(120)]
+    recap = "## Notes\n\n" + "\n".join(f"- **{t}**: {' '.join(words[:12])}" for t in topics)
+    return ChatSummary(
+        id=str(UUID(int=rng.getrandbits(128), version=4)),
+        title=" ".join(t.title() for t in topics[:3]) + f" #{index}",
+        synthesis=" ".join(words[:40]),
+        recap=(recap * (recap_chars // len(recap) + 1))[:recap_chars],
+        project_name=rng.choice(PROJECTS),
+        project=rng.choice(USER_PROJECTS),
+        tags=topics,
+        source_url=source_url(index),
+        platform=rng.choice(PLATFORMS),
+        created_at=START_DATE + timedelta(minutes=rng.randrange(0, 2 * 365 * 24 * 60)),
+    )
+
+
+def make_chat_content(rng: random.Random, words: int = 400) -> str:
+    """A raw transcript for the ingest scenario."""
+    topics = rng.sample(TOPICS, 3)
+    lines = []
+    for turn in range(words // 20):
+        speaker = "User" if turn % 2 == 0 else "Assistant"
+        text = " ".join(
+            rng.choice(topics if rng.random() < 0.3 else FILLER) for _ in range(20)
+        )
+        lines.append(f"{speaker}: {text}")
+    return "\n".join(lines)
+
+
+def build_corpus(
+    db_path: str, size: int, seed: int = 42, batch_size: int = 5000
+) -> int:
+    """Create db_path holding `size` synthetic chats."""
+    db_service = DatabaseService(db_path)
+    db_service.wait_for_migrations()
+    rng = random.Random(seed)
+    start_time = time.time()
+
+    for start in range(0, size, batch_size):
+        batch: List[ChatSummary] = [
+            make_summary(i, rng) for i in range(start, min(start + batch_size, size))
+        ]
+        db_service.insert_chat_summaries(batch)
+        print(f"Generated {start + len(batch)}/{size} chats", end="\r")
+
+    print(f"\nGenerated {size} chats in {time.time() - start_time:.1f}s")
+    return size
@@ -0,0 +1,207 @@
+# benchmarks/fakes.py
+"""Deterministic local stand-ins for the Anthropic and Pinecone backed services."""
+import asyncio
+import hashlib
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+from app.models.chat import DEFAULT_WORKSPACE, STATUS_ENRICHING, ChatSummary
+from app.models.search import SearchRequest
+from app.services.pinecone_service import PineconeService
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _seed_for(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+class FakeClaudeService:
+    """Summarizes instantly from the content itself, after a simulated model latency.
+
+    Output depends only on the input, so runs are reproducible; latency is
+    drawn from a seeded generator around latency_ms +/- jitter_ms. Card-only
+    calls (two-phase mode) take card_latency_fraction of that, since most of
+    a real call's time goes into generating the recap.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 800.0,
+        jitter_ms: float = 200.0,
+        recap_chars: int = 1500,
+        seed: int = 0,
+        card_latency_fraction: float = 0.25,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.recap_chars = recap_chars
+        self.card_latency_fraction = card_latency_fraction
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    async def _simulate_latency(self, fraction: float = 1.0):
+        self.calls += 1
+        delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(delay * fraction, 0) / 1000)
+
+    def _recap(self, content: str) -> str:
+        words = _WORD_RE.findall(content.lower())
+        recap = "## Recap\n\n" + "\n".join(f"- {w}" for w in words)
+        return recap[: self.recap_chars]
+
+    def _card(self, input_data: Dict[str, Any]) -> ChatSummary:
+        content = input_data.get("chat_content", "")
+        words = _WORD_RE.findall(content.lower())
+        common = [word for word, _ in Counter(words).most_common(8)]
+        rng = random.Random(_seed_for(content))
+
+        title = " ".join(common[:4]).title() or "Chat Summary"
+        return ChatSummary(
+            id=str(UUID(int=rng.getrandbits(128), version=4)),
+            title=title,
+            synthesis=" ".join(words[:40]),
+            recap="",
+            project_name=rng.choice(["Research", "Web Development", "Team Planning"]),
+            project=input_data.get("project", "General"),
+            tags=list(set((input_data.get("tags") or []) + common[:4])),
+            source_url=input_data.get("source_url", ""),
+            platform=input_data.get("platform", ""),
+            created_at=datetime.utcnow(),
+        )
+
+    async def summarize_chat(self, input_data: Dict[str, Any]) -> ChatSummary:
+        await self._simulate_latency()
+        summary = self._card(input_data)
+        summary.recap = self._recap(input_data.get("chat_content", ""))
+        return summary
+
+    async def summarize_card(self, input_data: Dict[str, Any]) -> ChatSummary:
+        await self._simulate_latency(self.card_latency_fraction)
+        summary = self._card(input_data)
+        summary.status = STATUS_ENRICHING
+        return summary
+
+    async def generate_recap(self, input_data: Dict[str, Any]) -> str:
+        await self._simulate_latency()
+        return self._recap(input_data.get("chat_content", ""))
+
+
+class FakePineconeService(PineconeService):
+    """In-memory vector store scoring by shared-term overlap (no network)."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        super().__init__(connect=False)
+        self.latency_ms = latency_ms
+        self.enabled = True
+        self.status = "ready"
+        # namespace -> record id -> record, plus per-namespace lookup tables
+        self._records: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        self._postings: Dict[str, Dict[str, set]] = defaultdict(lambda: defaultdict(set))
+        self._by_source_url: Dict[str, Dict[str, set]] = defaultdict(
+            lambda: defaultdict(set)
+        )
+
+    def connect(self) -> bool:
+        return True
+
+    def upsert_records(
+        self, records: List[Dict[str, Any]], namespace: Optional[str] = None
+    ):
+        self._sleep()
+        namespace = namespace or self.namespace
+        for record in records:
+            self._remove(namespace, record["_id"])
+            self._records[namespace][record["_id"]] = record
+            self._by_source_url[namespace][record["source_url"]].add(record["_id"])
+            for term in set(_WORD_RE.findall(record["content"].lower())):
+                self._postings[namespace][term].add(record["_id"])
+
+    def delete_embedding_by_source_url(
+        self, source_url: str, workspace_id: str = DEFAULT_WORKSPACE
+    ):
+        self._sleep()
+        namespace = self.namespace_for(workspace_id)
+        for record_id in list(self._by_source_url[namespace].get(source_url, ())):
+            self._remove(namespace, record_id)
+
+    def delete_namespace(self):
+        for table in (self._records, self._postings, self._by_source_url):
+            table.pop(self.namespace, None)
+
+    def semantic_search(
+        self, request: SearchRequest, workspace_id: str = DEFAULT_WORKSPACE
+    ) -> List[Dict[str, Any]]:
+        self._sleep()
+        namespace = self.namespace_for(workspace_id)
+        records = self._records[namespace]
+        postings = self._postings[namespace]
+        scores: Counter = Counter()
+        for term in set(_WORD_RE.findall(request.query.lower())):
+            for record_id in postings.get(term, ()):
+                scores[record_id] += 1
+
+        matches = []
+        for record_id, score in scores.most_common():
+            record = records[record_id]
+            if request.project_filter not in (None, record["project_name"]):
+                continue
+            if request.platform_filter not in (None, record["platform"]):
+                continue
+            matches.append(
+                {
+                    "id": record_id,
+                    "score": float(score),
+                    "metadata": {
+                        key: record.get(key)
+                        for key in (
+                            "source_url",
+                            "title",
+                            "project_name",
+                            "platform",
+                            "created_at",
+                        )
+                    },
+                }
+            )
+            if len(matches) >= request.limit:
+                break
+        return matches
+
+    def find_neighbors(
+        self,
+        chat_id: str,
+        text: str,
+        workspace_id: str = DEFAULT_WORKSPACE,
+        top_k: int = 20,
+    ) -> List[Tuple[str, float]]:
+        self._sleep()
+        namespace = self.namespace_for(workspace_id)
+        record = self._records[namespace].get(chat_id)
+        query = record["content"] if record else text
+        postings = self._postings[namespace]
+        scores: Counter = Counter()
+        for term in set(_WORD_RE.findall(query.lower())):
+            for record_id in postings.get(term, ()):
+                if record_id != chat_id:
+                    scores[record_id] += 1
+        return [(record_id, float(score)) for record_id, score in scores.most_common(top_k)]
+
+    def get_vector_count(self, namespace: Optional[str] = None) -> int:
+        return len(self._records[namespace or self.namespace])
+
+    def _remove(self, namespace: str, record_id: str):
+        record = self._records[namespace].pop(record_id, None)
+        if record:
+            self._by_source_url[namespace][record["source_url"]].discard(record_id)
+            for term in set(_WORD_RE.findall(record["content"].lower())):
+                self._postings[namespace][term].discard(record_id)
+
+    def _sleep(self):
+        if self.latency_ms:
+            # Pinecone calls are blocking in the real service, so block here too
+            time.sleep(self.latency_ms / 1000)
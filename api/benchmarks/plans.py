@@ -0,0 +1,128 @@
+# benchmarks/plans.py
+"""Query-plan checks for the archive's list and search paths.
+
+Each check calls a DatabaseService method, captures the statement it actually
+ran and asserts SQLite's plan for it: the expected index, no temp B-tree (a
+sort the index should have provided) and no full scan of `chat_summaries`.
+Run by the benchmark harness against its corpus, or standalone on any archive:
+
+    python -m benchmarks.plans --db-path chatcards.db
+"""
+import argparse
+import contextvars
+import sys
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.models.search import SearchRequest
+from app.services.database_service import DatabaseService
+from app.services.tracing import start_trace
+
+# (name, call, index the plan must use)
+PLAN_CHECKS: List[Tuple[str, Callable[[DatabaseService], Any], str]] = [
+    ("list_chats", lambda db: db.list_chats(50, 0), "idx_ws_created_ts"),
+    ("list_chats_deep", lambda db: db.list_chats(50, 5000), "idx_ws_created_ts"),
+    (
+        "search",
+        lambda db: db.keyword_search(SearchRequest(query="python")),
+        "idx_ws_created_ts",
+    ),
+    (
+        "search_project",
+        lambda db: db.keyword_search(
+            SearchRequest(query="python", project_filter="Research")
+        ),
+        "idx_ws_project_name_created_ts",
+    ),
+    (
+        "search_platform",
+        lambda db: db.keyword_search(
+            SearchRequest(query="python", platform_filter="ChatGPT")
+        ),
+        "idx_ws_platform_created_ts",
+    ),
+    (
+        "search_dates",
+        lambda db: db.keyword_search(
+            SearchRequest(
+                query="", date_from=datetime(2025, 1, 1), date_to=datetime(2025, 6, 1)
+            )
+        ),
+        "idx_ws_created_ts",
+    ),
+    (
+        "search_project_dates",
+        lambda db: db.keyword_search(
+            SearchRequest(
+                query="python",
+                project_filter="Research",
+                date_from=datetime(2025, 1, 1),
+            )
+        ),
+        "idx_ws_project_name_created_ts",
+    ),
+]
+
+
+def _captured_select(db_service: DatabaseService, call: Callable) -> Optional[str]:
+    """Run `call` under a throwaway trace and return the first SELECT it issued."""
+
+    def run() -> List[str]:
+        trace = start_trace("PLAN", "check")
+        call(db_service)
+        return trace.queries
+
+    queries = contextvars.copy_context().run(run)
+    return next(
+        (sql for sql in queries if sql.lstrip().upper().startswith("SELECT")), None
+    )
+
+
+def check_query_plans(db_service: DatabaseService) -> Dict[str, Dict[str, Any]]:
+    """Plan and problems (empty when the plan is as expected) for every check."""
+    results = {}
+    for name, call, index in PLAN_CHECKS:
+        sql = _captured_select(db_service, call)
+        if sql is None:
+            results[name] = {"plan": [], "problems": ["no SELECT was issued"]}
+            continue
+
+        plan = db_service.explain_query_plan(sql)
+        problems = []
+        if not any(f"USING INDEX {index} " in f"{step} " for step in plan):
+            problems.append(f"does not use {index}")
+        if any("TEMP B-TREE" in step for step in plan):
+            problems.append("sorts in a temp B-tree")
+        if any(step.strip() == "SCAN chat_summaries" for step in plan):
+            problems.append("scans chat_summaries")
+        results[name] = {"plan": plan, "problems": problems}
+    return results
+
+
+def print_plan_checks(results: Dict[str, Dict[str, Any]]) -> bool:
+    """Print one line per check (with the plan for failures); True if all passed."""
+    print("\nQuery plans:")
+    passed = True
+    for name, result in results.items():
+        if result["problems"]:
+            passed = False
+            print(f"  FAIL {name}: {'; '.join(result['problems'])}")
+            for step in result["plan"]:
+                print(f"         {step}")
+        else:
+            print(f"  ok   {name}")
+    return passed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", default="chatcards.db")
+    args = parser.parse_args(argv)
+
+    # Migrates the archive first, like the API does at startup
+    db_service = DatabaseService(args.db_path)
+    db_service.wait_for_migrations()
+    return 0 if print_plan_checks(check_query_plans(db_service)) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+# benchmarks/run.py
+"""Offline benchmark harness for the API.
+
+Runs the real FastAPI app in-process against a synthetic SQLite corpus, with
+deterministic fakes in place of Anthropic and Pinecone, and reports throughput
+and latency percentiles per scenario.
+
+    python -m benchmarks.run --size 10k
+    python -m benchmarks.run --size 100k --save benchmarks/results/baseline.json
+    python -m benchmarks.run --size 100k --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+import httpx
+from benchmarks.corpus import SIZES, TOPICS, build_corpus, make_chat_content, source_url
+from benchmarks.fakes import FakeClaudeService, FakePineconeService
+from benchmarks.plans import check_query_plans, print_plan_checks
+
+# (method, path, request kwargs) for the i-th request of a scenario
+RequestSpec = Tuple[str, str, Dict[str, Any]]
+
+
+def summarize_request(i: int, rng: random.Random, size: int) -> RequestSpec:
+    return (
+        "POST",
+        "/api/summarize-chat",
+        {
+            "json": {
+                "chat_content": make_chat_content(rng),
+                "source_url": f"https://bench.example.com/ingest/{i}",
+                "platform": "ChatGPT",
+                "project": "Benchmark",
+            }
+        },
+    )
+
+
+def search_request(i: int, rng: random.Random, size: int) -> RequestSpec:
+    body: Dict[str, Any] = {"query": " ".join(rng.sample(TOPICS, 2)), "limit": 10}
+    if rng.random() < 0.3:
+        body["project_filter"] = "Research"
+    return "POST", "/api/search", {"json": body}
+
+
+def chats_paging_request(i: int, rng: random.Random, size: int) -> RequestSpec:
+    # Mostly the first pages, with a tail of deep offsets
+    page = rng.randrange(0, 5) if rng.random() < 0.8 else rng.randrange(0, size // 50)
+    return "GET", "/api/chats", {"params": {"limit": 50, "offset": page * 50}}
+
+
+def chat_exists_request(i: int, rng: random.Random, size: int) -> RequestSpec:
+    # About half of the lookups miss
+    return (
+        "GET",
+        "/api/chat-exists",
+        {"params": {"source_url": source_url(rng.randrange(0, size * 2))}},
+    )
+
+
+def chat_exists_batch_request(i: int, rng: random.Random, size: int) -> RequestSpec:
+    # A page of conversation links, about half of them unknown
+    urls = [source_url(rng.randrange(0, size * 2)) for _ in range(50)]
+    return "POST", "/api/chat-exists/batch", {"json": {"source_urls": urls}}
+
+
+SCENARIOS: Dict[str, Callable[[int, random.Random, int], RequestSpec]] = {
+    "summarize": summarize_request,
+    "search": search_request,
+    "chats_paging": chats_paging_request,
+    "chat_exists": chat_exists_request,
+    "chat_exists_batch": chat_exists_batch_request,
+}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    make_request: Callable[[int, random.Random, int], RequestSpec],
+    requests: int,
+    concurrency: int,
+    corpus_size: int,
+    seed: int,
+) -> Dict[str, Any]:
+    """Issue `requests` requests from `concurrency` concurrent clients."""
+    rng = random.Random(seed)
+    specs = [make_request(i, rng, corpus_size) for i in range(requests)]
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker(client_id: str):
+        nonlocal errors, next_index
+        # Each simulated client identifies itself, as the extension does
+        headers = {"X-Client-Id": client_id}
+        while next_index < len(specs):
+            method, path, kwargs = specs[next_index]
+            next_index += 1
+            start = time.perf_counter()
+            response = await client.request(method, path, headers=headers, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker(f"bench-{n}") for n in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """List regressions: p95 up or throughput down by more than tolerance."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms"
+            )
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {previous['throughput_rps']} -> "
+                f"{current['throughput_rps']} req/s"
+            )
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def prepare_database(data_dir: str, size_name: str, seed: int) -> str:
+    """Build (or reuse) the corpus and return a scratch copy to run against."""
+    os.makedirs(data_dir, exist_ok=True)
+    corpus_path = os.path.join(data_dir, f"corpus-{size_name}-{seed}.db")
+    if not os.path.exists(corpus_path):
+        print(f"Building {size_name} corpus at {corpus_path}...")
+        build_corpus(corpus_path + ".tmp", SIZES[size_name], seed=seed)
+        os.replace(corpus_path + ".tmp", corpus_path)
+
+    work_path = os.path.join(tempfile.mkdtemp(prefix="cimi-bench-"), "chatcards.db")
+    shutil.copyfile(corpus_path, work_path)
+    return work_path
+
+
+async def run(args) -> Dict[str, Any]:
+    size = SIZES[args.size]
+    db_path = prepare_database(args.data_dir, args.size, args.seed)
+
+    # Point the shared container at the scratch database and the fakes
+    # before anything touches a service
+    from app.services.container import container
+    from main import app
+
+    container.db_path = db_path
+    fake_pinecone = FakePineconeService(latency_ms=args.vector_latency_ms)
+    container.override(
+        claude=FakeClaudeService(
+            latency_ms=args.llm_latency_ms,
+            jitter_ms=args.llm_jitter_ms,
+            seed=args.seed,
+        ),
+        pinecone=fake_pinecone,
+    )
+    container.warm_up()
+
+    if "search" in args.scenarios:
+        print("Loading corpus into the fake vector store...")
+        for chunk in container.db.iter_chat_summaries(
+            chunk_size=5000, include_recap=False
+        ):
+            fake_pinecone.upsert_records(
+                [fake_pinecone.build_record(summary) for _, summary in chunk]
+            )
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "corpus_size": size,
+            "seed": args.seed,
+            "llm_latency_ms": args.llm_latency_ms,
+            "vector_latency_ms": args.vector_latency_ms,
+        },
+        "scenarios": {},
+        # Checked on the full corpus, where a planner regression would show
+        "query_plans": check_query_plans(container.db),
+    }
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        for name in args.scenarios:
+            print(f"Running {name}...")
+            results["scenarios"][name] = await run_scenario(
+                client,
+                SCENARIOS[name],
+                args.requests,
+                args.concurrency,
+                size,
+                args.seed,
+            )
+
+    shutil.rmtree(os.path.dirname(db_path), ignore_errors=True)
+    return results
+
+
+def print_results(results: Dict[str, Any]):
+    print(
+        f"\n{'scenario':<20}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'p99 ms':>10}{'errors':>8}"
+    )
+    for name, r in results["scenarios"].items():
+        print(
+            f"{name:<20}{r['throughput_rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+            f"{r['p99_ms']:>10}{r['errors']:>8}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline CIMI API benchmarks")
+    parser.add_argument("--size", choices=list(SIZES), default="10k")
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=list(SCENARIOS),
+        default=list(SCENARIOS),
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=200.0)
+    parser.add_argument("--vector-latency-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--data-dir",
+        default=os.path.join(os.path.dirname(__file__), "data"),
+        help="Where generated corpora are cached",
+    )
+    parser.add_argument("--save", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against a saved results file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.10,
+        help="Allowed relative slowdown before flagging a regression",
+    )
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    print_results(results)
+    plans_ok = print_plan_checks(results["query_plans"])
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline")
+
+    return 0 if plans_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
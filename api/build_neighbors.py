@@ -0,0 +1,66 @@
+# build_neighbors.py
+"""Compute "more like this" lists for chats stored before the related endpoint.
+
+New cards get their neighbors at ingest; this fills them in for the existing
+archive. Reruns are safe: each card's list is replaced, never appended to.
+
+    python build_neighbors.py --workspace team-a --concurrency 8
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from app.services.database_service import DatabaseService
+from app.services.pinecone_service import PineconeService
+from app.services.related_service import RelatedService
+from app.models.chat import DEFAULT_WORKSPACE
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", default="chatcards.db")
+    parser.add_argument(
+        "--workspace", default=DEFAULT_WORKSPACE, help="Workspace to process"
+    )
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db_service = DatabaseService(args.db_path)
+    related_service = RelatedService(db_service, PineconeService())
+    if not related_service.pinecone_service.enabled:
+        print("Pinecone is not available; using keyword overlap for neighbors")
+
+    total = db_service.count_chats(args.workspace)
+    done = 0
+    start_time = time.time()
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for chunk in db_service.iter_chat_summaries(
+            0,
+            args.chunk_size,
+            workspace_id=args.workspace,
+            include_recap=False,
+        ):
+            summaries = [summary for _, summary in chunk]
+            try:
+                list(executor.map(related_service.update_for, summaries))
+            except Exception as e:
+                print(f"Stopped after {done} chats: {e}")
+                return 1
+
+            done += len(summaries)
+            elapsed = time.time() - start_time
+            print(
+                f"Processed {done}/{total} chats "
+                f"({done / elapsed if elapsed else 0:.0f}/s)"
+            )
+
+    print(f"Neighbors built in {time.time() - start_time:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# compact_recaps.py
+"""Recompress stored recap bodies onto the current codec and dictionary.
+
+Recaps written with zlib (zstandard missing at the time), or with an older
+dictionary, are rewritten in small batches, so this can run in the background
+against a live archive. Optionally trains a new zstd dictionary on a sample of
+the archive's recaps first, and VACUUMs afterwards to return freed pages.
+
+    python compact_recaps.py
+    python compact_recaps.py --train-dictionary --samples 5000
+    python compact_recaps.py --vacuum    # blocks writers while it runs
+"""
+import argparse
+import sys
+import time
+from dotenv import load_dotenv
+from app.services.database_service import DatabaseService
+from app.services.recap_codec import RecapCodec
+
+
+def print_storage(db_service: DatabaseService):
+    for key, stats in db_service.recap_storage_stats().items():
+        print(
+            f"  {key:<10} {stats['recaps']:>9} recaps  "
+            f"{stats['raw_bytes'] or 0:>12} -> {stats['stored_bytes'] or 0:>12} bytes"
+            f"  ({stats['ratio']}x)"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", default="chatcards.db")
+    parser.add_argument(
+        "--train-dictionary",
+        action="store_true",
+        help="Train and store a new zstd dictionary before recompressing",
+    )
+    parser.add_argument("--samples", type=int, default=5000)
+    parser.add_argument(
+        "--dict-size", type=int, default=112640, help="Dictionary size in bytes"
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--pause",
+        type=float,
+        default=0.0,
+        help="Seconds to sleep between batches, to go easy on a busy archive",
+    )
+    parser.add_argument("--vacuum", action="store_true")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db_service = DatabaseService(args.db_path)
+    # Recaps still inline are only compressed once the v3 backfill copies them
+    db_service.wait_for_migrations()
+    print("Recap storage before:")
+    print_storage(db_service)
+
+    if args.train_dictionary:
+        samples = db_service.sample_recaps(args.samples)
+        if len(samples) < 100:
+            print(f"Only {len(samples)} recaps stored; too few to train a dictionary")
+            return 1
+        try:
+            data = RecapCodec.train_dictionary(samples, args.dict_size)
+        except Exception as e:
+            print(f"Dictionary training failed: {e}")
+            return 1
+        dict_id = db_service.save_recap_dictionary(data, len(samples))
+        print(
+            f"Trained dictionary {dict_id} "
+            f"({len(data)} bytes, {len(samples)} samples)"
+        )
+
+    start_time = time.time()
+    last_rowid = 0
+    rewritten = 0
+    while True:
+        last_rowid, count = db_service.recompact_recaps(last_rowid, args.batch_size)
+        if last_rowid is None:
+            break
+        rewritten += count
+        if count:
+            print(f"Recompressed {rewritten} recaps (up to rowid {last_rowid})")
+        if args.pause:
+            time.sleep(args.pause)
+    print(f"Recompressed {rewritten} recaps in {time.time() - start_time:.1f}s")
+
+    if args.vacuum:
+        print("Vacuuming...")
+        db_service.vacuum()
+
+    print("Recap storage after:")
+    print_storage(db_service)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# dedupe_urls.py
+"""Merge cards saved under variants of one normalized source URL.
+
+Before saves were keyed on the normalized URL, an archive could collect several
+cards for what `normalize_url` now treats as one page. The normalizer is a
+heuristic (it drops fragments and tracking parameters), so review the list
+first: with --apply, the newest card of each group is kept, the others are
+deleted along with their vectors, and their URLs become aliases of the kept
+card. The unique index on normalized URLs is created once none are left.
+
+    python dedupe_urls.py                 # list the groups, change nothing
+    python dedupe_urls.py --apply
+    python dedupe_urls.py --apply --workspace team-a
+"""
+import argparse
+import sys
+from dotenv import load_dotenv
+from app.services.database_service import DatabaseService
+from app.services.pinecone_service import PineconeService
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", default="chatcards.db")
+    parser.add_argument("--workspace", help="Only merge this workspace's cards")
+    parser.add_argument(
+        "--apply",
+        action="store_true",
+        help="Merge the groups (deletes cards and vectors); default is a dry run",
+    )
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db_service = DatabaseService(args.db_path)
+    db_service.wait_for_migrations()
+
+    groups = [
+        group
+        for group in db_service.duplicate_url_groups()
+        if not args.workspace or group["workspace_id"] == args.workspace
+    ]
+    for group in groups:
+        print(f"[{group['workspace_id']}] {group['normalized_url']}")
+        for position, card in enumerate(group["cards"]):
+            action = "keep  " if position == 0 else "merge "
+            print(f"  {action}{card['id']}  {card['created_at']}  {card['source_url']}")
+            print(f"        {card['title']}")
+    print(f"{len(groups)} normalized URLs with several cards")
+    if not groups or not args.apply:
+        if groups:
+            print("Dry run; rerun with --apply to merge them")
+        return 0
+
+    pinecone_service = PineconeService()
+    if pinecone_service.status not in ("ready", "disabled"):
+        print(
+            f"Pinecone is unreachable ({pinecone_service.last_error}); "
+            "nothing merged"
+        )
+        return 1
+
+    merged = 0
+    for group in groups:
+        kept_url = group["cards"][0]["source_url"]
+        removed = db_service.merge_duplicate_url(
+            group["workspace_id"], group["normalized_url"]
+        )
+        for _, source_url in removed:
+            # Vectors are keyed by source URL; the kept card may share it
+            if source_url != kept_url:
+                pinecone_service.delete_embedding_by_source_url(
+                    source_url, group["workspace_id"]
+                )
+        merged += len(removed)
+    print(f"Merged {merged} cards into {len(groups)}")
+
+    if db_service.create_unique_url_index():
+        print("Unique index on normalized URLs created")
+    else:
+        print("Other workspaces still have duplicates; unique index not created yet")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,44 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
+import asyncio
 import os
-import json
-from datetime import datetime
+import re
+import time
 from dotenv import load_dotenv
-from app.services.chat_processing_service import ChatProcessingService
-from app.services.search_service import SearchService
-from app.models.chat import ChatSummary
-from app.models.search import SearchRequest, SearchResponse
+from app.services.container import container
+from app.services.db_writer import WriterProcess
+from app.services.tracing import annotate
+from app.middleware.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    client_id_for,
+)
+from app.middleware.compression import (
+    RequestDecompressionMiddleware,
+    ResponseCompressionMiddleware,
+)
+from app.middleware.profiling import (
+    ProfilingConfig,
+    ProfilingMiddleware,
+    load_profile,
+)
+from app.models.chat import (
+    ChangesResponse,
+    ChatExistsBatchRequest,
+    ChatExistsBatchResponse,
+    ChatSummary,
+    DEFAULT_WORKSPACE,
+)
+from app.models.search import (
+    RelatedChatsResponse,
+    SearchRequest,
+    SearchResponse,
+    SuggestResponse,
+)
 import uvicorn
 
 # Load environment variables
@@ -24,11 +53,99 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After"],
+)
+
+# The compression middlewares are added before the profiling middleware so
+# they run inside it: errors raised while a body is read must reach FastAPI
+# directly, not through that middleware's task group, and responses reach the
+# compressor as one message instead of re-streamed.
+
+# gzip/zstd request bodies, decoded as they stream in under a size limit
+# (MAX_REQUEST_BYTES for everything else)
+app.add_middleware(
+    RequestDecompressionMiddleware,
+    path_limits={
+        "/api/summarize-chat": int(
+            os.getenv("MAX_CHAT_REQUEST_BYTES", str(16 * 1024 * 1024))
+        ),
+        "/api/chat-exists/batch": int(
+            os.getenv("MAX_BATCH_REQUEST_BYTES", str(4 * 1024 * 1024))
+        ),
+    },
+)
+
+# Negotiated zstd/gzip responses for the list, search and change-feed endpoints
+app.add_middleware(
+    ResponseCompressionMiddleware,
+    paths=[
+        "/api/chats",
+        "/api/search",
+        "/api/changes",
+        "/api/chat/",
+        "/api/chat-exists/batch",
+    ],
+)
+
+
+def _slow_by_design(request: Request) -> bool:
+    """Long polls and event streams hold the request open on purpose."""
+    if request.url.path == "/api/changes/stream":
+        return True
+    if request.url.path != "/api/changes":
+        return False
+    try:
+        return float(request.query_params.get("wait") or 0) > 0
+    except ValueError:
+        return False
+
+
+# Per-request stage timings, opt-in profiling and the slow-request log
+app.add_middleware(
+    ProfilingMiddleware,
+    explain_query_plan=lambda sql: container.db.explain_query_plan(sql),
+    slow_by_design=_slow_by_design,
 )
 
-# Initialize services
-chat_processing_service = ChatProcessingService()
-search_service = SearchService()
+# Admission control for the expensive endpoints (limits are per worker)
+summarize_admission = AdmissionController.from_env(
+    "summarize", max_concurrent=8, max_per_client=2, max_queue=32, queue_timeout=30
+)
+search_admission = AdmissionController.from_env(
+    "search", max_concurrent=16, max_per_client=4, max_queue=64, queue_timeout=5
+)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    print(f"Rejected {request.url.path}: {exc.reason}")
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Server busy ({exc.reason}), retry later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+# How often each worker looks for recap jobs a crashed or restarted worker left behind
+RECAP_SWEEP_SECONDS = float(os.getenv("RECAP_SWEEP_SECONDS", "60"))
+
+
+async def sweep_recap_jobs():
+    while not container.warm_up_done:
+        await asyncio.sleep(1)
+    while True:
+        try:
+            await container.chat_processing.resume_recaps()
+        except Exception as e:
+            print(f"Error resuming recap jobs: {e}")
+        await asyncio.sleep(RECAP_SWEEP_SECONDS)
+
+
+@app.on_event("startup")
+async def start_services():
+    """Warm up backends in the background; nothing here blocks on the network."""
+    container.start_warm_up()
+    app.state.recap_sweeper = asyncio.create_task(sweep_recap_jobs())
 
 
 # Request models
@@ -40,6 +157,45 @@ class ChatSummarizeRequest(BaseModel):
     tags: Optional[List[str]] = []
     project: Optional[str] = "General"  # Add project field with default
     verbose: Optional[bool] = False
+    # How long the caller is willing to wait; steers model routing
+    latency_budget_ms: Optional[int] = None
+    # Return the card before its recap is ready (None: server default)
+    two_phase: Optional[bool] = None
+
+
+_WORKSPACE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def workspace_id(
+    x_workspace_id: Optional[str] = Header(default=None),
+) -> str:
+    """The caller's workspace (X-Workspace-Id); single-user installs use the default."""
+    if not x_workspace_id:
+        return DEFAULT_WORKSPACE
+    if not _WORKSPACE_ID_RE.match(x_workspace_id):
+        raise HTTPException(status_code=400, detail="Invalid X-Workspace-Id")
+    return x_workspace_id
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Weak If-None-Match comparison against our ETag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+def _conditional(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Tag the response; return a 304 to send instead if the client is current."""
+    # Clients may keep the payload but must revalidate before reusing it
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "X-Workspace-Id"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
 
 
 @app.get("/")
@@ -48,8 +204,24 @@ async def root():
 
 
 @app.post("/api/summarize-chat", response_model=ChatSummary)
-async def summarize_chat(request: ChatSummarizeRequest):
+async def summarize_chat(
+    request: ChatSummarizeRequest,
+    http_request: Request,
+    workspace: str = Depends(workspace_id),
+):
     """Process chat with LLM and store in database + Pinecone."""
+    async with summarize_admission.admit(client_id_for(http_request)):
+        return await _summarize_chat(request, workspace)
+
+
+async def _summarize_chat(request: ChatSummarizeRequest, workspace: str) -> ChatSummary:
+    annotate(
+        workspace_id=workspace,
+        source_url=request.source_url,
+        platform=request.platform,
+        chat_chars=len(request.chat_content),
+        highlights=len(request.highlights or []),
+    )
     try:
         input_data = {
             "chat_content": request.chat_content,
@@ -59,10 +231,13 @@ async def summarize_chat(request: ChatSummarizeRequest):
             "tags": request.tags,
             "project": request.project,  # Add user project
             "verbose": request.verbose,  # Pass verbose flag
+            "latency_budget_ms": request.latency_budget_ms,
+            "two_phase": request.two_phase,
+            "workspace_id": workspace,
         }
 
         # Full pipeline: LLM → Database → Pinecone
-        summary = await chat_processing_service.process_and_store_chat(input_data)
+        summary = await container.chat_processing.process_and_store_chat(input_data)
         return summary
 
     except Exception as e:
@@ -71,44 +246,25 @@ async def summarize_chat(request: ChatSummarizeRequest):
 
 
 @app.get("/api/chats", response_model=List[ChatSummary])
-async def get_all_chats(limit: Optional[int] = 100, offset: Optional[int] = 0):
-    """Get all stored chats with pagination."""
+async def get_all_chats(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = 100,
+    offset: Optional[int] = 0,
+    include_recap: bool = False,
+    workspace: str = Depends(workspace_id),
+):
+    """Get all stored chats with pagination (recaps only with `include_recap`)."""
     try:
-        import sqlite3
-
-        with sqlite3.connect("chatcards.db") as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute(
-                """
-                SELECT id, title, synthesis, recap, project_name, 
-                       COALESCE(project, 'General') as project, tags, 
-                       source_url, platform, created_at
-                FROM chat_summaries 
-                ORDER BY created_at DESC 
-                LIMIT ? OFFSET ?
-            """,
-                (limit, offset),
-            )
-            rows = cursor.fetchall()
-
-            results = []
-            for row in rows:
-                results.append(
-                    ChatSummary(
-                        id=row["id"],
-                        title=row["title"],
-                        synthesis=row["synthesis"],
-                        recap=row["recap"],
-                        project_name=row["project_name"],
-                        project=row["project"],  # This will be 'General' if NULL
-                        tags=json.loads(row["tags"]),
-                        source_url=row["source_url"],
-                        platform=row["platform"],
-                        created_at=datetime.fromisoformat(row["created_at"]),
-                    )
-                )
-
-            return results
+        etag = (
+            f'W/"chats-{workspace}-{int(include_recap)}-'
+            f'{container.db.archive_version()}"'
+        )
+        not_modified = _conditional(request, response, etag)
+        if not_modified:
+            return not_modified
+
+        return container.db.list_chats(limit, offset, workspace, include_recap)
 
     except Exception as e:
         print(f"Error getting all chats: {str(e)}")
@@ -116,15 +272,17 @@ async def get_all_chats(limit: Optional[int] = 100, offset: Optional[int] = 0):
 
 
 @app.get("/api/chats/count")
-async def get_chats_count():
+async def get_chats_count(
+    request: Request, response: Response, workspace: str = Depends(workspace_id)
+):
     """Get total count of stored chats."""
     try:
-        import sqlite3
+        etag = f'W/"count-{workspace}-{container.db.archive_version()}"'
+        not_modified = _conditional(request, response, etag)
+        if not_modified:
+            return not_modified
 
-        with sqlite3.connect("chatcards.db") as conn:
-            cursor = conn.execute("SELECT COUNT(*) as count FROM chat_summaries")
-            row = cursor.fetchone()
-            return {"count": row[0]}
+        return {"count": container.db.count_chats(workspace)}
 
     except Exception as e:
         print(f"Error getting chat count: {str(e)}")
@@ -132,15 +290,38 @@ async def get_chats_count():
 
 
 @app.post("/api/search", response_model=SearchResponse)
-async def search_chats(request: SearchRequest):
+async def search_chats(
+    request: SearchRequest,
+    http_request: Request,
+    workspace: str = Depends(workspace_id),
+):
     """Search through stored chat summaries."""
-    try:
-        results = search_service.search(request)
-        return results
+    annotate(workspace_id=workspace, **request.model_dump(mode="json"))
+    async with search_admission.admit(client_id_for(http_request)):
+        try:
+            # Off the event loop, so admitted searches actually run concurrently
+            return await run_in_threadpool(container.search.search, request, workspace)
+
+        except Exception as e:
+            print(f"Error in search endpoint: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Error searching chats: {str(e)}"
+            )
 
-    except Exception as e:
-        print(f"Error in search endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error searching chats: {str(e)}")
+
+@app.get("/api/stats")
+async def get_stats():
+    """Operational counters, including admission-control rejections."""
+    return {
+        "admission": {
+            "summarize": summarize_admission.stats(),
+            "search": search_admission.stats(),
+        },
+        "url_index": container.url_index.stats(),
+        "preprocess": container.preprocessor.stats(),
+        "model_routes": container.model_router.stats(),
+        "recaps": container.chat_processing.recap_stats(),
+    }
 
 
 @app.get("/api/search-test")
@@ -148,18 +329,48 @@ async def search_test():
     """Simple test search endpoint."""
     try:
         test_request = SearchRequest(query="React", limit=5)
-        results = search_service.search(test_request)
+        results = container.search.search(test_request)
         return {"message": "Search working", "count": results.total_count}
 
     except Exception as e:
         return {"error": str(e)}
 
 
+@app.get("/api/suggest", response_model=SuggestResponse)
+async def suggest(
+    q: str, limit: Optional[int] = 8, workspace: str = Depends(workspace_id)
+):
+    """Search-as-you-type completions over titles, tags and project names."""
+    try:
+        # Refresh checks hit the database; keep them off the event loop
+        return await run_in_threadpool(
+            container.suggest.suggest,
+            q,
+            limit=max(1, min(limit, 50)),
+            workspace_id=workspace,
+        )
+
+    except Exception as e:
+        print(f"Error in suggest endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error suggesting: {str(e)}")
+
+
 @app.get("/api/chat/{chat_id}", response_model=ChatSummary)
-async def get_chat(chat_id: str):
+async def get_chat(
+    chat_id: str,
+    request: Request,
+    response: Response,
+    workspace: str = Depends(workspace_id),
+):
     """Get a specific chat by ID."""
     try:
-        chat = chat_processing_service.get_chat_by_id(chat_id)
+        version = container.db.get_chat_version(chat_id, workspace)
+        if version is not None:
+            not_modified = _conditional(request, response, f'W/"{chat_id}-{version}"')
+            if not_modified:
+                return not_modified
+
+        chat = container.chat_processing.get_chat_by_id(chat_id, workspace)
         return chat
 
     except Exception as e:
@@ -167,11 +378,156 @@ async def get_chat(chat_id: str):
         raise HTTPException(status_code=404, detail=f"Chat not found: {str(e)}")
 
 
+@app.get("/api/chat/{chat_id}/related", response_model=RelatedChatsResponse)
+async def get_related_chats(
+    chat_id: str,
+    limit: int = 10,
+    project_filter: Optional[str] = None,
+    platform_filter: Optional[str] = None,
+    include_recap: bool = False,
+    workspace: str = Depends(workspace_id),
+):
+    """Cards most similar to this one, from the neighbor lists built at ingest."""
+    try:
+        start_time = time.perf_counter()
+        if container.db.get_chat_version(chat_id, workspace) is None:
+            raise HTTPException(status_code=404, detail=f"Chat {chat_id} not found")
+
+        results = container.related.related(
+            chat_id,
+            workspace,
+            limit=max(1, min(limit, 50)),
+            project_filter=project_filter,
+            platform_filter=platform_filter,
+            include_recap=include_recap,
+        )
+        return RelatedChatsResponse(
+            chat_id=chat_id,
+            results=results,
+            took_ms=round((time.perf_counter() - start_time) * 1000, 3),
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error getting related chats for {chat_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error getting related chats: {str(e)}"
+        )
+
+
+# Upper bound on URLs per batch existence check (one page of conversation links)
+MAX_EXISTS_BATCH = int(os.getenv("MAX_EXISTS_BATCH", "1000"))
+
+
+@app.post("/api/chat-exists/batch", response_model=ChatExistsBatchResponse)
+async def check_chats_exist(
+    request: ChatExistsBatchRequest, workspace: str = Depends(workspace_id)
+):
+    """Check which of many source URLs already have a chat, in one round trip."""
+    if len(request.source_urls) > MAX_EXISTS_BATCH:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_EXISTS_BATCH} source URLs per request",
+        )
+    annotate(urls=len(request.source_urls))
+    try:
+        start_time = time.perf_counter()
+        results = container.chat_processing.chats_exist(request.source_urls, workspace)
+        return ChatExistsBatchResponse(
+            results=results,
+            existing_count=sum(results.values()),
+            took_ms=round((time.perf_counter() - start_time) * 1000, 3),
+        )
+
+    except Exception as e:
+        print(f"Error checking chat existence: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error checking chats: {str(e)}")
+
+
+@app.delete("/api/chat/{chat_id}")
+async def delete_chat(chat_id: str, workspace: str = Depends(workspace_id)):
+    """Delete a chat card (and its aliases, fingerprint and embedding)."""
+    try:
+        deleted = container.chat_processing.delete_chat(chat_id, workspace)
+    except Exception as e:
+        print(f"Error deleting chat {chat_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error deleting chat: {str(e)}")
+
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Chat {chat_id} not found")
+    return {"deleted": True, "id": chat_id}
+
+
+# Longest a long-poll or an idle stream waits before answering / sending a heartbeat
+MAX_CHANGES_WAIT = 60.0
+CHANGES_HEARTBEAT = 15.0
+
+
+@app.get("/api/changes", response_model=ChangesResponse)
+async def get_changes(
+    since: int = 0,
+    limit: int = 500,
+    wait: float = 0,
+    workspace: str = Depends(workspace_id),
+):
+    """Changes after a cursor; with `wait`, long-poll up to that many seconds."""
+    limit = max(1, min(limit, 1000))
+    feeds = container.change_feed
+    try:
+        feed = feeds.get_changes(since, limit, workspace)
+        if not feed.changes and not feed.reset and wait > 0:
+            timeout = min(wait, MAX_CHANGES_WAIT)
+            if await feeds.wait_for_changes(feed.cursor, timeout, workspace):
+                feed = feeds.get_changes(feed.cursor, limit, workspace)
+        return feed
+
+    except Exception as e:
+        print(f"Error getting changes: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting changes: {str(e)}")
+
+
+def _sse_event(event: str, event_id: int, data: str) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+@app.get("/api/changes/stream")
+async def stream_changes(
+    request: Request, since: int = 0, workspace: str = Depends(workspace_id)
+):
+    """Server-sent events: one `change` event per log entry, resumable by id."""
+    last_event_id = request.headers.get("last-event-id", "")
+    cursor = int(last_event_id) if last_event_id.isdigit() else since
+
+    async def events():
+        nonlocal cursor
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            feed = container.change_feed.get_changes(cursor, 500, workspace)
+            if feed.reset:
+                yield _sse_event("reset", feed.cursor, feed.model_dump_json())
+            for change in feed.changes:
+                yield _sse_event("change", change.seq, change.model_dump_json())
+            cursor = feed.cursor
+            if feed.has_more:
+                continue
+            if not await container.change_feed.wait_for_changes(
+                cursor, CHANGES_HEARTBEAT, workspace
+            ):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/api/chat-exists")
-async def check_chat_exists(source_url: str):
+async def check_chat_exists(source_url: str, workspace: str = Depends(workspace_id)):
     """Check if a chat with this source URL already exists."""
     try:
-        exists = chat_processing_service.chat_exists(source_url)
+        exists = container.chat_processing.chat_exists(source_url, workspace)
         return {"exists": exists, "source_url": source_url}
 
     except Exception as e:
@@ -179,11 +535,50 @@ async def check_chat_exists(source_url: str):
         raise HTTPException(status_code=500, detail=f"Error checking chat: {str(e)}")
 
 
+@app.get("/api/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, request: Request):
+    """Fetch a stored request profile (admin allow-list only)."""
+    config = ProfilingConfig()
+    if not config.is_admin(request):
+        raise HTTPException(status_code=403, detail="Not allowed")
+
+    report = load_profile(config, profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return report
+
+
 @app.get("/api/health")
 async def health_check():
     """Check API health."""
     return {"status": "healthy", "service": "chat-summarizer"}
 
 
+@app.get("/api/health/live")
+async def liveness_check():
+    """Liveness: the process is up and serving (no backend checks)."""
+    return {"status": "alive"}
+
+
+@app.get("/api/health/ready")
+async def readiness_check():
+    """Readiness: the database is reachable and warm-up has finished."""
+    state = container.readiness()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    host = os.getenv("API_HOST", "0.0.0.0")
+    port = int(os.getenv("API_PORT", "8000"))
+    workers = int(os.getenv("API_WORKERS", "1"))
+
+    if workers > 1:
+        # Reads scale across worker processes; all writes go through one writer
+        writer = WriterProcess(container.db_path)
+        writer.start()
+        try:
+            uvicorn.run("main:app", host=host, port=port, workers=workers)
+        finally:
+            writer.stop()
+    else:
+        uvicorn.run(app, host=host, port=port)
@@ -0,0 +1,207 @@
+# reindex.py
+"""Rebuild the vector index from the chats already stored in SQLite.
+
+Streams `chat_summaries` in rowid order, upserts batches to Pinecone in parallel
+and checkpoints after every chunk so an interrupted run resumes where it stopped.
+No LLM calls are made: records are rebuilt from the stored summaries.
+
+    python reindex.py --batch-size 96 --concurrency 8
+    python reindex.py --index chatcards-v2 --recreate   # after an embedding-model change
+    python reindex.py --workspace team-a                 # one workspace's namespace
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+from dotenv import load_dotenv
+from app.services.database_service import DatabaseService
+from app.services.pinecone_service import PineconeService
+from app.models.chat import DEFAULT_WORKSPACE
+
+
+def load_checkpoint(path: str, target: Dict[str, str]) -> int:
+    """Return the last fully indexed rowid, or 0 when starting fresh."""
+    if not os.path.exists(path):
+        return 0
+
+    with open(path) as f:
+        checkpoint = json.load(f)
+
+    if checkpoint.get("target") != target:
+        raise SystemExit(
+            f"Checkpoint {path} belongs to {checkpoint.get('target')}, not {target}. "
+            "Use --reset to start over."
+        )
+    return checkpoint.get("last_rowid", 0)
+
+
+def save_checkpoint(path: str, target: Dict[str, str], last_rowid: int, indexed: int):
+    """Atomically record progress (write then rename)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(
+            {
+                "target": target,
+                "last_rowid": last_rowid,
+                "indexed": indexed,
+                "updated_at": time.time(),
+            },
+            f,
+        )
+    os.replace(tmp_path, path)
+
+
+def upsert_with_retry(
+    pinecone_service: PineconeService, records: List[Dict[str, Any]], retries: int
+) -> int:
+    """Upsert one batch, backing off exponentially on errors."""
+    for attempt in range(retries + 1):
+        try:
+            pinecone_service.upsert_records(records)
+            return len(records)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = 2**attempt
+            print(f"Batch upsert failed ({e}), retrying in {delay}s...")
+            time.sleep(delay)
+    return 0
+
+
+def verify_counts(
+    db_service: DatabaseService,
+    pinecone_service: PineconeService,
+    workspace_id: str,
+    timeout: float,
+) -> bool:
+    """Compare SQLite and vector counts, waiting for the index to catch up."""
+    expected = db_service.count_chats(workspace_id)
+    deadline = time.time() + timeout
+    while True:
+        actual = pinecone_service.get_vector_count()
+        if actual == expected:
+            print(f"Verified: {actual} vectors for {expected} chats")
+            return True
+        if time.time() >= deadline:
+            print(f"Count mismatch: {actual} vectors for {expected} chats")
+            return False
+        # Pinecone stats are eventually consistent
+        time.sleep(2)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", default="chatcards.db")
+    parser.add_argument("--index", help="Pinecone index (default: $PINECONE_INDEX)")
+    parser.add_argument(
+        "--namespace",
+        help="Pinecone namespace (default: the workspace's namespace)",
+    )
+    parser.add_argument(
+        "--workspace", default=DEFAULT_WORKSPACE, help="Workspace to reindex"
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=96,
+        help="Records per upsert (96 is the integrated-embedding maximum)",
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--checkpoint", default="reindex_checkpoint.json")
+    parser.add_argument(
+        "--reset", action="store_true", help="Ignore any checkpoint and start over"
+    )
+    parser.add_argument(
+        "--recreate",
+        action="store_true",
+        help="Delete every vector in the namespace before indexing",
+    )
+    parser.add_argument("--no-verify", action="store_true")
+    parser.add_argument("--verify-timeout", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db_service = DatabaseService(args.db_path)
+    pinecone_service = PineconeService(index_name=args.index, namespace=args.namespace)
+    if not pinecone_service.enabled:
+        print("Pinecone is not available; nothing to reindex")
+        return 1
+    if not args.namespace:
+        # Each workspace lives in its own namespace
+        pinecone_service.namespace = pinecone_service.namespace_for(args.workspace)
+
+    target = {
+        "db_path": os.path.abspath(args.db_path),
+        "index": pinecone_service.index_name,
+        "namespace": pinecone_service.namespace,
+        "workspace": args.workspace,
+    }
+
+    if args.reset or args.recreate:
+        if os.path.exists(args.checkpoint):
+            os.remove(args.checkpoint)
+    if args.recreate:
+        print(f"Clearing namespace {pinecone_service.namespace}...")
+        pinecone_service.delete_namespace()
+
+    last_rowid = load_checkpoint(args.checkpoint, target)
+    if last_rowid:
+        print(f"Resuming after rowid {last_rowid}")
+
+    total = db_service.count_chats(args.workspace)
+    indexed = 0
+    start_time = time.time()
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for chunk in db_service.iter_chat_summaries(
+            last_rowid,
+            args.chunk_size,
+            workspace_id=args.workspace,
+            include_recap=False,
+        ):
+            records = [pinecone_service.build_record(summary) for _, summary in chunk]
+            batches = [
+                records[i : i + args.batch_size]
+                for i in range(0, len(records), args.batch_size)
+            ]
+            # Only advance the checkpoint once every batch of the chunk landed
+            futures = [
+                executor.submit(upsert_with_retry, pinecone_service, batch, args.retries)
+                for batch in batches
+            ]
+            try:
+                indexed += sum(future.result() for future in futures)
+            except Exception as e:
+                print(f"Reindex stopped at rowid {last_rowid}: {e}")
+                print("Run the same command again to resume")
+                return 1
+
+            last_rowid = chunk[-1][0]
+            save_checkpoint(args.checkpoint, target, last_rowid, indexed)
+
+            elapsed = time.time() - start_time
+            print(
+                f"Indexed {indexed}/{total} chats "
+                f"({indexed / elapsed if elapsed else 0:.0f}/s)"
+            )
+
+    print(f"Reindex finished in {time.time() - start_time:.1f}s")
+
+    if not args.no_verify and not verify_counts(
+        db_service, pinecone_service, args.workspace, args.verify_timeout
+    ):
+        return 2
+
+    # Keep the checkpoint only while a run is incomplete
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,15 @@ class Vectors:
     def __init__(self, api_key):
         self.api_key = api_key
         self.pc = Pinecone(api_key = self.api_key)
+        self._indexes = {}
+
+    def _get_index(self, index_name):
+        # Look the index up once and reuse the handle for later operations
+        if index_name not in self._indexes:
+            if not self.pc.has_index(index_name):
+                return None
+            self._indexes[index_name] = self.pc.Index(index_name)
+        return self._indexes[index_name]
     
     def create_index(self, index_name, dimension, metric = "cosine", vector_type="dense", cloud = {"name": "aws", "region":"us-east-1"}, deletion_protection = "disabled", tags={"environment": "development"}):
         # Create a dense index with integrated embedding
@@ -23,19 +32,18 @@ class Vectors:
             )
 
     
-    def upsert_vectors(self, index_name, namespace, vectors):
-        if self.pc.has_index(index_name):
-            # Target the index
-            dense_index = self.pc.Index(index_name)
-
-            # Upsert the records into a namespace
-            dense_index.upsert(namespace, vectors = vectors)
+    def upsert_vectors(self, index_name, namespace, vectors, batch_size = 100):
+        dense_index = self._get_index(index_name)
+        if dense_index is not None:
+            # Upsert the records into a namespace, a bounded batch at a time
+            for i in range(0, len(vectors), batch_size):
+                dense_index.upsert(vectors = vectors[i:i + batch_size], namespace = namespace)
         else:
             print(f"Index {index_name} does not exist.")
 
     def similarity_search(self, index_name, namespace, query_vector, no_of_results, filter = None):
-        if self.pc.has_index(index_name):
-            index = self.pc.Index(index_name)
+        index = self._get_index(index_name)
+        if index is not None:
             if filter:
                 results = index.query(vector=query_vector, top_k=no_of_results, namespace=namespace, filter=filter, include_metadata = True, include_values = False)
             else:
@@ -56,8 +64,8 @@ class Vectors:
             return -1 
         
     def get_vector_count(self, index_name, namespace):
-        if self.pc.has_index(index_name):
-            dense_index = self.pc.Index(index_name)
+        dense_index = self._get_index(index_name)
+        if dense_index is not None:
             stats = dense_index.describe_index_stats()
             namespace_data = stats['namespaces']
             if namespace in namespace_data.keys():